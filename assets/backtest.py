@@ -0,0 +1,43 @@
+"""
+Script to backtest config file over stored candles
+--config: config file (same as `run_trader.py`)
+--candles: csv file of candles with the columns of `price` table. If not given, read `price` table of `--db` (toml of
+           user, host, port and db)
+--spread: spread assumed between best ask (close price) and best bid
+"""
+
+import argparse
+import toml
+import btc_trader.simulator
+from btc_trader.order.model import MovingAverage
+from btc_trader.historical_data_collection.db import ConnectPSQL
+
+
+def get_options(parser):
+    share_param = {'nargs': '?', 'action': 'store', 'const': None, 'choices': None, 'metavar': None}
+    parser.add_argument('--config', default='./config.toml', type=str, **share_param)
+    parser.add_argument('--candles', default=None, type=str, **share_param)
+    parser.add_argument('--db', default=None, type=str, **share_param)
+    parser.add_argument('--period', default=60, type=int, **share_param)
+    parser.add_argument('--begin', default=None, type=int, **share_param)
+    parser.add_argument('--end', default=None, type=int, **share_param)
+    parser.add_argument('--spread', default=100, type=float, **share_param)
+    parser.add_argument('--output', default=None, type=str, **share_param)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    _parser = argparse.ArgumentParser(description='This script is ...', formatter_class=argparse.RawTextHelpFormatter)
+    args = get_options(_parser)
+    config = toml.load(open(args.config))
+    if config['model_name'] != 'ma':
+        raise ValueError('unknown model name: %s' % config['model_name'])
+    source = args.candles if args.candles is not None else ConnectPSQL(toml.load(open(args.db)))
+    candles = btc_trader.simulator.load_candles(source, period=args.period, begin=args.begin, end=args.end)
+    backtest = btc_trader.simulator.Backtest(candles, spread=args.spread, **config['executor_parameter'])
+    trades, summary = backtest.run(MovingAverage(**config['model_parameter']))
+    print('candles: %i' % len(candles))
+    for k, v in summary.items():
+        print(' - %s: %s' % (k, str(v)))
+    if args.output is not None:
+        trades.to_csv(args.output, index=False)
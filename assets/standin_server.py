@@ -0,0 +1,41 @@
+"""
+Script to run local stand-in server of bitFlyer API
+Set `api_url` in api_keys.toml to the printed url to run the trader against it.
+--latency: seconds to wait before each response
+--error_rate: probability of injected error
+--tick_sec: market moves every `tick_sec` seconds
+"""
+
+import argparse
+import time
+import btc_trader.simulator
+
+
+def get_options(parser):
+    share_param = {'nargs': '?', 'action': 'store', 'const': None, 'choices': None, 'metavar': None}
+    parser.add_argument('--port', default=8080, type=int, **share_param)
+    parser.add_argument('--price', default=1000000, type=float, **share_param)
+    parser.add_argument('--spread', default=100, type=float, **share_param)
+    parser.add_argument('--volatility', default=100, type=float, **share_param)
+    parser.add_argument('--latency', default=0.0, type=float, **share_param)
+    parser.add_argument('--latency_jitter', default=0.0, type=float, **share_param)
+    parser.add_argument('--error_rate', default=0.0, type=float, **share_param)
+    parser.add_argument('--tick_sec', default=1.0, type=float, **share_param)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    _parser = argparse.ArgumentParser(description='This script is ...', formatter_class=argparse.RawTextHelpFormatter)
+    args = get_options(_parser)
+    exchange = btc_trader.simulator.Exchange(price=args.price, spread=args.spread, volatility=args.volatility)
+    server = btc_trader.simulator.StandInServer(exchange, port=args.port, latency=args.latency,
+                                                latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+                                                tick_sec=args.tick_sec)
+    server.start()
+    print('stand-in server: %s' % server.url)
+    try:
+        while True:
+            time.sleep(60)
+            print('requests: %i, ticker: %s' % (server.request_count, str(server.exchange.ticker())))
+    except KeyboardInterrupt:
+        server.stop()
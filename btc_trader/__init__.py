@@ -2,6 +2,7 @@ from . import api
 from .order.minimum_price import minimum_price
 from .order.executor_spot import ExecutorSpot
 from .order.executor_fx import ExecutorFX
+from .order.runner import StrategyRunner
 
 __all__ = (
     "api"
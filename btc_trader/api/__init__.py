@@ -1,9 +1,25 @@
+from .base import API
+from .aio import AsyncAPI, AsyncBanking, AsyncOrder, AsyncPublic
 from .bank import Banking
 from .order import Order
 from .public import Public
+from .transport import HTTPTransport, RecordingTransport, ReplayTransport
+from .rate_limit import RateLimiter, PRIORITY_ORDER, PRIORITY_DEFAULT, PRIORITY_POLLING
 
 __all__ = (
+    "API",
+    "AsyncAPI",
+    "AsyncBanking",
+    "AsyncOrder",
+    "AsyncPublic",
     "Banking",
     "Order",
-    "Public"
+    "Public",
+    "HTTPTransport",
+    "RecordingTransport",
+    "ReplayTransport",
+    "RateLimiter",
+    "PRIORITY_ORDER",
+    "PRIORITY_DEFAULT",
+    "PRIORITY_POLLING"
 )
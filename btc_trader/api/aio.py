@@ -0,0 +1,184 @@
+""" asyncio counterpart of `API`, `Public`, `Order` and `Banking`
+
+Every method has the same name, parameters and return value as the blocking one but is awaited, so independent
+calls can run concurrently on one event loop, eg)
+
+    api_client = AsyncAPI(**id_api)
+    public, order = AsyncPublic(api=api_client), AsyncOrder(api=api_client)
+    ticker, state, collateral = await asyncio.gather(
+        public.ticker(product_code='FX_BTC_JPY'),
+        public.get_board_state(product_code='FX_BTC_JPY'),
+        order.get_collateral())
+    await api_client.close()
+"""
+
+import time
+import asyncio
+import inspect
+import traceback
+import aiohttp
+from .base import API
+from .bank import Banking
+from .order import Order
+from .public import Public
+from .transport import ConnectionStats
+
+__all__ = (
+    "AsyncAPI",
+    "AsyncBanking",
+    "AsyncOrder",
+    "AsyncPublic",
+    "AsyncHTTPTransport"
+)
+
+
+class AsyncHTTPTransport:
+    """ Keep-alive connection pool on the running event loop (aiohttp) """
+
+    def __init__(self,
+                 pool_maxsize: int = 16,
+                 max_idle_sec: float = 60.0):
+        """
+
+        :param pool_maxsize: max number of simultaneous connections
+        :param max_idle_sec: keep-alive time of idle connections
+        """
+        self.pool_maxsize = pool_maxsize
+        self.max_idle_sec = max_idle_sec
+        self.stats = ConnectionStats()
+        self.__session = None
+
+    def __trace_config(self):
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_connection_create_start(session, context, params):
+            context.connect_start = time.perf_counter()
+
+        async def on_connection_create_end(session, context, params):
+            self.stats.add_connection(time.perf_counter() - context.connect_start)
+
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        return trace_config
+
+    def __get_session(self):
+        if self.__session is None or self.__session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_maxsize, keepalive_timeout=self.max_idle_sec)
+            self.__session = aiohttp.ClientSession(connector=connector, trace_configs=[self.__trace_config()])
+        return self.__session
+
+    async def send(self,
+                   method: str,
+                   url: str,
+                   headers: dict = None,
+                   data: str = None,
+                   timeout: float = None):
+        """ Send one request
+
+        :return: (status_code, content in bytes)
+        """
+        session = self.__get_session()
+        self.stats.add_request()
+        async with session.request(method, url, headers=headers, data=data,
+                                   timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            content = await response.read()
+            return response.status, content
+
+    async def close(self):
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+
+class AsyncAPI(API):
+
+    def __init__(self,
+                 api_key=None,
+                 api_secret=None,
+                 timeout=None,
+                 transport=None,
+                 rate_limiter=None,
+                 api_url: str = None):
+        """
+
+        :param transport: transport shared by every call made through this instance, with `send` and `close`
+                          coroutines (blocking `HTTPTransport`, `RecordingTransport` and `ReplayTransport` are
+                          not accepted). If None, an `AsyncHTTPTransport` is created.
+        :param rate_limiter: `RateLimiter` applied to every call made through this instance. If None, one with
+                             bitFlyer's default limits is created. False to disable rate limiting.
+        :param api_url: endpoint root (`https://api.bitflyer.jp` if None)
+        """
+        transport = AsyncHTTPTransport() if transport is None else transport
+        if not inspect.iscoroutinefunction(transport.send):
+            raise TypeError('%s is blocking, AsyncAPI needs a transport with async send (eg, AsyncHTTPTransport)'
+                            % type(transport).__name__)
+        super(AsyncAPI, self).__init__(api_key, api_secret, timeout, transport, rate_limiter, api_url)
+
+    def __enter__(self):
+        raise TypeError("use 'async with' for AsyncAPI (close is a coroutine)")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """ Close pooled connections """
+        await self.transport.close()
+
+    async def request(self,
+                      endpoint,
+                      method="GET",
+                      params=None,
+                      priority=None):
+
+        try:
+            while self.rate_limiter is not None:
+                granted, wait = self.rate_limiter.try_acquire(endpoint, params, priority)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                if granted:
+                    break
+            url, header, data = self._prepare(endpoint, method, params)
+            if method == "GET":
+                # query string is already encoded in the same form as it's signed
+                status_code, content = await self.transport.send(
+                    method, url + data, headers=header, timeout=self.timeout)
+            else:  # method == "POST":
+                status_code, content = await self.transport.send(
+                    method, url, headers=header, data=data, timeout=self.timeout)
+            return self._decode(status_code, content)
+
+        except Exception:
+            return dict(status="error", error_message=traceback.format_exc())
+
+
+class AsyncPublic(Public):
+    """ Public API returning awaitable """
+
+    def __init__(self, api_key=None, api_secret=None, timeout=None, api: AsyncAPI = None, api_url: str = None,
+                 cache: bool = False, cache_ttl: dict = None, cache_size: int = 128):
+        api = AsyncAPI(api_key, api_secret, timeout, api_url=api_url) if api is None else api
+        super(AsyncPublic, self).__init__(api=api, cache=cache, cache_ttl=cache_ttl, cache_size=cache_size)
+
+    def _request(self, endpoint, params=None):
+        if self.cache is None or endpoint not in self.cache:
+            return self.api.request(endpoint, params=params)
+        return self.cache.get_async(endpoint, params, lambda: self.api.request(endpoint, params=params))
+
+
+class AsyncOrder(Order):
+    """ Order API returning awaitable """
+
+    def __init__(self, api_key=None, api_secret=None, timeout=None, api: AsyncAPI = None, api_url: str = None):
+        api = AsyncAPI(api_key, api_secret, timeout, api_url=api_url) if api is None else api
+        super(AsyncOrder, self).__init__(api=api)
+
+
+class AsyncBanking(Banking):
+    """ Banking API returning awaitable """
+
+    def __init__(self, api_key=None, api_secret=None, timeout=None, api: AsyncAPI = None, api_url: str = None):
+        api = AsyncAPI(api_key, api_secret, timeout, api_url=api_url) if api is None else api
+        super(AsyncBanking, self).__init__(api=api)
@@ -1,10 +1,11 @@
 import json
-import requests
 import time
 import hmac
 import hashlib
 from urllib.parse import urlencode
 import traceback
+from .transport import HTTPTransport
+from .rate_limit import RateLimiter
 
 __all__ = (
     "API"
@@ -14,65 +15,112 @@ __all__ = (
 class API:
 
     def __init__(self,
-                 api_key,
-                 api_secret,
-                 timeout):
-        self.api_url = "https://api.bitflyer.jp"
+                 api_key=None,
+                 api_secret=None,
+                 timeout=None,
+                 transport=None,
+                 rate_limiter=None,
+                 api_url: str = None):
+        """
+
+        :param transport: transport to send request, which is shared by every call made through this instance.
+                          If None, a keep-alive pooled `HTTPTransport` is created.
+        :param rate_limiter: `RateLimiter` applied to every call made through this instance. If None, one with
+                             bitFlyer's default limits is created. False to disable rate limiting.
+        :param api_url: endpoint root, eg) url of local stand-in server (`https://api.bitflyer.jp` if None)
+        """
+        self.api_url = "https://api.bitflyer.jp" if api_url is None else api_url
         self.api_key = api_key
         self.api_secret = api_secret
         self.timeout = timeout
+        self.transport = HTTPTransport() if transport is None else transport
+        if rate_limiter is None:
+            rate_limiter = RateLimiter()
+        self.rate_limiter = rate_limiter if rate_limiter else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Close pooled connections """
+        self.transport.close()
+
+    @property
+    def stats(self):
+        """ Connection statistics of the transport (requests, reused connections, handshake time, ...) """
+        return self.transport.stats
 
     def request(self,
                 endpoint,
                 method="GET",
-                params=None):
+                params=None,
+                priority=None):
+        """ Send request
+
+        :param priority: priority lane of rate limiter (`PRIORITY_ORDER`, `PRIORITY_DEFAULT` or `PRIORITY_POLLING`).
+                         If None, decided by endpoint.
+        """
 
         try:
-            url = '%s%s' % (self.api_url, endpoint)
-            auth_header = None
-
-            if method == "POST":
-                body = json.dumps(params)
-            else:
-                body = "?%s" % urlencode(params) if params else ""
-
-            if self.api_key and self.api_secret:
-                access_timestamp = str(time.time())
-                api_secret = str.encode(self.api_secret)
-                text = str.encode(access_timestamp + method + endpoint + body)
-                access_sign = hmac.new(api_secret,
-                                       text,
-                                       hashlib.sha256).hexdigest()
-                auth_header = {
-                    "ACCESS-KEY": self.api_key,
-                    "ACCESS-TIMESTAMP": access_timestamp,
-                    "ACCESS-SIGN": access_sign,
-                    "Content-Type": "application/json"
-                }
-
-            with requests.Session() as s:
-                if auth_header:
-                    s.headers.update(auth_header)
-
-                if method == "GET":
-                    response = s.get(url, params=params, timeout=self.timeout)
-                else:  # method == "POST":
-                    response = s.post(url, data=json.dumps(params), timeout=self.timeout)
-
-            content = response.content.decode("utf-8")
-            if content in ['[]', '']:
-                content = dict()
-            else:
-                content = json.loads(response.content.decode("utf-8"))
-
-            if response.status_code == 200:
-                if type(content) == dict:
-                    content['status_code'] = 200
-            return content
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(endpoint, params, priority)
+            url, header, data = self._prepare(endpoint, method, params)
+            if method == "GET":
+                status_code, content = self.transport.send(
+                    method, url, headers=header, params=params, timeout=self.timeout)
+            else:  # method == "POST":
+                status_code, content = self.transport.send(
+                    method, url, headers=header, data=data, timeout=self.timeout)
+            return self._decode(status_code, content)
 
         except Exception:
             return dict(status="error", error_message=traceback.format_exc())
 
+    def _prepare(self, endpoint, method, params):
+        """ Build url, header (with signature if keys are given) and body of request
+
+        :return: (url, header, body) where body is the query string for GET and json for POST
+        """
+        url = '%s%s' % (self.api_url, endpoint)
+        auth_header = dict()
+
+        if method == "POST":
+            body = json.dumps(params)
+        else:
+            body = "?%s" % urlencode(params) if params else ""
+
+        if self.api_key and self.api_secret:
+            access_timestamp = str(time.time())
+            api_secret = str.encode(self.api_secret)
+            text = str.encode(access_timestamp + method + endpoint + body)
+            access_sign = hmac.new(api_secret,
+                                   text,
+                                   hashlib.sha256).hexdigest()
+            auth_header = {
+                "ACCESS-KEY": self.api_key,
+                "ACCESS-TIMESTAMP": access_timestamp,
+                "ACCESS-SIGN": access_sign,
+                "Content-Type": "application/json"
+            }
+        return url, auth_header, body
+
+    @staticmethod
+    def _decode(status_code, content):
+        """ Decode response body (bytes) into dict/list """
+        content = content.decode("utf-8")
+        if content in ['[]', '']:
+            content = dict()
+        else:
+            content = json.loads(content)
+
+        if status_code == 200:
+            if type(content) == dict:
+                content['status_code'] = 200
+        return content
+
     def check_keys(self):
         if not all([self.api_key, self.api_secret]):
             raise AuthException()
@@ -0,0 +1,154 @@
+""" TTL response cache with request coalescing for public API
+
+- A response is reused for `ttl[endpoint]` seconds per (endpoint, parameters) and the least recently used entry is
+  evicted once the cache holds `max_size` entries.
+- Identical requests in flight at the same time are coalesced: only the first caller hits the API and the others
+  wait for it and get the same decoded object, so returned values must be treated as read-only.
+- Error responses are shared with the callers already waiting, but never cached: only a successful decode (dict
+  marked with `status_code` 200 by `API._decode`, or list from a JSON array body) is stored.
+"""
+
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+
+__all__ = (
+    "ResponseCache",
+    "DEFAULT_TTL"
+)
+
+DEFAULT_TTL = {
+    "/v1/ticker": 0.5,
+    "/v1/board": 0.5,
+    "/v1/getboardstate": 1.0,
+    "/v1/gethealth": 1.0,
+    "/v1/markets": 60.0
+}
+
+
+def is_success(value):
+    """ response decoded from 200 OK (error returns are dict with `status` and `error_message`) """
+    if type(value) is list:
+        return True
+    return type(value) is dict and value.get('status_code') == 200
+
+
+class _Pending:
+    """ result of in-flight request shared by coalesced callers """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+
+
+class ResponseCache:
+
+    def __init__(self,
+                 ttl: dict = None,
+                 max_size: int = 128):
+        """
+
+        :param ttl: time-to-live (sec) by endpoint. Endpoints not in the dict are neither cached nor coalesced.
+        :param max_size: max number of cached responses
+        """
+        self.ttl = DEFAULT_TTL.copy() if ttl is None else ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.__entries = OrderedDict()  # key -> (expire time, value)
+        self.__pending = dict()  # key -> _Pending
+        self.__pending_async = dict()  # key -> asyncio.Future
+        self.__lock = threading.Lock()
+
+    def __contains__(self, endpoint):
+        return endpoint in self.ttl
+
+    @staticmethod
+    def key(endpoint, params=None):
+        if not params:
+            return endpoint, ()
+        return endpoint, tuple(sorted((k, str(v)) for k, v in params.items()))
+
+    def __lookup(self, key):
+        """ cached value or None (call with lock) """
+        if key in self.__entries:
+            expire, value = self.__entries[key]
+            if time.monotonic() < expire:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.__entries[key]
+        return None
+
+    def __store(self, key, value):
+        if not is_success(value):
+            return
+        with self.__lock:
+            self.__entries[key] = (time.monotonic() + self.ttl[key[0]], value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+
+    def get(self, endpoint, params, fetch):
+        """ Cached response or the result of `fetch()`, coalescing callers from other threads """
+        key = self.key(endpoint, params)
+        with self.__lock:
+            value = self.__lookup(key)
+            if value is not None:
+                return value
+            pending = self.__pending.get(key)
+            if pending is None:
+                pending = self.__pending[key] = _Pending()
+                self.misses += 1
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+
+        if not owner:
+            pending.event.wait()
+            return pending.value
+
+        try:
+            pending.value = fetch()
+            self.__store(key, pending.value)
+        finally:
+            with self.__lock:
+                del self.__pending[key]
+            pending.event.set()
+        return pending.value
+
+    async def get_async(self, endpoint, params, fetch):
+        """ Cached response or the result of `await fetch()`, coalescing callers on the same event loop """
+        key = self.key(endpoint, params)
+        with self.__lock:
+            value = self.__lookup(key)
+            if value is not None:
+                return value
+        if key in self.__pending_async:
+            self.coalesced += 1
+            return await asyncio.shield(self.__pending_async[key])
+
+        self.misses += 1
+        future = self.__pending_async[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await fetch()
+            self.__store(key, value)
+            future.set_result(value)
+        except BaseException:
+            # API.request doesn't raise, so this is cancellation of the owner: waiters are cancelled as well
+            future.cancel()
+            raise
+        finally:
+            del self.__pending_async[key]
+        return value
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    @property
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, coalesced=self.coalesced, size=len(self.__entries))
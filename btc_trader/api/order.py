@@ -8,8 +8,9 @@ __all__ = (
 class Order:
     """Order API (HTTP Private API)"""
 
-    def __init__(self, api_key=None, api_secret=None, timeout=None):
-        self.api = API(api_key, api_secret, timeout)
+    def __init__(self, api_key=None, api_secret=None, timeout=None, api: API = None, api_url: str = None):
+        """ Pass `api` to share one connection pool with other API instances """
+        self.api = API(api_key, api_secret, timeout, api_url=api_url) if api is None else api
 
     def get_balance(self, **params):
         """Get Account Asset Balance
@@ -1,4 +1,5 @@
 from .base import API
+from .cache import ResponseCache
 
 __all__ = (
     "Public"
@@ -8,8 +9,22 @@ __all__ = (
 class Public:
     """Order API (HTTP Private API)"""
 
-    def __init__(self, api_key=None, api_secret=None, timeout=None):
-        self.api = API(api_key, api_secret, timeout)
+    def __init__(self, api_key=None, api_secret=None, timeout=None, api: API = None, api_url: str = None,
+                 cache: bool = False, cache_ttl: dict = None, cache_size: int = 128):
+        """ Pass `api` to share one connection pool with other API instances
+
+        :param cache: if True, responses of market endpoints are cached and identical requests in flight are
+                      coalesced (returned values are shared, so don't modify them)
+        :param cache_ttl: time-to-live (sec) by endpoint (`cache.DEFAULT_TTL` if None)
+        :param cache_size: max number of cached responses
+        """
+        self.api = API(api_key, api_secret, timeout, api_url=api_url) if api is None else api
+        self.cache = ResponseCache(cache_ttl, cache_size) if cache else None
+
+    def _request(self, endpoint, params=None):
+        if self.cache is None or endpoint not in self.cache:
+            return self.api.request(endpoint, params=params)
+        return self.cache.get(endpoint, params, lambda: self.api.request(endpoint, params=params))
 
     def markets(self):
         """Order Book
@@ -17,7 +32,7 @@ class Public:
             product_code: Designate "BTC_JPY", "FX_BTC_JPY" or "ETH_BTC".
         """
         endpoint = "/v1/markets"
-        return self.api.request(endpoint)
+        return self._request(endpoint)
 
     def board(self, **params):
         """Order Book
@@ -25,7 +40,7 @@ class Public:
             product_code: Designate "BTC_JPY", "FX_BTC_JPY" or "ETH_BTC".
         """
         endpoint = "/v1/board"
-        return self.api.request(endpoint, params=params)
+        return self._request(endpoint, params=params)
     
     def ticker(self, **params):
         """Ticker
@@ -33,7 +48,7 @@ class Public:
             product_code: Designate "BTC_JPY", "FX_BTC_JPY" or "ETH_BTC".
         """
         endpoint = "/v1/ticker"
-        return self.api.request(endpoint, params=params)
+        return self._request(endpoint, params=params)
 
     def executions(self, **params):
         """Execution History
@@ -42,7 +57,7 @@ class Public:
             count, before, after: See Pagination.
         """
         endpoint = "/v1/executions"
-        return self.api.request(endpoint, params=params)
+        return self._request(endpoint, params=params)
     
     def get_board_state(self, **params):
         """Order book status
@@ -50,7 +65,7 @@ class Public:
             product_code: Designate "BTC_JPY", "FX_BTC_JPY" or "ETC_BTC".
         """
         endpoint = "/v1/getboardstate"
-        return self.api.request(endpoint, params=params)
+        return self._request(endpoint, params=params)
     
     def get_health(self, **params):
         """Exchange status
@@ -64,7 +79,7 @@ class Public:
                 STOP: The exchange has been stopped. Orders will not be accepted.
         """
         endpoint = "/v1/gethealth"
-        return self.api.request(endpoint, params=params)
+        return self._request(endpoint, params=params)
 
     def get_chats(self, **params):
         """ Chat: Get an instrument list
@@ -72,4 +87,4 @@ class Public:
             from_date: This accesses a list of any new messages after this date.
         """
         endpoint = "/v1/getchats"
-        return self.api.request(endpoint, params=params)
+        return self._request(endpoint, params=params)
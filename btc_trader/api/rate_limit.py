@@ -0,0 +1,150 @@
+""" Client-side rate limiter for bitFlyer HTTP API
+
+According to the official document, API usage is limited approximately as below.
+    - private API: 200 queries per minute
+    - each IP address: 500 queries per minute
+    - orders with size 0.1 or less: 10 orders per minute (may be applied to users who place many small orders)
+
+Each limit is a token bucket refilled continuously, and a request has to take one token from every bucket it counts
+against. Requests are put into priority lanes so that order placement and loss-cut are not kept waiting by status
+polling: lower lanes are not allowed to drain a bucket below a reserved floor, while the order lane may even borrow
+future tokens (it waits for them but is queued ahead of every lower-lane request).
+"""
+
+import time
+import threading
+
+__all__ = (
+    "RateLimiter",
+    "TokenBucket",
+    "PRIORITY_ORDER",
+    "PRIORITY_DEFAULT",
+    "PRIORITY_POLLING"
+)
+
+PRIORITY_ORDER = 0  # order placement, cancel, loss-cut
+PRIORITY_DEFAULT = 1  # market data, collateral, positions, ...
+PRIORITY_POLLING = 2  # order status polling
+
+# fraction of bucket capacity which can't be consumed by the lane
+LANE_FLOOR = {PRIORITY_ORDER: 0.0, PRIORITY_DEFAULT: 0.2, PRIORITY_POLLING: 0.5}
+
+ORDER_ENDPOINTS = ["/v1/me/sendchildorder", "/v1/me/sendparentorder", "/v1/me/cancelchildorder",
+                   "/v1/me/cancelparentorder", "/v1/me/cancelallchildorders"]
+NEW_ORDER_ENDPOINTS = ["/v1/me/sendchildorder", "/v1/me/sendparentorder"]
+POLLING_ENDPOINTS = ["/v1/me/getchildorders", "/v1/me/getparentorders", "/v1/me/getparentorder",
+                     "/v1/me/getexecutions"]
+SMALL_ORDER_SIZE = 0.1
+
+
+class TokenBucket:
+    """ Token bucket: `rate_per_min` tokens are added per minute, up to `burst` tokens """
+
+    def __init__(self,
+                 rate_per_min: float,
+                 burst: float):
+        self.rate = rate_per_min / 60.0
+        self.burst = burst
+        self.__tokens = burst
+        self.__last = time.monotonic()
+
+    def refill(self, now: float):
+        self.__tokens = min(self.burst, self.__tokens + (now - self.__last) * self.rate)
+        self.__last = now
+
+    def wait_time(self, floor: float):
+        """ seconds until one token can be taken without going below `floor` (call `refill` before) """
+        return max(0.0, (floor + 1 - self.__tokens) / self.rate)
+
+    def take(self):
+        self.__tokens -= 1
+
+    @property
+    def tokens(self):
+        return self.__tokens
+
+
+class RateLimiter:
+    """ Rate limiter shared by every request made through one `API` instance (thread safe)
+
+    Within any 60 sec, a default bucket lets through at most `rate_per_min + burst` requests, which equals to the
+    official limits.
+    """
+
+    def __init__(self,
+                 private_per_min: float = 190,
+                 private_burst: float = 10,
+                 ip_per_min: float = 480,
+                 ip_burst: float = 20,
+                 small_order_per_min: float = 9,
+                 small_order_burst: float = 1):
+        self.buckets = dict(
+            private=TokenBucket(private_per_min, private_burst),
+            ip=TokenBucket(ip_per_min, ip_burst),
+            small_order=TokenBucket(small_order_per_min, small_order_burst)
+        )
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def priority(endpoint: str):
+        """ default priority lane of endpoint """
+        if endpoint in ORDER_ENDPOINTS:
+            return PRIORITY_ORDER
+        if endpoint in POLLING_ENDPOINTS:
+            return PRIORITY_POLLING
+        return PRIORITY_DEFAULT
+
+    @staticmethod
+    def bucket_names(endpoint: str, params: dict = None):
+        """ names of bucket which the request counts against """
+        names = ['ip']
+        if endpoint.startswith('/v1/me/'):
+            names.append('private')
+        if endpoint in NEW_ORDER_ENDPOINTS and params is not None:
+            if endpoint == "/v1/me/sendparentorder":
+                sizes = [p.get('size', 0) for p in params.get('parameters', [])]
+            else:
+                sizes = [params.get('size', 0)]
+            if len(sizes) > 0 and min(sizes) <= SMALL_ORDER_SIZE:
+                names.append('small_order')
+        return names
+
+    def try_acquire(self,
+                    endpoint: str,
+                    params: dict = None,
+                    priority: int = None):
+        """ Try to take tokens for one request
+
+        :return: (granted, wait). If granted, tokens are taken and the request can be sent after `wait` sec. If not,
+                 nothing is taken and the caller should retry after `wait` sec.
+        """
+        priority = self.priority(endpoint) if priority is None else priority
+        buckets = [self.buckets[n] for n in self.bucket_names(endpoint, params)]
+        with self.__lock:
+            now = time.monotonic()
+            wait = 0.0
+            for b in buckets:
+                b.refill(now)
+                wait = max(wait, b.wait_time(LANE_FLOOR[priority] * b.burst))
+            if wait > 0 and priority != PRIORITY_ORDER:
+                return False, wait
+            for b in buckets:
+                b.take()
+            return True, wait
+
+    def acquire(self,
+                endpoint: str,
+                params: dict = None,
+                priority: int = None):
+        """ Block until the request is allowed to be sent
+
+        :return: total seconds waited
+        """
+        waited = 0.0
+        while True:
+            granted, wait = self.try_acquire(endpoint, params, priority)
+            if wait > 0:
+                time.sleep(wait)
+                waited += wait
+            if granted:
+                return waited
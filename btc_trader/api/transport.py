@@ -0,0 +1,305 @@
+import time
+import json
+import gzip
+import threading
+from collections import deque, OrderedDict
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.connection import HTTPConnection, HTTPSConnection
+
+__all__ = (
+    "HTTPTransport",
+    "RecordingTransport",
+    "ReplayTransport",
+    "ConnectionStats"
+)
+
+
+class ConnectionStats:
+    """ Counters of a transport's connection usage (thread safe)
+
+    - requests: number of requests sent
+    - connections: number of new TCP(+TLS) connections opened
+    - reused: number of requests served on an already opened connection
+    - handshake_sec: total time spent on opening connections (TCP + TLS handshake)
+    - evictions: number of times the idle pool has been closed
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.connections = 0
+        self.handshake_sec = 0.0
+        self.evictions = 0
+
+    def add_request(self):
+        with self.__lock:
+            self.requests += 1
+
+    def add_connection(self, handshake_sec: float):
+        with self.__lock:
+            self.connections += 1
+            self.handshake_sec += handshake_sec
+
+    def add_eviction(self):
+        with self.__lock:
+            self.evictions += 1
+
+    @property
+    def reused(self):
+        return max(0, self.requests - self.connections)
+
+    @property
+    def reuse_rate(self):
+        return self.reused / self.requests if self.requests > 0 else 0.0
+
+    @property
+    def mean_handshake_sec(self):
+        return self.handshake_sec / self.connections if self.connections > 0 else 0.0
+
+    def as_dict(self):
+        return dict(requests=self.requests,
+                    connections=self.connections,
+                    reused=self.reused,
+                    reuse_rate=self.reuse_rate,
+                    handshake_sec=self.handshake_sec,
+                    mean_handshake_sec=self.mean_handshake_sec,
+                    evictions=self.evictions)
+
+
+def _timed_pool_classes(stats: ConnectionStats):
+    """ urllib3 connection pool classes which report the time spent in `connect` to `stats` """
+
+    class TimedHTTPConnection(HTTPConnection):
+
+        def connect(self):
+            start = time.perf_counter()
+            super(TimedHTTPConnection, self).connect()
+            stats.add_connection(time.perf_counter() - start)
+
+    class TimedHTTPSConnection(HTTPSConnection):
+
+        def connect(self):
+            start = time.perf_counter()
+            super(TimedHTTPSConnection, self).connect()
+            stats.add_connection(time.perf_counter() - start)
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = TimedHTTPConnection
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = TimedHTTPSConnection
+
+    return {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+
+class _TimedAdapter(HTTPAdapter):
+
+    def __init__(self, stats: ConnectionStats, **kwargs):
+        self.__stats = stats
+        super(_TimedAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(_TimedAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _timed_pool_classes(self.__stats)
+
+
+class HTTPTransport:
+    """ Long-lived keep-alive HTTP transport
+
+    One `requests.Session` is kept open and its connections are reused across requests instead of opening a new
+    session (and paying TCP + TLS handshake) for each call. If the transport has not been used for `max_idle_sec`,
+    the pool is closed and re-opened lazily, since the server drops idle keep-alive connections anyway.
+    """
+
+    def __init__(self,
+                 pool_connections: int = 1,
+                 pool_maxsize: int = 4,
+                 max_idle_sec: float = 60.0):
+        """
+
+        :param pool_connections: number of hosts to keep a connection pool for
+        :param pool_maxsize: max number of connections kept open per host
+        :param max_idle_sec: close the pool when it has been idle for longer than this (None to disable)
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_idle_sec = max_idle_sec
+        self.stats = ConnectionStats()
+        self.__session = None
+        self.__last_used = 0.0
+        self.__lock = threading.Lock()
+
+    def __open(self):
+        session = requests.Session()
+        adapter = _TimedAdapter(self.stats,
+                                pool_connections=self.pool_connections,
+                                pool_maxsize=self.pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def __get_session(self):
+        with self.__lock:
+            now = time.time()
+            if self.__session is not None and self.max_idle_sec is not None \
+                    and now - self.__last_used > self.max_idle_sec:
+                self.__session.close()
+                self.__session = None
+                self.stats.add_eviction()
+            if self.__session is None:
+                self.__session = self.__open()
+            self.__last_used = now
+            return self.__session
+
+    def send(self,
+             method: str,
+             url: str,
+             headers: dict = None,
+             params: dict = None,
+             data: str = None,
+             timeout: float = None):
+        """ Send one request
+
+        :return: (status_code, content in bytes)
+        """
+        session = self.__get_session()
+        self.stats.add_request()
+        response = session.request(method, url, headers=headers, params=params, data=data, timeout=timeout)
+        return response.status_code, response.content
+
+    def close(self):
+        """ Close all pooled connections. The transport can still be used after close (pool will be re-opened). """
+        with self.__lock:
+            if self.__session is not None:
+                self.__session.close()
+                self.__session = None
+
+
+class RecordingTransport:
+    """ Transport recording every request/response pair to a gzip json-lines file, while sending it by `transport`
+
+    One line per request, {"t": sec from start, "d": response time, "m": method, "u": path, "q": query parameters,
+    "b": request body, "s": status code, "c": response body}. Headers are not recorded, so the file contains no
+    API key nor signature.
+    """
+
+    def __init__(self,
+                 path: str,
+                 transport=None):
+        """
+
+        :param path: file to write (overwritten)
+        :param transport: transport to send request (`HTTPTransport` if None)
+        """
+        self.transport = HTTPTransport() if transport is None else transport
+        self.__file = gzip.open(path, 'wt')
+        self.__start = time.time()
+        self.__lock = threading.Lock()
+
+    @property
+    def stats(self):
+        return self.transport.stats
+
+    def send(self,
+             method: str,
+             url: str,
+             headers: dict = None,
+             params: dict = None,
+             data: str = None,
+             timeout: float = None):
+        start = time.time()
+        status_code, content = self.transport.send(
+            method, url, headers=headers, params=params, data=data, timeout=timeout)
+        record = dict(t=round(start - self.__start, 6), d=round(time.time() - start, 6), m=method,
+                      u=urlsplit(url).path, q=params, b=data, s=status_code, c=content.decode('utf-8'))
+        with self.__lock:
+            self.__file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        return status_code, content
+
+    def close(self):
+        self.transport.close()
+        with self.__lock:
+            if not self.__file.closed:
+                self.__file.close()
+
+
+class ReplayTransport:
+    """ Transport answering requests with responses recorded by `RecordingTransport`, without network
+
+    A request gets the earliest unused response recorded for the same (method, path, parameters, body). If there
+    is none (eg, order price differs from the recording), the earliest unused one for the same (method, path) is
+    used, and if nothing is left, status 404 with bitFlyer style error body is returned.
+    """
+
+    def __init__(self,
+                 path: str,
+                 time_scale: float = 1.0,
+                 pace: bool = False):
+        """
+
+        :param path: file written by `RecordingTransport`
+        :param time_scale: each response is delayed by its recorded response time x `time_scale` (0 for no delay)
+        :param pace: if True, a response is also held until its recorded time from start x `time_scale`, so that
+                     the original request timing is reproduced
+        """
+        self.time_scale = time_scale
+        self.pace = pace
+        self.stats = ConnectionStats()
+        self.__exact = dict()
+        self.__by_endpoint = dict()
+        self.__lock = threading.Lock()
+        with gzip.open(path, 'rt') as f:
+            for n, line in enumerate(f):
+                record = json.loads(line)
+                record['n'] = n
+                self.__exact.setdefault(self.__key(record['m'], record['u'], record['q'], record['b']),
+                                        deque()).append(record)
+                self.__by_endpoint.setdefault((record['m'], record['u']), OrderedDict())[n] = record
+        self.__start = None
+
+    @staticmethod
+    def __key(method, path, params, data):
+        params = tuple(sorted((k, str(v)) for k, v in params.items())) if params else ()
+        return method, path, params, data
+
+    def __pop(self, method, path, params, data):
+        with self.__lock:
+            if self.__start is None:
+                self.__start = time.time()
+            records = self.__exact.get(self.__key(method, path, params, data))
+            if records:
+                record = records.popleft()
+            elif self.__by_endpoint.get((method, path)):
+                _, record = self.__by_endpoint[(method, path)].popitem(last=False)
+                self.__exact[self.__key(method, path, record['q'], record['b'])].remove(record)
+                return record
+            else:
+                return None
+            del self.__by_endpoint[(method, path)][record['n']]
+            return record
+
+    def send(self,
+             method: str,
+             url: str,
+             headers: dict = None,
+             params: dict = None,
+             data: str = None,
+             timeout: float = None):
+        self.stats.add_request()
+        record = self.__pop(method, urlsplit(url).path, params, data)
+        if record is None:
+            return 404, json.dumps(dict(status=-1, error_message='no recorded response')).encode('utf-8')
+        if self.pace:
+            time.sleep(max(0.0, self.__start + record['t'] * self.time_scale - time.time()))
+        if self.time_scale > 0:
+            time.sleep(record['d'] * self.time_scale)
+        return record['s'], record['c'].encode('utf-8')
+
+    def close(self):
+        pass
@@ -12,23 +12,21 @@ from .util.util import unix_time, date_time
 
 def candle_ohlc(con, period, start=None, end=None, limit=None, ma=[5, 10], volume=False, adjust=False,
                 figsize=(10, 8)):
-
-    query = "select * from price where sample_period = %i" % period
-    if start is not None and type(start) == str:
-        query += " and close_unix_time > %i" % unix_time(start)
-    if end is not None and type(end) == str:
-        query += " and close_unix_time < %i" % unix_time(end)
-    query += " order by close_unix_time desc"
-    if limit is not None and type(limit) == int:
-        query += " limit %i" % limit
-    price_volume = []
-    date = []
-
-    for i in con.engine.connect().execute(query):
-        date.append(date_time(i[1]))
-        price_volume.append(list(i[3:8]))
-
-    ohlc = pd.DataFrame(price_volume[::-1], columns=["open", "high", "low", "close", "volume"], index=date[::-1])
+    """ `con` is ConnectPSQL or CandleStore """
+
+    if hasattr(con, 'read'):
+        # CandleStore: slice by binary search on memory-mapped columns
+        begin = unix_time(start) + 1 if start is not None and type(start) == str else None
+        candles = con.read(period, begin=begin, end=unix_time(end) if end is not None and type(end) == str else None)
+        if limit is not None and type(limit) == int:
+            candles = {k: v[-limit:] for k, v in candles.items()}
+        ohlc = pd.DataFrame({"open": candles["open_price"], "high": candles["high_price"],
+                             "low": candles["low_price"], "close": candles["close_price"],
+                             "volume": candles["volume"]},
+                            index=[date_time(int(t)) for t in candles["close_unix_time"]])
+        query = None
+    else:
+        ohlc, query = _ohlc_psql(con, period, start, end, limit)
     ohlc = ohlc[ohlc["low"] != 0]
     fig, ax = _candle(ohlc, ma, volume, figsize)
     if adjust and ma is not None:
@@ -39,6 +37,21 @@ def candle_ohlc(con, period, start=None, end=None, limit=None, ma=[5, 10], volum
     return (fig, ax), query
 
 
+def _ohlc_psql(con, period, start=None, end=None, limit=None):
+    # latest `limit` records if limit is given
+    latest = limit is not None and type(limit) == int
+    query = dict(begin=unix_time(start) if start is not None and type(start) == str else None,
+                 end=unix_time(end) if end is not None and type(end) == str else None,
+                 columns=["close_unix_time", "open_price", "high_price", "low_price", "close_price", "volume"],
+                 ascending=not latest,
+                 limit=limit if latest else None)
+    price = con.query_price(period, **query).sort_values(by="close_unix_time")
+    ohlc = pd.DataFrame(price[["open_price", "high_price", "low_price", "close_price", "volume"]].values,
+                        columns=["open", "high", "low", "close", "volume"],
+                        index=[date_time(int(t)) for t in price["close_unix_time"]])
+    return ohlc, con.price_query(period, **query)[0]
+
+
 def _candle(ohlc, ma=None, volume=False, figsize=(10, 8)):
     # plt.rcParams['font.family'] = 'Times New Roman'
     plt.rcParams['font.size'] = 20
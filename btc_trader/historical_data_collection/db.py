@@ -2,8 +2,9 @@
 Module for database operation
 """
 
+import numpy as np
 import pandas as pd
-from sqlalchemy import Column, DateTime, Float, Integer, String, create_engine
+from sqlalchemy import Column, DateTime, Float, Integer, String, Index, create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -37,26 +38,65 @@ class Price(Base):
     low_price = Column(Float, nullable=False)
     close_price = Column(Float, nullable=False)
     volume = Column(Float, nullable=False)
+    # range scan of one period in time order, covering the price columns (index only scan on postgres)
+    __table_args__ = (
+        Index('ix_price_period_ticker_time', 'sample_period', 'ticker_index', 'close_unix_time',
+              postgresql_include=['open_price', 'high_price', 'low_price', 'close_price', 'volume']),
+    )
+
+
+PRICE_COLUMNS = [c.name for c in Price.__table__.columns]
+PRICE_DTYPES = dict(ticker_index=np.int64, close_unix_time=np.int64, sample_period=np.int64)
+
+
+def _sqlite_pragma(connection, _):
+    """ WAL journal, fsync only at checkpoints, and larger page cache for bulk append """
+    cursor = connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.close()
 
 
 class ConnectPSQL:
     """
     instance to connect postgres DB via sqlalchemy
+
+    With `info` of dict(backend='sqlite', db=<path to file>), the same tables are kept in a local SQLite file instead
+    (no server process). The file is opened in WAL mode so readers (eg, backtest) don't block the collector.
     """
 
     def __init__(self, info):
-        db = "postgresql+psycopg2://{user}@{host}:{port}/{db}".format(**info)
-        self.engine = create_engine(db)
+        if info.get('backend') == 'sqlite':
+            self.engine = create_engine("sqlite:///{db}".format(**info))
+            event.listen(self.engine, 'connect', _sqlite_pragma)
+        else:
+            db = "postgresql+psycopg2://{user}@{host}:{port}/{db}".format(**info)
+            self.engine = create_engine(db)
         session = sessionmaker(bind=self.engine)
         self.session = session()
 
+    @property
+    def backend(self):
+        """ 'postgresql' or 'sqlite' """
+        return self.engine.dialect.name
+
     def create_tables(self):
         Base.metadata.create_all(self.engine)
         self.session.commit()
         self.initializer()
 
+    def create_indexes(self):
+        """ create indexes missing in existing tables (`create_tables` only creates them with new tables) """
+        for index in Price.__table__.indexes:
+            index.create(self.engine, checkfirst=True)
+
     def show_table_name(self):
-        sql = """SELECT relname AS table_name FROM pg_stat_user_tables"""
+        if self.backend == 'sqlite':
+            sql = """SELECT name AS table_name FROM sqlite_master WHERE type = 'table'"""
+        else:
+            sql = """SELECT relname AS table_name FROM pg_stat_user_tables"""
         return pd.read_sql(sql, self.engine)
 
     def get_historical_data(self,
@@ -69,15 +109,88 @@ class ConnectPSQL:
         ['ticker_index', 'close_unix_time', 'sample_period', 'open_price', 'high_price', 'low_price', 'close_price',
         'volume']
         """
-        query = "select * from price where sample_period = %i" % period
+        return self.query_price(period, begin=begin, end=end, ascending=False,
+                                limit=limit if begin is None or end is None else None)
+
+    @staticmethod
+    def price_query(period: int,
+                    begin: int = None,
+                    end: int = None,
+                    columns: list = None,
+                    ticker_index: int = None,
+                    ascending: bool = True,
+                    limit: int = None):
+        """ parameterized query of `price` for `period` with begin < close_unix_time < end
+
+        :return: (sql, parameters)
+        """
+        columns = PRICE_COLUMNS if columns is None else columns
+        unknown = [c for c in columns if c not in PRICE_COLUMNS]
+        if len(unknown) > 0:
+            raise ValueError('unknown columns: %s' % unknown)
+        query = "select %s from %s where sample_period = :period" % (', '.join(columns), Price.__tablename__)
+        parameters = dict(period=int(period))
+        if ticker_index is not None:
+            query += " and ticker_index = :ticker_index"
+            parameters['ticker_index'] = int(ticker_index)
         if begin is not None:
-            query += ' and close_unix_time > %i' % begin
+            query += " and close_unix_time > :begin"
+            parameters['begin'] = int(begin)
         if end is not None:
-            query += ' and close_unix_time < %i' % end
-        query += " order by close_unix_time desc"
-        if begin is None or end is None:
-            query += " limit %i;" % limit
-        return pd.read_sql(query, self.engine)
+            query += " and close_unix_time < :end"
+            parameters['end'] = int(end)
+        query += " order by close_unix_time %s" % ('asc' if ascending else 'desc')
+        if limit is not None:
+            query += " limit :limit"
+            parameters['limit'] = int(limit)
+        return query, parameters
+
+    def query_price(self,
+                    period: int,
+                    begin: int = None,
+                    end: int = None,
+                    columns: list = None,
+                    ticker_index: int = None,
+                    ascending: bool = True,
+                    limit: int = None):
+        """ records of `price` for `period` with begin < close_unix_time < end as data frame
+
+        :param columns: columns to select (all if None)
+        :param ticker_index: all tickers if None
+        :param limit: first `limit` records in the order
+        """
+        query, parameters = self.price_query(period, begin, end, columns, ticker_index, ascending, limit)
+        with self.engine.connect() as connection:
+            return pd.read_sql(text(query), connection, params=parameters)
+
+    def iter_price(self,
+                   period: int,
+                   begin: int = None,
+                   end: int = None,
+                   columns: list = None,
+                   ticker_index: int = 1,
+                   chunk_size: int = 100000):
+        """ records of `price` for `period` with begin < close_unix_time < end in ascending order, as dict of
+        column -> numpy array of up to `chunk_size` records
+
+        Each chunk is one range query from the last `close_unix_time` of the previous one (keyset pagination on
+        `ix_price_period_ticker_time`), so scanning years of records takes constant memory and no server cursor.
+        """
+        columns = PRICE_COLUMNS if columns is None else columns
+        selected = columns if 'close_unix_time' in columns else columns + ['close_unix_time']
+        last = begin
+        while True:
+            query, parameters = self.price_query(period, last, end, selected, ticker_index, True, chunk_size)
+            with self.engine.connect() as connection:
+                rows = connection.execute(text(query), parameters).fetchall()
+            if len(rows) == 0:
+                return
+            values = list(zip(*rows))
+            chunk = {c: np.asarray(v, dtype=PRICE_DTYPES.get(c, np.float64)) for c, v in zip(selected, values)}
+            last = int(chunk['close_unix_time'][-1])
+            yield {c: chunk[c] for c in columns}
+            if len(rows) < chunk_size:
+                return
 
     def initializer(self):
         """ Initialize tables """
@@ -0,0 +1,149 @@
+"""
+Gap detection and backfill of `price` table
+
+Missing records are found as consecutive `close_unix_time` more than one `sample_period` apart in each
+(ticker_index, sample_period). On `ConnectPSQL` it's one `LAG` window query on the server (no table is loaded into
+pandas), and on `CandleStore` it's a diff of the memory-mapped time column. Gaps are then re-downloaded by bounded
+number of concurrent requests, eg)
+
+    gaps = find_gaps(con)
+    backfill_gaps(con, gaps, max_workers=4)
+    print(coverage(con))
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from .. import util
+from . import db
+from .update_price import get_session, get_ohlc_bf, parse_ohlc, insert_prices, MAX_WORKERS, BATCH_MAX_RECORDS
+
+__all__ = (
+    "find_gaps",
+    "backfill_gaps",
+    "coverage"
+)
+
+GAP_COLUMNS = ['ticker_index', 'sample_period', 'begin', 'end', 'missing']
+
+
+def find_gaps(source, period: int = None, ticker_index: int = None):
+    """ Gaps in each (ticker_index, sample_period)
+
+    :param source: `ConnectPSQL` or `CandleStore`
+    :param period: sampling period, if None, all periods
+    :return: data frame of gaps with `GAP_COLUMNS` (`begin` and `end` are `close_unix_time` of the records next to the
+             gap, which are stored, and `missing` is the number of records expected in between)
+    """
+    if hasattr(source, 'read'):
+        gaps = []
+        tickers = [1] if ticker_index is None else [ticker_index]
+        for _ticker in tickers:
+            for _period in source.periods(_ticker) if period is None else [period]:
+                time = source.read(_period, columns=['close_unix_time'], ticker_index=_ticker)['close_unix_time']
+                diff = np.diff(time)
+                index = np.flatnonzero(diff > _period)
+                gaps.append(pd.DataFrame(dict(ticker_index=_ticker, sample_period=_period, begin=time[index],
+                                              end=time[index + 1], missing=diff[index] // _period - 1)))
+        gaps = [g for g in gaps if len(g) > 0]
+        return pd.concat(gaps, ignore_index=True)[GAP_COLUMNS] if len(gaps) > 0 else pd.DataFrame(columns=GAP_COLUMNS)
+
+    condition, parameter = [], dict()
+    if period is not None:
+        condition.append('sample_period = :period')
+        parameter['period'] = period
+    if ticker_index is not None:
+        condition.append('ticker_index = :ticker_index')
+        parameter['ticker_index'] = ticker_index
+    query = """select ticker_index, sample_period, prev as begin, close_unix_time as "end",
+                      (close_unix_time - prev) / sample_period - 1 as missing
+               from (select ticker_index, sample_period, close_unix_time,
+                            lag(close_unix_time) over (partition by ticker_index, sample_period
+                                                       order by close_unix_time) as prev
+                     from %s %s) t
+               where close_unix_time - prev > sample_period
+               order by ticker_index, sample_period, begin""" \
+            % (db.Price.__tablename__, 'where ' + ' and '.join(condition) if len(condition) > 0 else '')
+    with source.engine.connect() as connection:
+        rows = connection.execute(text(query), parameter).fetchall()
+    return pd.DataFrame([tuple(r) for r in rows], columns=GAP_COLUMNS)
+
+
+def coverage(source, gaps: pd.DataFrame = None):
+    """ Coverage report of each (ticker_index, sample_period)
+
+    :param source: `ConnectPSQL` or `CandleStore`
+    :param gaps: result of `find_gaps` (found again if None)
+    :return: data frame with first/last `close_unix_time`, number of records, expected number of records,
+             coverage (records / expected), number of gaps and missing records
+    """
+    if hasattr(source, 'read'):
+        rows = []
+        for _period in source.periods():
+            time = source.read(_period, columns=['close_unix_time'])['close_unix_time']
+            if len(time) > 0:
+                rows.append((1, _period, int(time[0]), int(time[-1]), len(time)))
+    else:
+        query = """select ticker_index, sample_period, min(close_unix_time), max(close_unix_time), count(*)
+                   from %s group by ticker_index, sample_period order by ticker_index, sample_period""" \
+                % db.Price.__tablename__
+        with source.engine.connect() as connection:
+            rows = [tuple(r) for r in connection.execute(text(query)).fetchall()]
+    report = pd.DataFrame(rows, columns=['ticker_index', 'sample_period', 'first', 'last', 'records'])
+    gaps = find_gaps(source) if gaps is None else gaps
+    summary = gaps.groupby(['ticker_index', 'sample_period'])['missing'].agg(['count', 'sum']).reset_index()
+    summary.columns = ['ticker_index', 'sample_period', 'gaps', 'missing']
+    report = report.merge(summary, on=['ticker_index', 'sample_period'], how='left').fillna(dict(gaps=0, missing=0))
+    report['expected'] = (report['last'] - report['first']) // report['sample_period'] + 1
+    report['coverage'] = report['records'] / report['expected']
+    return report.astype(dict(gaps=int, missing=int))
+
+
+def backfill_gaps(con, gaps: pd.DataFrame, max_workers: int = MAX_WORKERS, max_records: int = BATCH_MAX_RECORDS,
+                  debug: bool = True):
+    """ Download missing records of gaps into `price`
+
+    A gap longer than `max_records` records is split into several jobs, and at most `max_workers` jobs are in flight
+    over one pooled session. Records already stored are skipped by `insert_prices`, so it's safe to run again.
+    Gaps the API has no records for (eg, exchange maintenance) remain and show up in `coverage`.
+
+    :param con: ConnectPSQL instance
+    :param gaps: result of `find_gaps`
+    :return: dict of (ticker_index, sample_period) -> number of records inserted
+    """
+    logger = util.create_log() if debug else None
+
+    def log(msg):
+        if logger is not None:
+            logger.info(msg)
+
+    jobs = []
+    for ticker, period, begin, end, _ in gaps[GAP_COLUMNS].itertuples(index=False):
+        ticker, period, begin, end = int(ticker), int(period), int(begin), int(end)
+        for _begin in range(begin, end, period * max_records):
+            jobs.append((ticker, period, _begin, min(end, _begin + period * (max_records + 1))))
+    log('backfill %i gaps by %i jobs' % (len(gaps), len(jobs)))
+
+    filled = dict()
+    session = get_session(max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(get_ohlc_bf, after=begin, before=end, period=str(period), session=session):
+                   (ticker, period, begin, end) for ticker, period, begin, end in jobs}
+        for future in as_completed(futures):
+            ticker, period, begin, end = futures[future]
+            try:
+                # from `begin` (stored already) so that a gap of one record isn't taken as the incomplete last one
+                prices = parse_ohlc(future.result(), ticker, period, begin)
+                if prices is None:
+                    continue
+                prices = prices[(prices["close_unix_time"] > begin) & (prices["close_unix_time"] < end)]
+                if len(prices) == 0:
+                    continue
+                inserted = insert_prices(con, prices, [])
+                filled[(ticker, period)] = filled.get((ticker, period), 0) + inserted
+            except Exception as err:
+                log(err)
+    for (ticker, period), inserted in sorted(filled.items()):
+        log("tick %i period %i: %i records filled" % (ticker, period, inserted))
+    return filled
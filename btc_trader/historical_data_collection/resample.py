@@ -0,0 +1,153 @@
+"""
+Higher period candles resampled from 60 sec candles
+
+A candle of `sample_period` P closing at T aggregates the 60 sec candles closing in (T - P, T], where T is a multiple of
+P shifted by the offset of the period (see `infer_offset`):
+
+    - open: open of the first one, close: close of the last one
+    - high/low: max/min of them
+    - volume: sum of them
+
+`resample` does it at once over arrays (backfill), and `Resampler` keeps the unfinished candle of each period so that
+60 sec candles can be appended as they arrive, eg)
+
+    resampler = Resampler()
+    candles = resampler.append(prices)  # dict of period -> data frame of finished candles
+"""
+
+import numpy as np
+import pandas as pd
+
+__all__ = (
+    "Resampler",
+    "resample",
+    "infer_offset",
+    "compare"
+)
+
+BASE_PERIOD = 60
+PERIODS = [180, 300, 900, 1800, 3600, 7200, 14400, 21600, 43200, 86400, 259200, 604800]
+COLUMNS = ['close_unix_time', 'open_price', 'high_price', 'low_price', 'close_price', 'volume']
+
+
+def infer_offset(close_unix_time, period: int):
+    """ most frequent `close_unix_time % period` of downloaded candles (eg, weekly candles don't close on Thursday
+    00:00 UTC, which is the multiple of 604800) """
+    remainder = np.asarray(close_unix_time, dtype=np.int64) % period
+    if len(remainder) == 0:
+        return 0
+    values, counts = np.unique(remainder, return_counts=True)
+    return int(values[np.argmax(counts)])
+
+
+def _bucket(time, period, offset):
+    """ close time of the candle of `period` each 60 sec candle belongs to """
+    return -((offset - time) // period) * period + offset
+
+
+def resample(prices, period: int, offset: int = 0):
+    """ Candles of `period` from 60 sec candles at once
+
+    :param prices: data frame (or dict of arrays) of 60 sec candles in ascending order of `close_unix_time`
+    :return: (dict of column -> array, number of 60 sec candles in each candle). The last candle may not be finished.
+    """
+    time = np.asarray(prices['close_unix_time'], dtype=np.int64)
+    if len(time) == 0:
+        return {k: np.zeros(0) for k in COLUMNS}, np.zeros(0, dtype=np.int64)
+    bucket = _bucket(time, period, offset)
+    start = np.flatnonzero(np.concatenate([[True], bucket[1:] != bucket[:-1]]))
+    end = np.concatenate([start[1:], [len(time)]]) - 1
+    candles = dict(
+        close_unix_time=bucket[start],
+        open_price=np.asarray(prices['open_price'], dtype=np.float64)[start],
+        high_price=np.maximum.reduceat(np.asarray(prices['high_price'], dtype=np.float64), start),
+        low_price=np.minimum.reduceat(np.asarray(prices['low_price'], dtype=np.float64), start),
+        close_price=np.asarray(prices['close_price'], dtype=np.float64)[end],
+        volume=np.add.reduceat(np.asarray(prices['volume'], dtype=np.float64), start)
+    )
+    return candles, end - start + 1
+
+
+def compare(resampled: pd.DataFrame, downloaded: pd.DataFrame, atol: float = 1e-6):
+    """ Compare resampled candles with downloaded ones of the same period
+
+    :return: (dict of summary, data frame of mismatched candles joined on `close_unix_time`)
+    """
+    joined = resampled[COLUMNS].merge(downloaded[COLUMNS], on='close_unix_time', suffixes=('', '_downloaded'))
+    mismatch = np.zeros(len(joined), dtype=bool)
+    for k in COLUMNS[1:]:
+        mismatch |= ~np.isclose(joined[k].values, joined[k + '_downloaded'].values, rtol=0, atol=atol)
+    summary = dict(resampled=len(resampled), downloaded=len(downloaded), compared=len(joined),
+                   mismatched=int(mismatch.sum()))
+    return summary, joined[mismatch]
+
+
+class Resampler:
+
+    def __init__(self,
+                 periods: list = None,
+                 offsets: dict = None,
+                 ticker_index: int = 1):
+        """
+
+        :param periods: periods to build (all periods of collector but 60 sec if None)
+        :param offsets: dict of period -> offset of close time (0 if not given), see `infer_offset`
+        """
+        self.periods = PERIODS if periods is None else sorted(periods)
+        self.offsets = dict() if offsets is None else offsets
+        self.ticker_index = ticker_index
+        # period -> unfinished candle as dict of column -> value
+        self.__partial = dict()
+        self.__last_unix_time = None
+
+    @property
+    def last_unix_time(self):
+        """ `close_unix_time` of the latest 60 sec candle appended, None if nothing is appended """
+        return self.__last_unix_time
+
+    def partial(self, period: int):
+        """ unfinished candle of `period` (dict of column -> value), None if there is none """
+        return self.__partial.get(period)
+
+    def append(self, prices):
+        """ Append finished 60 sec candles (older than ones already appended are ignored)
+
+        A candle of each period is emitted once the 60 sec candle closing at its close time is appended, or once a
+        60 sec candle of a later candle is appended (some 60 sec candles were missing).
+
+        :param prices: data frame (or dict of arrays) of 60 sec candles with columns of `price` table
+        :return: dict of period -> data frame of newly finished candles (`COLUMNS` and `ticker_index`,
+                 `sample_period`)
+        """
+        time = np.asarray(prices['close_unix_time'], dtype=np.int64)
+        order = np.argsort(time, kind='stable')
+        keep = order if self.__last_unix_time is None else order[time[order] > self.__last_unix_time]
+        keep = keep[np.concatenate([[True], np.diff(time[keep]) != 0])] if len(keep) > 0 else keep
+        base = {k: np.asarray(prices[k])[keep] for k in COLUMNS}
+        finished = dict()
+        if len(keep) == 0:
+            return finished
+        self.__last_unix_time = int(base['close_unix_time'][-1])
+
+        for period in self.periods:
+            candles, _ = resample(base, period, self.offsets.get(period, 0))
+            partial = self.__partial.pop(period, None)
+            if partial is not None:
+                if partial['close_unix_time'] == candles['close_unix_time'][0]:
+                    # 60 sec candles continuing the unfinished one
+                    candles['open_price'][0] = partial['open_price']
+                    candles['high_price'][0] = max(partial['high_price'], candles['high_price'][0])
+                    candles['low_price'][0] = min(partial['low_price'], candles['low_price'][0])
+                    candles['volume'][0] += partial['volume']
+                else:
+                    candles = {k: np.concatenate([[partial[k]], v]) for k, v in candles.items()}
+            # the last one is unfinished unless the latest 60 sec candle closes it
+            if candles['close_unix_time'][-1] != self.__last_unix_time:
+                self.__partial[period] = {k: v[-1].item() for k, v in candles.items()}
+                candles = {k: v[:-1] for k, v in candles.items()}
+            if len(candles['close_unix_time']) > 0:
+                candles = pd.DataFrame(candles)
+                candles.insert(0, 'ticker_index', self.ticker_index)
+                candles.insert(2, 'sample_period', period)
+                finished[period] = candles
+        return finished
@@ -0,0 +1,127 @@
+"""
+Local columnar candle store as an alternative to `price` table
+
+Each (ticker_index, sample_period) has one raw binary file per column under `<root>/<ticker_index>/<sample_period>/`,
+which is appended to by `append` and memory-mapped by `read`. Rows are kept in ascending order of `close_unix_time`,
+so a time range is found by binary search on the time column and returned as zero-copy slices of the mapped arrays:
+
+    store = CandleStore('./candles')
+    store.append(60, prices)  # data frame with the columns of `price` table
+    candles = store.read(60, begin=1546300800, end=1548979200)  # dict of column -> np.memmap slice
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+__all__ = (
+    "CandleStore"
+)
+
+COLUMNS = ['close_unix_time', 'open_price', 'high_price', 'low_price', 'close_price', 'volume']
+DTYPES = dict(close_unix_time=np.int64, open_price=np.float64, high_price=np.float64, low_price=np.float64,
+              close_price=np.float64, volume=np.float64)
+
+
+class CandleStore:
+
+    def __init__(self, root: str):
+        self.root = root
+        self.__mapped = dict()  # (ticker_index, period) -> (length, dict of column -> np.memmap)
+
+    def __path(self, period, ticker_index, column=None):
+        path = os.path.join(self.root, str(ticker_index), str(period))
+        return path if column is None else os.path.join(path, '%s.bin' % column)
+
+    def __len(self, period, ticker_index):
+        """ number of complete rows (a row is complete once every column has it) """
+        lengths = []
+        for k in COLUMNS:
+            path = self.__path(period, ticker_index, k)
+            lengths.append(os.path.getsize(path) // np.dtype(DTYPES[k]).itemsize if os.path.exists(path) else 0)
+        return min(lengths)
+
+    def periods(self, ticker_index: int = 1):
+        path = os.path.join(self.root, str(ticker_index))
+        if not os.path.exists(path):
+            return []
+        return sorted(int(p) for p in os.listdir(path) if p.isdigit())
+
+    def length(self, period: int, ticker_index: int = 1):
+        return self.__len(period, ticker_index)
+
+    def last_unix_time(self, period: int, ticker_index: int = 1):
+        """ `close_unix_time` of the latest row, None if empty """
+        time = self.__map(period, ticker_index)['close_unix_time']
+        return int(time[-1]) if len(time) > 0 else None
+
+    def append(self, period: int, prices, ticker_index: int = 1):
+        """ append rows newer than the latest one (older or duplicated rows are dropped)
+
+        :param prices: data frame (or dict of arrays) with the columns of `price` table
+        :return: number of appended rows
+        """
+        time = np.asarray(prices['close_unix_time'], dtype=np.int64)
+        order = np.argsort(time, kind='stable')
+        time = time[order]
+        # drop duplicated and old rows
+        keep = np.concatenate([[True], time[1:] != time[:-1]]) if len(time) > 0 else np.zeros(0, dtype=bool)
+        last = self.last_unix_time(period, ticker_index)
+        if last is not None:
+            keep &= time > last
+        if not keep.any():
+            return 0
+
+        os.makedirs(self.__path(period, ticker_index), exist_ok=True)
+        length = self.__len(period, ticker_index)
+        # time column goes last, so a row shows up in `read` only after it's completely written
+        for k in COLUMNS[1:] + COLUMNS[:1]:
+            values = np.asarray(prices[k], dtype=DTYPES[k])[order][keep]
+            with open(self.__path(period, ticker_index, k), 'r+b' if length > 0 else 'wb') as f:
+                # cut a row left partially written by an interrupted append
+                f.truncate(length * np.dtype(DTYPES[k]).itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(values.tobytes())
+        return int(keep.sum())
+
+    def __map(self, period, ticker_index):
+        length = self.__len(period, ticker_index)
+        key = (ticker_index, period)
+        if key in self.__mapped and self.__mapped[key][0] == length:
+            return self.__mapped[key][1]
+        if length == 0:
+            arrays = {k: np.zeros(0, dtype=DTYPES[k]) for k in COLUMNS}
+        else:
+            arrays = {k: np.memmap(self.__path(period, ticker_index, k), dtype=DTYPES[k], mode='r', shape=(length,))
+                      for k in COLUMNS}
+        self.__mapped[key] = (length, arrays)
+        return arrays
+
+    def read(self,
+             period: int,
+             begin: int = None,
+             end: int = None,
+             columns: list = None,
+             ticker_index: int = 1):
+        """ rows with begin <= close_unix_time < end as dict of column -> read-only np.memmap slice (no copy)
+
+        :param columns: columns to return (all if None)
+        """
+        arrays = self.__map(period, ticker_index)
+        time = arrays['close_unix_time']
+        start = 0 if begin is None else int(np.searchsorted(time, begin, side='left'))
+        stop = len(time) if end is None else int(np.searchsorted(time, end, side='left'))
+        columns = COLUMNS if columns is None else columns
+        return {k: arrays[k][start:stop] for k in columns}
+
+    def read_frame(self,
+                   period: int,
+                   begin: int = None,
+                   end: int = None,
+                   columns: list = None,
+                   ticker_index: int = 1):
+        """ same as `read` as data frame with `ticker_index` and `sample_period` like `price` table (copied) """
+        frame = pd.DataFrame(self.read(period, begin, end, columns, ticker_index))
+        frame.insert(0, 'ticker_index', ticker_index)
+        frame.insert(2, 'sample_period', period)
+        return frame
@@ -0,0 +1,264 @@
+"""
+Candles aggregated from executions (trade tape) of bitFlyer
+
+`TickAggregator` builds candles of any period in seconds (eg, 1, 10, 60) from executions instead of the third party
+OHLC API. A candle closing at T aggregates executions in [T - period, T) (periods without executions have no candle).
+Executions come from
+
+    - `backfill`: `Public.executions` paged backward with `before` cursor down to `after`
+    - `add`: list of executions, eg) from `RealtimeClient` through `consume`
+
+Executions with an id not larger than the last one are dropped. Finished candles are buffered (up to `max_buffer`
+rows) and written in bulk to `CandleStore`, eg)
+
+    aggregator = TickAggregator(CandleStore('./candles'), periods=[1, 10, 60])
+    aggregator.backfill(Public(), after=last_execution_id)
+    asyncio.ensure_future(client.run())
+    await aggregator.consume(client)
+"""
+
+import time
+import asyncio
+import numpy as np
+import pandas as pd
+
+__all__ = (
+    "TickAggregator",
+    "aggregate"
+)
+
+COLUMNS = ['close_unix_time', 'open_price', 'high_price', 'low_price', 'close_price', 'volume']
+
+
+def exec_unix_time_ms(exec_dates):
+    """ exec_date (UTC, eg "2015-07-08T02:43:34.823" or "2019-03-04T12:34:56.7890123Z") -> unix time in msec """
+    return np.array([d.rstrip('Z')[:23] for d in exec_dates], dtype='datetime64[ms]').astype(np.int64)
+
+
+def aggregate(time_ms, price, size, period: int):
+    """ candles of `period` sec from executions in ascending order (dict of column -> array) """
+    time_ms = np.asarray(time_ms, dtype=np.int64)
+    if len(time_ms) == 0:
+        return {k: np.zeros(0, dtype=np.int64 if k == 'close_unix_time' else np.float64) for k in COLUMNS}
+    price = np.asarray(price, dtype=np.float64)
+    bucket = (time_ms // (period * 1000) + 1) * period
+    start = np.flatnonzero(np.concatenate([[True], bucket[1:] != bucket[:-1]]))
+    end = np.concatenate([start[1:], [len(bucket)]]) - 1
+    return dict(close_unix_time=bucket[start],
+                open_price=price[start],
+                high_price=np.maximum.reduceat(price, start),
+                low_price=np.minimum.reduceat(price, start),
+                close_price=price[end],
+                volume=np.add.reduceat(np.asarray(size, dtype=np.float64), start))
+
+
+def _merge(older: dict, newer: dict):
+    """ concatenate candles, combining the last of `older` and the first of `newer` if they're the same candle """
+    if len(older['close_unix_time']) == 0:
+        return newer
+    if len(newer['close_unix_time']) == 0:
+        return older
+    if older['close_unix_time'][-1] != newer['close_unix_time'][0]:
+        return {k: np.concatenate([older[k], newer[k]]) for k in COLUMNS}
+    candles = {k: np.concatenate([older[k], newer[k][1:]]) for k in COLUMNS}
+    n = len(older['close_unix_time']) - 1
+    candles['high_price'][n] = max(older['high_price'][-1], newer['high_price'][0])
+    candles['low_price'][n] = min(older['low_price'][-1], newer['low_price'][0])
+    candles['close_price'][n] = newer['close_price'][0]
+    candles['volume'][n] += newer['volume'][0]
+    return candles
+
+
+class TickAggregator:
+
+    def __init__(self,
+                 store=None,
+                 periods: list = (1, 10, 60),
+                 ticker_index: int = 1,
+                 product_code: str = 'FX_BTC_JPY',
+                 max_buffer: int = 10000,
+                 delay_sec: float = 2.0):
+        """
+
+        :param store: CandleStore to write candles to (candles are kept in `pending` if None)
+        :param periods: periods of candle in seconds
+        :param max_buffer: write to store once this number of finished candles are buffered
+        :param delay_sec: a candle is finished by `close_until` this seconds after its close time, to wait executions
+                          arriving late
+        """
+        self.store = store
+        self.periods = sorted(periods)
+        self.ticker_index = ticker_index
+        self.product_code = product_code
+        self.max_buffer = max_buffer
+        self.delay_sec = delay_sec
+        self.last_id = None
+        self.stats = dict(executions=0, dropped=0, late=0, candles=0, written=0)
+        # period -> the latest unfinished candle (dict of column -> array of length 1)
+        self.__partial = dict()
+        # period -> list of finished candles not written yet
+        self.__pending = {p: [] for p in self.periods}
+        self.__buffered = 0
+        self.__last_close = dict()
+
+    @property
+    def pending(self):
+        """ dict of period -> data frame of finished candles not written yet """
+        return {p: self.__frame(p, c) for p, c in self.__pending.items() if len(c) > 0}
+
+    def __frame(self, period, candles):
+        frame = pd.DataFrame({k: np.concatenate([c[k] for c in candles]) for k in COLUMNS})
+        frame.insert(0, 'ticker_index', self.ticker_index)
+        frame.insert(2, 'sample_period', period)
+        return frame
+
+    def __finish(self, period, candles):
+        size = len(candles['close_unix_time'])
+        if size == 0:
+            return
+        self.__pending[period].append(candles)
+        self.__last_close[period] = int(candles['close_unix_time'][-1])
+        self.__buffered += size
+        self.stats['candles'] += size
+
+    def __update(self, period, candles):
+        """ merge new candles of `period` into the unfinished one and finish all but the latest """
+        last_close = self.__last_close.get(period)
+        if last_close is not None and candles['close_unix_time'][0] <= last_close:
+            # executions of candles already finished
+            late = candles['close_unix_time'] <= last_close
+            self.stats['late'] += int(late.sum())
+            candles = {k: v[~late] for k, v in candles.items()}
+            if len(candles['close_unix_time']) == 0:
+                return
+        if period in self.__partial:
+            candles = _merge(self.__partial.pop(period), candles)
+        self.__finish(period, {k: v[:-1] for k, v in candles.items()})
+        self.__partial[period] = {k: v[-1:] for k, v in candles.items()}
+
+    ##########
+    # Source #
+    ##########
+
+    def add(self, executions: list):
+        """ Aggregate executions (dict with id, price, size and exec_date as `Public.executions`)
+
+        :return: number of executions taken
+        """
+        executions = sorted(executions, key=lambda e: e['id'])
+        if self.last_id is not None:
+            new = [e for e in executions if e['id'] > self.last_id]
+            self.stats['dropped'] += len(executions) - len(new)
+            executions = new
+        if len(executions) == 0:
+            return 0
+        self.last_id = executions[-1]['id']
+        self.stats['executions'] += len(executions)
+        time_ms = exec_unix_time_ms([e['exec_date'] for e in executions])
+        price = [e['price'] for e in executions]
+        size = [e['size'] for e in executions]
+        for period in self.periods:
+            self.__update(period, aggregate(time_ms, price, size, period))
+        if self.__buffered >= self.max_buffer:
+            self.write()
+        return len(executions)
+
+    def backfill(self, public, after: int, before: int = None, count: int = 500):
+        """ Aggregate executions with after < id (< before) by `Public.executions` paged backward. Run it before
+        executions newer than `before` are added.
+
+        Only one page of executions is kept at a time and the candles are built backward from the pages, merging the
+        candle at each page boundary.
+
+        :param public: `Public` instance
+        :param after: id of the last execution aggregated before
+        :param before: id to start from (latest if None)
+        :return: number of executions taken
+        """
+        candles = {p: [] for p in self.periods}  # newest first
+        last_id, total = None, 0
+        cursor = before
+        while True:
+            params = dict(product_code=self.product_code, count=count, after=after)
+            if cursor is not None:
+                params['before'] = cursor
+            page = public.executions(**params)
+            if type(page) is not list:
+                raise ValueError('executions: %s' % page)
+            page = sorted([e for e in page if e['id'] > after], key=lambda e: e['id'])
+            if len(page) == 0:
+                break
+            last_id = page[-1]['id'] if last_id is None else last_id
+            total += len(page)
+            time_ms = exec_unix_time_ms([e['exec_date'] for e in page])
+            price = [e['price'] for e in page]
+            size = [e['size'] for e in page]
+            for period in self.periods:
+                _candles = aggregate(time_ms, price, size, period)
+                newer = candles[period][-1] if len(candles[period]) > 0 else None
+                if newer is not None and _candles['close_unix_time'][-1] == newer['close_unix_time'][0]:
+                    # candle across the page boundary
+                    candles[period][-1] = _merge({k: v[-1:] for k, v in _candles.items()}, newer)
+                    _candles = {k: v[:-1] for k, v in _candles.items()}
+                # the whole page may fall into the candle across the boundary
+                if len(_candles['close_unix_time']) > 0:
+                    candles[period].append(_candles)
+            cursor = page[0]['id']
+            if len(page) < count:
+                break
+
+        if last_id is None:
+            return 0
+        self.last_id = last_id if self.last_id is None else max(self.last_id, last_id)
+        self.stats['executions'] += total
+        for period in self.periods:
+            for _candles in candles[period][::-1]:
+                if len(_candles['close_unix_time']) > 0:
+                    self.__update(period, _candles)
+        if self.__buffered >= self.max_buffer:
+            self.write()
+        return total
+
+    async def consume(self, client, flush_sec: float = 1.0):
+        """ Aggregate executions from `RealtimeClient` (with 'executions' channel) until cancelled. Candles are
+        finished by `close_until` every `flush_sec`, and written once `max_buffer` are buffered. """
+        queue = client.subscribe(('executions', ))
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=flush_sec)
+                    self.add(event.data)
+                except asyncio.TimeoutError:
+                    pass
+                self.close_until(time.time())
+        finally:
+            client.unsubscribe(queue)
+            self.write()
+
+    ##########
+    # Output #
+    ##########
+
+    def close_until(self, unix_time: float):
+        """ finish unfinished candles closing before `unix_time` - `delay_sec` (no more executions for them) """
+        for period in list(self.__partial.keys()):
+            if self.__partial[period]['close_unix_time'][0] <= unix_time - self.delay_sec:
+                self.__finish(period, self.__partial.pop(period))
+        if self.__buffered >= self.max_buffer:
+            self.write()
+
+    def write(self):
+        """ write finished candles to store in bulk
+
+        :return: number of candles written
+        """
+        if self.store is None or self.__buffered == 0:
+            return 0
+        written = 0
+        for period, candles in self.__pending.items():
+            if len(candles) > 0:
+                written += self.store.append(period, self.__frame(period, candles), ticker_index=self.ticker_index)
+                self.__pending[period] = []
+        self.__buffered = 0
+        self.stats['written'] += written
+        return written
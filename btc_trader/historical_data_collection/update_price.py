@@ -1,8 +1,21 @@
+import io
+import time
 import numpy as np
 import pandas as pd
 import requests
 import json
-from . import util, db
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from sqlalchemy import text
+from .. import util
+from . import db, resample
+
+PRICE_COLUMNS = ["ticker_index", "close_unix_time", "sample_period", "open_price", "high_price", "low_price",
+                 "close_price", "volume"]
+MAX_WORKERS = 4
+TIMEOUT = (5.0, 30.0)  # connect, read
+BATCH_MAX_RECORDS = 500
 
 
 def update_time_stamp(con, debug=True):
@@ -15,10 +28,10 @@ def update_time_stamp(con, debug=True):
     log('update time stamp start')
     sql = """select ticker_index, sample_period from %s""" % db.UpdateTime.__tablename__
     ticks, periods, unix_times, date_times = [], [], [], []
-    for tick, p in con.engine.connect().execute(sql):
+    for tick, p in con.engine.connect().execute(text(sql)):
         query = """select close_unix_time from price where sample_period = %i order by close_unix_time desc limit 1"""\
                 % p
-        for _i in con.engine.connect().execute(query):
+        for _i in con.engine.connect().execute(text(query)):
             update_unix_time = _i[0] + 1
         # update_unix_time = int([_i for _i in con.engine.connect().execute(query)][0])
         update_date_time = util.unix_to_jst(update_unix_time)
@@ -33,12 +46,22 @@ def update_time_stamp(con, debug=True):
     log('update time finish successfully')
 
 
-def update_price(con, period: int=None, debug: bool=True):
+def update_price(con, period: int=None, debug: bool=True, store=None, max_workers: int=MAX_WORKERS,
+                 resampler=None, derive: bool=False):
     """ update database
 
+    Periods are fetched concurrently over a pooled session with retries. Periods whose watermarks are recent enough
+    are fetched together by one multi-period request. Each response is parsed and written as soon as it arrives,
+    while the other requests are still waiting.
+
     :param con: ConnectPSQL instance
     :param debug: path to save log file
     :param period: sampling period, if None, update all.
+    :param store: CandleStore instance to append new records to as well (optional)
+    :param max_workers: max number of concurrent requests
+    :param resampler: Resampler to build higher periods from new 60 sec records. If `derive` is False (transition
+                      period), higher periods are still downloaded and the resampled ones are compared with them.
+    :param derive: download only 60 sec records and write higher periods of `resampler` from them
     :return:
     """
 
@@ -48,8 +71,7 @@ def update_price(con, period: int=None, debug: bool=True):
         if logger is not None:
             logger.info(msg)
 
-    clm = ["close_unix_time", "open_price", "high_price", "low_price", "close_price", "volume"]
-    logger.info('update price start')
+    log('update price start')
 
     if period is None:
         query = """select ticker_index, sample_period, update_unix_time from %s"""\
@@ -57,64 +79,219 @@ def update_price(con, period: int=None, debug: bool=True):
     else:
         query = """select ticker_index, sample_period, update_unix_time from %s where sample_period = %i""" \
                 % (db.UpdateTime.__tablename__, period)
-    for ticker, period, update_unix_time in con.engine.connect().execute(query):
-        try:
-            # get price
-            re = get_ohlc_bf(after=update_unix_time, period=period)  # descending order
-            if "result" not in re.keys():
-                log("tick %i period %i: latest" % (ticker, period))
-                continue
-
-            re = np.array(re["result"][str(period)])[:, 0:6]  # json -> list
-            # print(re[:, 0].min(), re[:, 0].max(), update_unix_time)
-            prices = pd.DataFrame(re, columns=clm)
-            prices["ticker_index"] = [ticker] * len(re)
-            prices["sample_period"] = [period] * len(re)
-
-            # sometimes this API return duplicated record so drop duplicate
-            prices = prices.drop_duplicates(
-                subset=["ticker_index", "close_unix_time", "sample_period"], keep='first', inplace=False)
-
-            # even though set `after` parameter for crypto-watch API, this API has bugs that you get several record
-            # before set time so it have to be manually filtered to get correct records
-            prices = prices[prices["close_unix_time"] >= update_unix_time]
-            prices = prices.sort_values(by="close_unix_time")
-
-            if prices.shape[0] == 1:
-                log("tick %i period %i: latest" % (ticker, period))
-                continue
-
-            # last records is not completely calculated so remove it
-            prices[:-1].to_sql(db.Price.__tablename__, con.engine, if_exists='append', index=False)
-
-            # delete old time record
-            con.engine.connect().execute("""delete from %s where ticker_index = %i and sample_period = %i"""
-                                         % (db.UpdateTime.__tablename__, ticker, period))
-            # update time
-            update_unix_time = int(prices["close_unix_time"].values[-1])
-            update_date_time = util.unix_to_jst(update_unix_time)
-            _clm = ["ticker_index", "sample_period", "update_unix_time", "update_time"]
-            df = pd.DataFrame([[ticker, period, update_unix_time, update_date_time]], columns=_clm)
-            df.to_sql(db.UpdateTime.__tablename__, con.engine, if_exists='append', index=False)
-
-            # logging
-            log("tick %i period %i: %i records, update time (%s)"
-                % (ticker, period, prices.shape[0]-1, update_date_time))
-        except Exception as err:
-            log(err)
+    with con.engine.connect() as connection:
+        targets = [(int(t), int(p), int(u)) for t, p, u in connection.execute(text(query))]
+    resampled = []
+    if resampler is not None:
+        base = [u for t, p, u in targets if t == resampler.ticker_index and p == resample.BASE_PERIOD]
+        if len(base) > 0 and resampler.last_unix_time is None:
+            # unfinished candles of higher periods from 60 sec records already stored
+            resampler.append(con.get_historical_data(resample.BASE_PERIOD, begin=base[0] - max(resampler.periods),
+                                                     end=base[0]))
+        if derive:
+            targets = [(t, p, u) for t, p, u in targets if t != resampler.ticker_index or p not in resampler.periods]
+    requests_plan = plan_requests(targets)
+    log('%i periods by %i requests' % (len(targets), len(requests_plan)))
+
+    session = get_session(max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(get_ohlc_bf, after=after, period=','.join(str(p) for _, p, _ in _targets),
+                                   session=session): _targets
+                   for after, _targets in requests_plan}
+        for future in as_completed(futures):
+            new_prices, watermarks = [], []
+            for ticker, period, update_unix_time in futures[future]:
+                try:
+                    prices = parse_ohlc(future.result(), ticker, period, update_unix_time)
+                    if prices is None:
+                        log("tick %i period %i: latest" % (ticker, period))
+                        continue
+
+                    # last records is not completely calculated so remove it
+                    new_prices.append(prices[:-1])
+                    # update time
+                    update_unix_time = int(prices["close_unix_time"].values[-1])
+                    update_date_time = util.unix_to_jst(update_unix_time)
+                    watermarks.append((ticker, period, update_unix_time, update_date_time))
+
+                    # logging
+                    log("tick %i period %i: %i records, update time (%s)"
+                        % (ticker, period, prices.shape[0]-1, update_date_time))
+
+                    if resampler is not None and ticker == resampler.ticker_index \
+                            and period == resample.BASE_PERIOD:
+                        for _period, _prices in resampler.append(prices[:-1]).items():
+                            resampled.append(_prices)
+                            if derive:
+                                new_prices.append(_prices)
+                                partial = resampler.partial(_period)
+                                _update_unix_time = int(partial['close_unix_time']) if partial is not None \
+                                    else int(_prices["close_unix_time"].values[-1]) + _period
+                                watermarks.append((ticker, _period, _update_unix_time,
+                                                   util.unix_to_jst(_update_unix_time)))
+                except Exception as err:
+                    log(err)
+
+            if len(new_prices) > 0:
+                try:
+                    prices = pd.concat(new_prices)
+                    inserted = insert_prices(con, prices, watermarks)
+                    log("inserted %i records (%i duplicated)" % (inserted, prices.shape[0] - inserted))
+                    if store is not None:
+                        for (ticker, period), _prices in prices.groupby(["ticker_index", "sample_period"]):
+                            store.append(period, _prices, ticker_index=ticker)
+                except Exception as err:
+                    log(err)
+
+    if resampler is not None and not derive:
+        for prices in resampled:
+            _period = int(prices["sample_period"].values[0])
+            close_unix_time = prices["close_unix_time"].values
+            downloaded = con.get_historical_data(_period, begin=close_unix_time[0] - 1, end=close_unix_time[-1] + 1)
+            summary, _ = resample.compare(prices, downloaded)
+            log("resampled period %i: %s" % (_period, summary))
     log('update price finish successfully')
 
 
+def plan_requests(targets, now: float=None):
+    """ Group (ticker_index, sample_period, update_unix_time) into requests of (after, targets)
+
+    Periods go into one multi-period request from the oldest watermark among them, as long as that doesn't ask any
+    of them for more than `BATCH_MAX_RECORDS` records. Remaining periods (far behind) are requested one by one.
+    """
+    now = time.time() if now is None else now
+    batch = sorted(targets, key=lambda x: x[2])
+    single = []
+    # drop the oldest watermark until the batch fits
+    while len(batch) > 0 and any((now - batch[0][2]) / p > BATCH_MAX_RECORDS for _, p, _ in batch):
+        single.append(batch.pop(0))
+    plan = [(u, [(t, p, u)]) for t, p, u in single]
+    if len(batch) > 0:
+        plan.append((batch[0][2], batch))
+    return plan
+
+
+def parse_ohlc(response, ticker, period, update_unix_time):
+    """ records of `period` newer than `update_unix_time` in ascending order, None if there is nothing new """
+    if "result" not in response.keys() or str(period) not in response["result"].keys():
+        return None
+    clm = ["close_unix_time", "open_price", "high_price", "low_price", "close_price", "volume"]
+    re = response["result"][str(period)]
+    if len(re) == 0:
+        return None
+    re = np.array(re)[:, 0:6]  # json -> list
+    prices = pd.DataFrame(re, columns=clm)
+    prices["ticker_index"] = [ticker] * len(re)
+    prices["sample_period"] = [period] * len(re)
+
+    # sometimes this API return duplicated record so drop duplicate
+    prices = prices.drop_duplicates(
+        subset=["ticker_index", "close_unix_time", "sample_period"], keep='first', inplace=False)
+
+    # even though set `after` parameter for crypto-watch API, this API has bugs that you get several record
+    # before set time so it have to be manually filtered to get correct records
+    prices = prices[prices["close_unix_time"] >= update_unix_time]
+    prices = prices.sort_values(by="close_unix_time")
+
+    if prices.shape[0] <= 1:
+        return None
+    return prices
+
+
+def insert_prices(con, prices, watermarks):
+    """ Insert records and move update time in one transaction
+
+    Records are streamed by `COPY` into a temporary staging table and merged into `price` by
+    `INSERT ... ON CONFLICT DO NOTHING` on the primary key, so duplicated records (the API sometimes returns records
+    already stored) are skipped on the server. `update_time_index` has no key (it's written by `to_sql`), so it's
+    updated by `UPDATE ... FROM (VALUES ...)` and rows missing there are inserted.
+    On SQLite, records are inserted by one prepared `INSERT OR IGNORE` executed over all of them instead.
+
+    :param con: ConnectPSQL instance
+    :param prices: data frame with `PRICE_COLUMNS`
+    :param watermarks: list of (ticker_index, sample_period, update_unix_time, update_time)
+    :return: number of inserted records
+    """
+    # API returns time as float, so cast keys back to int for integer columns
+    prices = prices[PRICE_COLUMNS].astype(dict(ticker_index=int, close_unix_time=int, sample_period=int))
+    if con.backend == 'sqlite':
+        return _insert_prices_sqlite(con, prices, watermarks)
+
+    from psycopg2.extras import execute_values
+
+    buffer = io.StringIO()
+    prices.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+    columns = ', '.join(PRICE_COLUMNS)
+    with con.engine.begin() as connection:
+        cursor = connection.connection.cursor()
+        cursor.execute("""create temp table price_staging (like %s including defaults) on commit drop"""
+                       % db.Price.__tablename__)
+        cursor.copy_expert("""copy price_staging (%s) from stdin with (format csv)""" % columns, buffer)
+        cursor.execute("""insert into %s (%s) select %s from price_staging
+                          on conflict (ticker_index, close_unix_time, sample_period) do nothing"""
+                       % (db.Price.__tablename__, columns, columns))
+        inserted = cursor.rowcount
+        if len(watermarks) > 0:
+            execute_values(
+                cursor,
+                """with v (ticker_index, sample_period, update_unix_time, update_time) as (values %%s),
+                   updated as (
+                       update %(table)s as u
+                       set update_unix_time = v.update_unix_time, update_time = v.update_time
+                       from v where u.ticker_index = v.ticker_index and u.sample_period = v.sample_period
+                       returning u.ticker_index, u.sample_period)
+                   insert into %(table)s (ticker_index, sample_period, update_unix_time, update_time)
+                   select * from v where not exists (
+                       select 1 from updated
+                       where updated.ticker_index = v.ticker_index and updated.sample_period = v.sample_period)"""
+                % dict(table=db.UpdateTime.__tablename__),
+                watermarks)
+    return inserted
+
+
+def _insert_prices_sqlite(con, prices, watermarks):
+    columns = ', '.join(PRICE_COLUMNS)
+    with con.engine.begin() as connection:
+        cursor = connection.connection.cursor()
+        before = connection.connection.total_changes
+        cursor.executemany("""insert or ignore into %s (%s) values (%s)"""
+                           % (db.Price.__tablename__, columns, ', '.join(['?'] * len(PRICE_COLUMNS))),
+                           prices.itertuples(index=False, name=None))
+        inserted = connection.connection.total_changes - before
+        for ticker, period, update_unix_time, update_time in watermarks:
+            cursor.execute("""update %s set update_unix_time = ?, update_time = ?
+                              where ticker_index = ? and sample_period = ?""" % db.UpdateTime.__tablename__,
+                           (update_unix_time, str(update_time), ticker, period))
+            if cursor.rowcount == 0:
+                cursor.execute("""insert into %s (ticker_index, sample_period, update_unix_time, update_time)
+                                  values (?, ?, ?, ?)""" % db.UpdateTime.__tablename__,
+                               (ticker, period, update_unix_time, str(update_time)))
+    return inserted
+
+
 def initialize_db(con):
     con.create_tables()
 
 
-def get_ohlc_bf(before=None, after=None, period=None):
+def get_session(pool_maxsize: int=MAX_WORKERS, retries: int=3):
+    """ Session keeping connections to cryptowatch alive, retrying GET on connection error, 429 and 5xx with
+    exponential backoff """
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=["GET"], respect_retry_after_header=True)
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_maxsize=pool_maxsize, max_retries=retry))
+    return session
+
+
+def get_ohlc_bf(before=None, after=None, period=None, session=None, timeout=TIMEOUT):
     """ Get OHLC from cryptowatch
 
     :param int before: unix time
     :param int after: unix time
-    :param int period: if None, get all periods
+    :param int period: if None, get all periods. Comma separated periods (eg, "60,180") for several periods.
+    :param session: requests session (eg, from `get_session`). New connection if None.
+    :param timeout: (connect, read) timeout in seconds
     :return:
     """
     url = "https://api.cryptowat.ch/markets/bitflyer/btcfxjpy/ohlc"
@@ -130,8 +307,8 @@ def get_ohlc_bf(before=None, after=None, period=None):
         query["before"] = before
     if after is not None:
         query["after"] = after
-    response = json.loads(requests.get(url, params=query).text)
-    return response
+    response = (requests if session is None else session).get(url, params=query, timeout=timeout)
+    return json.loads(response.text)
 
 
 if __name__ == "__main__":
@@ -16,15 +16,26 @@ commission rate is supposed to be zero so, if bitflyer start asking commission r
 import time
 import traceback
 import sys
+import asyncio
 from . import model
 from .. import api
-from ..util import utc_to_unix, get_logger, if_swap_point
+from ..util import utc_to_unix, get_logger, if_swap_point, sec_to_swap_point
 from .minimum_price import minimum_price
+from .flatten import Flattener
+from .tracker import OrderTracker
+from .journal import OrderJournal
+from . import tracker as order_tracker
 
 ASSET_LIST = ['FX_BTC_JPY']
 MAX_API_REQUEST = 1
 MIN_ORDER_VOLUME = 0.01
 ORDER_TRACKING_FREQ = 2
+ORDER_POLLING_SEC = 1.0
+HEALTH_CHECK_SEC = 60.0
+MAX_QUIET_SEC = 60.0  # poll a resting order at least this often even if the market has not reached it
+RETRY_SEC = 0.25  # first wait after API error, doubled up to `MAX_RETRY_SEC` (`API.request` paces by rate limit)
+MAX_RETRY_SEC = 2.0
+INTENT_MATCH_SEC = 60  # clock skew allowed between the journal and `parent_order_date` of exchange
 
 
 class ExecutorFX:
@@ -48,7 +59,12 @@ class ExecutorFX:
                  logger_output: str='./order_execution.log',
                  set_jst: bool = True,
                  minute_for_sp: int = 5,
-                 slack_webhook_url: dict = None):
+                 slack_webhook_url: dict = None,
+                 api_client: api.API = None,
+                 api_client_async: api.AsyncAPI = None,
+                 own_orders_only: bool = False,
+                 journal: str = None,
+                 api_order=None):
 
         """
 
@@ -61,6 +77,14 @@ class ExecutorFX:
         :param id_api: password for bF API
         :param logger_output: pass to output logger file.
         :param minute_for_sp: Will release position `minute_for_sp` before 00:00:00 to avoid swap point
+        :param api_client: `API` shared with other executors (new one from `id_api` if None)
+        :param api_client_async: `AsyncAPI` shared with other executors (new one from `id_api` if None)
+        :param own_orders_only: clean up only the orders placed by this executor, instead of every order and position
+                                of the account (for several executors sharing one account)
+        :param journal: path to order journal (SQLite file). Orders are journaled, and an order left active by a
+                        crashed run is tracked again on restart.
+        :param api_order: backend to send orders to, with the interface of `api.Order` (eg, `simulator.PaperOrder`
+                          for paper trading). `api.Order` of `api_client` if None.
         """
 
         # target asset
@@ -79,9 +103,18 @@ class ExecutorFX:
         self.__minute_to_expire = minute_to_expire
         self.__minute_for_sp = minute_for_sp
 
-        # API connection instance
-        self.api_public = api.Public(**id_api)
-        self.api_order = api.Order(**id_api)
+        self.__own_orders_only = own_orders_only
+        self.__journal = None if journal is None else OrderJournal(journal)
+
+        # API connection instance (public and private API share one keep-alive connection pool)
+        self.api_client = api.API(**id_api) if api_client is None else api_client
+        self.api_public = api.Public(api=self.api_client)
+        self.api_order = api.Order(api=self.api_client) if api_order is None else api_order
+        # asyncio client for event driven engine, sharing rate limit with the blocking one
+        if api_client_async is None:
+            api_client_async = api.AsyncAPI(rate_limiter=self.api_client.rate_limiter, **id_api)
+        self.api_client_async = api_client_async
+        self.api_public_async = api.AsyncPublic(api=self.api_client_async)
 
         # setup logger
         self.__log = get_logger(logger_output, set_jst=set_jst, slack_webhook_url=slack_webhook_url)
@@ -97,16 +130,23 @@ class ExecutorFX:
         self.__log(" - minute_to_expire  : %0.2f" % minute_to_expire, to_slack=True)
         self.__log(" - minute_for_sp     : %0.2f" % minute_for_sp, to_slack=True)
 
+        # cancel and offset concurrently, polling offset order with backoff
+        self.__flattener = Flattener(self.api_order, self.__asset_name, request=self.safe_api_request, log=self.__log,
+                                     min_order_volume=MIN_ORDER_VOLUME)
+
         self.__best_ask_past = 0
         self.__best_bit_past = 0
+        self.__order_levels = None
+        self.__level_touched = True  # market reached a price of the active order since the last poll
+        self.__tracker = None
         assert self.__min_profit_take_margin < self.__max_profit_take_margin
 
     def safe_api_request(self,
                          api_instance,
                          api_parameter: dict=None,
-                         sec_to_wait: int=5):
+                         sec_to_wait: float = RETRY_SEC):
         """ Keep requesting till it succeed.
-        :param sec_to_wait: sec to wait if api fail to request
+        :param sec_to_wait: sec to wait after the first failure, doubled on each retry up to `MAX_RETRY_SEC`
         :return: return value from api
         """
         n = 0
@@ -120,73 +160,118 @@ class ExecutorFX:
                 self.__log('API request get error (%s times)' % n)
                 if 'error_message' in api_result.keys():
                     self.__log(' - error_message: %s' % api_result['error_message'])
-                time.sleep(sec_to_wait)
+                if n > MAX_API_REQUEST:
+                    raise ValueError('API request failed')
+                time.sleep(min(sec_to_wait * 2 ** (n - 1), MAX_RETRY_SEC))
             else:
                 break
-            if n > MAX_API_REQUEST:
-                raise ValueError('API request failed')
         return api_result
 
+    def __record(self, kind, acceptance_id=None, sync=False, **data):
+        if self.__journal is not None:
+            self.__journal.record(kind, acceptance_id, sync=sync, **data)
+
+    def __resume(self, initial_asset_jpy):
+        """ Resume the order left active by the previous run from journal
+
+        :return: (acceptance_order_id, order_timestamp, initial_asset_jpy), acceptance_order_id is None if nothing to
+                 resume
+        """
+        if self.__journal is None:
+            return None, 0, initial_asset_jpy
+        recovered = self.__journal.recover()
+        if len(recovered['unknown_intents']) > 0:
+            # crashed while sending an order: journal it as accepted or rejected by what the exchange has
+            for intent in recovered['unknown_intents']:
+                self.__reconcile_intent(intent)
+            recovered = self.__journal.recover()
+        orders = recovered['open_orders']
+        if len(orders) == 0:
+            self.__record('session', sync=True, collateral=initial_asset_jpy)
+            return None, 0, initial_asset_jpy
+        # one order at a time, so older ones are something went wrong
+        for order in orders[:-1]:
+            self.__log('RESUME: clean up order (%s)' % order['acceptance_id'], to_slack=True)
+            self.__cleanup_own_order(order['acceptance_id'])
+            self.__record('closed', order['acceptance_id'], sync=True, case=None)
+        order = orders[-1]
+        self.__order_levels = order['levels']
+        self.__tracker = OrderTracker(order['acceptance_id'], order['order_timestamp'], self.__minute_to_expire)
+        if recovered['session'] is not None:
+            initial_asset_jpy = recovered['session']['collateral']
+        self.__log('RESUME: tracking order (%s), last state (%s)'
+                   % (order['acceptance_id'], None if order['state'] is None else order['state']['case']),
+                   to_slack=True)
+        return order['acceptance_id'], order['order_timestamp'], initial_asset_jpy
+
+    def __reconcile_intent(self, intent):
+        """ Look up the parent order of an intent of unknown result among the ones of the account. The oldest one sent
+        with the same method, side, price and size since the intent, and not journaled yet, is this executor's. """
+        parameter = intent['parameter']
+        anchor = parameter['parameters'][0]
+        known = set(e['acceptance_id'] for e in self.__journal.events(kind='accepted'))
+        parent_orders = self.safe_api_request(self.api_order.get_parent_orders,
+                                              dict(product_code=self.__asset_name, count=100))
+        if type(parent_orders) is not list:
+            self.__log('RESUME: failed to look up order of unknown result: %s' % str(parent_orders), to_slack=True)
+            return
+        candidates = [o for o in parent_orders
+                      if o['parent_order_acceptance_id'] not in known
+                      and o.get('parent_order_type') == parameter['order_method']
+                      and o.get('side') == anchor['side']
+                      and float(o.get('price', 0)) == float(anchor.get('price', 0))
+                      and float(o.get('size', 0)) == float(anchor['size'])
+                      and utc_to_unix(o['parent_order_date']) >= intent['unix_time'] - INTENT_MATCH_SEC]
+        if len(candidates) == 0:
+            self.__log('RESUME: order of unknown result has not reached the exchange', to_slack=True)
+            self.__record('rejected', sync=True, intent_seq=intent['seq'], order_info='not found on exchange')
+            return
+        order = min(candidates, key=lambda o: o['parent_order_date'])
+        self.__log('RESUME: order of unknown result found (%s)' % order['parent_order_acceptance_id'], to_slack=True)
+        self.__record('accepted', order['parent_order_acceptance_id'], sync=True, intent_seq=intent['seq'],
+                      order_timestamp=intent['unix_time'], levels=intent['levels'])
+
     def offset_order(self, side, size):
-        self.__log('offset order')
-        parameter = dict(
-            product_code=self.__asset_name,
-            child_order_type="MARKET",
-            side='SELL' if side == 'BUY' else 'BUY',
-            size=size,
-            time_in_force='GTC'
-        )
-        value = ''
-        while True:
-            try:
-                value = self.safe_api_request(self.api_order.send_child_order, parameter)
-                parameter = dict(
-                    product_code=self.__asset_name,
-                    child_order_acceptance_id=value['child_order_acceptance_id']
-                )
-                break
-            except Exception:
-                self.__log(str(value))
-                time.sleep(10)
+        """ offset position by MARKET order and wait until it's done
 
-        while True:
-            # keep 10 sec interval to avoid 'Over API limit per minute' error
-            time.sleep(10)
-            value = self.safe_api_request(self.api_order.get_child_orders, parameter)
-            order_info_child = value[0]
-            # self.__log(' - get_child_orders: %s' % str(order_info_child))
-            if order_info_child['child_order_state'] == 'COMPLETED':
-                self.__log(' - offset order is completed')
-                break
+        :return: final state of the offset order
+        """
+        return self.__flattener.offset(side, size)
+
+    def cleanup_positions(self, acceptance_order_id: str = None):
+        """ cancel orders and offset positions
 
-    def cleanup_positions(self):
+        Active orders are cancelled concurrently, and the net position is offset by one order.
+
+        :param acceptance_order_id: with `own_orders_only`, clean up only this parent order and its executed size
+        :return: True if any offset order is executed
+        """
+        if self.__own_orders_only and acceptance_order_id is not None:
+            return self.__cleanup_own_order(acceptance_order_id)
         self.__log('CLEAN UP ALL POSITION')
-        # cancel all orders (in case something went wrong and some orders are still remained)
-        active_parent_orders = self.safe_api_request(self.api_order.get_parent_orders,
-                                                     dict(product_code=self.__asset_name, parent_order_state="ACTIVE"))
-        if type(active_parent_orders) is list:
-            for i in active_parent_orders:
-                self.safe_api_request(self.api_order.cancel_parent_order,
-                                      dict(product_code=self.__asset_name, parent_order_id=i['parent_order_id']))
-        self.safe_api_request(self.api_order.cancel_all_child_orders, dict(product_code=self.__asset_name))
-
-        # get position
-        value = self.safe_api_request(self.api_order.get_positions, dict(product_code=self.__asset_name))
-        if type(value) is list:
-            self.__log(' - found positions %i' % len(value), to_slack=True)
-            self.__log(str(value))
-            flg = False
-            for n, _value in enumerate(value):
-                self.__log('   - offset orders: %i' % n)
-                if _value['size'] < MIN_ORDER_VOLUME:
-                    self.__log('     - ignore due to small volume')
-                else:
-                    self.offset_order(_value['side'], _value['size'])
-                    flg = True
-            return flg
-        else:
-            self.__log(' - no positions', to_slack=True)
-            return False
+        status = self.__flattener.flatten()
+        self.__record('cleanup', sync=True, **status)
+        self.__log(' - found positions %i' % status['positions'], to_slack=True)
+        self.__log(' - cleanup status: %s' % str(status), to_slack=True)
+        return status['offset_state'] is not None
+
+    def __cleanup_own_order(self, acceptance_order_id):
+        self.__log('CLEAN UP ORDER: %s' % acceptance_order_id)
+
+        def child_orders(_):
+            value = self.safe_api_request(self.api_order.get_parent_order,
+                                          dict(parent_order_acceptance_id=acceptance_order_id))
+            if 'parent_order_id' not in value:
+                self.__log(' - unexpected API return: %s' % str(value), to_slack=True)
+                return []
+            value = self.safe_api_request(self.api_order.get_child_orders,
+                                          dict(product_code=self.__asset_name, parent_order_id=value['parent_order_id']))
+            return value if type(value) is list else []
+
+        status = self.__flattener.flatten([dict(parent_order_acceptance_id=acceptance_order_id)], child_orders)
+        self.__log(' - net executed size: %0.8f' % status['net_size'], to_slack=True)
+        self.__log(' - cleanup status: %s' % str(status))
+        return status['offset_state'] is not None
 
     def __swap_point(self):
         """ Module to avoid swap point. Swap point will be calculated every 00:00:00 JST so at that time, net position
@@ -202,13 +287,18 @@ class ExecutorFX:
             self.__log("   - open_position_pnl  : %0.5f" % value["open_position_pnl"])
             time.sleep(self.__minute_for_sp * 60)
 
-    def __current_market(self, health_check: bool = False):
-        """ module to get current market state """
-        ticker = self.safe_api_request(self.api_public.ticker, dict(product_code=self.__asset_name))
-        if health_check:
+    def __current_market(self, health_check: bool = False, ticker: dict = None, health: dict = None):
+        """ module to get current market state
+
+        :param ticker: ticker already received (eg, from realtime feed). If None, request ticker API.
+        :param health: board state already received. If None and `health_check`, request board state API.
+        """
+        if ticker is None:
+            ticker = self.safe_api_request(self.api_public.ticker, dict(product_code=self.__asset_name))
+        if health is not None:
+            health_check = True
+        elif health_check:
             health = self.safe_api_request(self.api_public.get_board_state, dict(product_code=self.__asset_name))
-        else:
-            health = None
         try:
             timestamp = utc_to_unix(ticker['timestamp'])  # API's timestamp is UTC based
             best_bid = int(ticker['best_bid'])
@@ -306,117 +396,83 @@ class ExecutorFX:
             return __current_asset
 
         self.__log('TRACKING ACTIVE ORDERS', to_slack=True)
-        value = self.safe_api_request(self.api_order.get_parent_order,
-                                      dict(parent_order_acceptance_id=acceptance_order_id))
-        if 'parent_order_id' not in value:
-            self.__log(' - unexpected API return: %s' % str(value), to_slack=True)
+        tracker = self.__tracker
+        if tracker is None or tracker.acceptance_order_id != acceptance_order_id:
+            tracker = OrderTracker(acceptance_order_id, order_timestamp, self.__minute_to_expire)
+            self.__tracker = tracker
+
+        if tracker.parent_order_id is None:
+            value = self.safe_api_request(self.api_order.get_parent_order,
+                                          dict(parent_order_acceptance_id=acceptance_order_id))
+            if 'parent_order_id' not in value:
+                self.__log(' - unexpected API return: %s' % str(value), to_slack=True)
+                return True, current_asset_jpy
+            tracker.parent_order_id = value['parent_order_id']
+            self.__log(' - get_parent_order: parent_order_acceptance_id (%s)' % acceptance_order_id)
+
+        # resting orders can't change unless the market reaches them
+        touched, self.__level_touched = self.__level_touched, False
+        if self.__order_levels is not None and not touched and tracker.quiet(max_quiet_sec=MAX_QUIET_SEC):
+            self.__log(' - status: %s -> keep tracking (market has not reached the order)'
+                       % order_tracker.CASES[tracker.case])
             return True, current_asset_jpy
 
-        parent_order_id = value['parent_order_id']
-
-        self.__log(' - get_parent_order: parent_order_acceptance_id (%s)' % acceptance_order_id)
         parameter = dict(product_code=self.__asset_name,
                          count=10,
-                         parent_order_id=parent_order_id)
+                         parent_order_id=tracker.parent_order_id)
         child_order = self.safe_api_request(self.api_order.get_child_orders, parameter)
-        self.__log(' - get_child_orders: parent_order_id (%s), order number (%i)' % (parent_order_id, len(child_order)))
-
-        if type(child_order) is dict:  # case (E) or (J)
+        if type(child_order) is list and len(child_order) > 0:
+            changed = tracker.update(child_order)
+        else:  # case (E) or (J): order state is only in parent orders
             parent_orders = self.safe_api_request(self.api_order.get_parent_orders,
                                                   dict(product_code=self.__asset_name, count=1))
-            target_order = [_p for _p in parent_orders if _p['parent_order_id'] == parent_order_id]
+            target_order = [_p for _p in parent_orders if _p['parent_order_id'] == tracker.parent_order_id] \
+                if type(parent_orders) is list else []
             if len(target_order) == 0:
                 raise ValueError('invalid parent_order_id: %s'
                                  'get_child_orders API return no result: %s'
                                  'get_parent_orders API return no result: %s'
-                                 % (parent_order_id, str(child_order), str(parent_orders)))
-            if target_order[0]['parent_order_state'] == 'EXPIRED':
-                # case (E)
-                self.__log(' - status: ANCHOR [expired]', to_slack=True)
-                if_any_order = self.cleanup_positions()
-                if if_any_order:
-                    current_asset_jpy = profit_loss()
-                return False, current_asset_jpy
-            elif target_order[0]['parent_order_state'] == 'ACTIVE':
-                # case (A)
-                if time.time() - order_timestamp < self.__minute_to_expire * 60:
-                    self.__log(' - status: ANCHOR [active] -> keep tracking', to_slack=True)
-                    return True, current_asset_jpy
-                else:
-                    self.__log(' - status: ANCHOR [active] -> offset orders (expired)', to_slack=True)
-            else:
-                # case (J)
-                self.__log(' - status: unclear state -> offset orders', to_slack=True)
-
-        else:  # case (A), (B), (C), (D), (F) or (G)
-            state = dict()
-            total_commission = 0
-            expire_date_unix = None
-            for n, child_dict in enumerate(child_order):
-                state[child_dict['side']] = child_dict['child_order_state']
-                total_commission += float(child_dict['total_commission'])
-                expire_date_unix = utc_to_unix(child_dict['expire_date'])  # API's timestamp is UTC based
-
-            # case (A)
-            if len(state.keys()) == 1 and list(state.values())[0] == 'ACTIVE':
-
-                if time.time() - order_timestamp < self.__minute_to_expire * 60:
-                    self.__log(' - status: ANCHOR [active] -> keep tracking', to_slack=True)
-                    return True, current_asset_jpy
-                else:
-                    self.__log(' - status: ANCHOR [active] -> offset orders (expired)', to_slack=True)
-
-            # case (B) or (J)
-            elif len(state.keys()) == 1 and list(state.values())[0] == 'COMPLETED':
-                if time.time() < expire_date_unix:
-                    # case (B)
-                    self.__log(' - status: ANCHOR [completed], OCO [not triggered] -> keep tracking',
-                               to_slack=True)
-                    if time.time() - order_timestamp < self.__minute_to_expire * 60:
-                        self.__log(' - status: ANCHOR [completed], OCO [not triggered] -> keep tracking',
-                                   to_slack=True)
-                        return True, current_asset_jpy
-                    else:
-                        self.__log(' - status: ANCHOR [completed], OCO [not triggered] '
-                                   '-> offset orders (expired)', to_slack=True)
-                else:
-                    # case (J)
-                    self.__log(' - status: ANCHOR [completed], OCO [rejected] -> offset orders',
-                               to_slack=True)
-
-            # case (C)
-            elif len(state.keys()) == 2 and 'ACTIVE' in list(state.values()):
-                if time.time() - order_timestamp < self.__minute_to_expire * 60:
-                    self.__log(' - status: ANCHOR [completed], OCO [active] -> keep tracking',
-                               to_slack=True)
-                    return True, current_asset_jpy
-                else:
-                    self.__log(' - status: ANCHOR [completed], OCO [active] '
-                               '-> offset orders (expired)', to_slack=True)
-
-            # case (D)
-            elif len(state.keys()) == 2 and len([v for v in state.values() if v != 'COMPLETED']) == 0:
-                self.__log(' - status: ANCHOR [completed], OCO [completed] (commission: %0.8f)'
-                           % total_commission, to_slack=True)
-                self.cleanup_positions()
-                current_asset_jpy = profit_loss()
-                return False, current_asset_jpy
-
-            # case (F) or (G)
-            elif len(state.keys()) == 2 and 'EXPIRED' in list(state.values()):
-                # case (F)
-                self.__log(' - status: ANCHOR [completed], OCO [expired] -> offset orders',
-                           to_slack=True)
-            else:
-                # case (G)
-                self.__log(' - status: unclear state (%s) -> offset orders' % str(state), to_slack=True)
+                                 % (tracker.parent_order_id, str(child_order), str(parent_orders)))
+            changed = tracker.update_parent(target_order[0]['parent_order_state'])
+
+        case, case_changed = tracker.transition()
+        action = tracker.action
+        if case_changed or action != order_tracker.WAIT:
+            self.__record('state', acceptance_order_id, case=case, action=action,
+                          net_executed_size=tracker.net_executed_size)
+        if not (changed or case_changed) and action == order_tracker.WAIT:
+            self.__log(' - status: %s -> keep tracking (no change)' % order_tracker.CASES[case])
+            return True, current_asset_jpy
+        self.__log(' - status: %s (%s)%s -> %s'
+                   % (order_tracker.CASES[case], case, ' (expired)' if tracker.expired else '',
+                      'keep tracking' if action == order_tracker.WAIT else action), to_slack=True)
+        if action == order_tracker.WAIT:
+            return True, current_asset_jpy
 
-        if_any_order = self.cleanup_positions()
+        self.__tracker = None
+        if case == 'D':
+            self.__log(' - commission: %0.8f' % tracker.total_commission, to_slack=True)
+            self.cleanup_positions(acceptance_order_id)
+            current_asset_jpy = profit_loss()
+            self.__record('closed', acceptance_order_id, sync=True, case=case, collateral=current_asset_jpy)
+            return False, current_asset_jpy
+
+        if_any_order = self.cleanup_positions(acceptance_order_id)
         if if_any_order:
             current_asset_jpy = profit_loss()
+        self.__record('closed', acceptance_order_id, sync=True, case=case, collateral=current_asset_jpy)
 
         return False, current_asset_jpy
 
+    def __watch_levels(self, best_bid, best_ask):
+        """ True if the market reached a price of the active order, which is remembered until the next poll """
+        levels = self.__order_levels
+        if levels is None:
+            return False
+        touched = best_ask <= levels['anchor'] or best_bid >= levels['profit_take'] or best_bid <= levels['loss_cut']
+        self.__level_touched = self.__level_touched or touched
+        return touched
+
     def __new_order(self,
                     pred_ask,
                     trend,
@@ -510,20 +566,32 @@ class ExecutorFX:
                 }
             ]
         )
+        self.__order_levels = dict(anchor=best_ask, profit_take=execute_price, loss_cut=loss_cut_price)
+        # sync, so that a crash before the acceptance is recorded leaves this for `__resume` to reconcile
+        self.__record('intent', sync=True, parameter=parameter, levels=self.__order_levels)
         order_info = self.safe_api_request(self.api_order.send_parent_order, parameter)
         try:
             acceptance_order_id = order_info['parent_order_acceptance_id']
             self.__log(' - parent_order_acceptance_id: %s' % acceptance_order_id, to_slack=True)
             timestamp = time.time()
+            self.__tracker = OrderTracker(acceptance_order_id, timestamp, self.__minute_to_expire)
+            self.__record('accepted', acceptance_order_id, sync=True, order_timestamp=timestamp,
+                          levels=self.__order_levels)
             return True, acceptance_order_id, timestamp
         except Exception:
             msg = traceback.format_exc()
             self.__log('- order failed', to_slack=True)
             self.__log(msg, to_slack=True)
             self.__log('return of send_parent_order API: %s' % str(order_info), to_slack=True)
+            self.__record('rejected', sync=True, order_info=str(order_info))
             return False, None, None
 
-    def run(self):
+    def run(self, event_driven: bool = False, feed=None):
+        """ Run trading till interrupted, and then clean up positions
+
+        :param event_driven: run event driven engine on asyncio instead of polling loop
+        :param feed: `stream.RealtimeClient` to sample market from (event driven engine only). If None, poll ticker.
+        """
         value = self.safe_api_request(self.api_order.get_collateral)
         try:
             initial_asset_jpy = value["collateral"]
@@ -535,7 +603,10 @@ class ExecutorFX:
 
         try:
             try:
-                self.__run()
+                if event_driven:
+                    asyncio.run(self.__run_event_driven(feed))
+                else:
+                    self.__run()
             except KeyboardInterrupt:
                 msg = 'Finish trading: KeyboardInterrupt'
         except Exception:
@@ -556,13 +627,15 @@ class ExecutorFX:
             self.__log('unknown API error')
             self.__log('get_collateral: %s' % str(__value))
 
+        self.__log('API connection: %s' % str(self.api_client.stats.as_dict()))
+        self.api_client.close()
+        if self.__journal is not None:
+            self.__journal.close()
         self.__log("Exit", is_pl=True, to_slack=True, push_all=True)
         sys.exit()
 
-    def __run(self):
-        if self.__model is None:
-            raise ValueError('Error: set model before run executor.')
-
+    def __account_configuration(self):
+        """ return commission rate and collateral after checking account condition """
         param_prod_code = dict(product_code=self.__asset_name)
         value = self.safe_api_request(self.api_order.get_trading_commission, param_prod_code)
         commission_rate = value['commission_rate']
@@ -574,19 +647,22 @@ class ExecutorFX:
         self.__log(" - require_collateral : %0.5f" % value["require_collateral"], is_pl=True, to_slack=True)
         self.__log(" - open_position_pnl  : %0.5f" % value["open_position_pnl"], is_pl=True, to_slack=True)
 
-        initial_asset_jpy = value["collateral"]
-        current_asset_jpy = value["collateral"]
-
         if value["collateral"] == 0:
             raise ValueError("Error: invalid initial account condition")
         if commission_rate != 0.0:
             raise ValueError("Error: commission rate is not zero ")
+        return commission_rate, value["collateral"]
+
+    def __run(self):
+        if self.__model is None:
+            raise ValueError('Error: set model before run executor.')
+
+        commission_rate, current_asset_jpy = self.__account_configuration()
 
         # information of active order
-        if_holding_position = False
-        order_timestamp = 0
+        acceptance_order_id, order_timestamp, initial_asset_jpy = self.__resume(current_asset_jpy)
+        if_holding_position = acceptance_order_id is not None
         predicted_time = 0
-        acceptance_order_id = None
         # flag_health_check = 0
         flag_track_order = 0
 
@@ -624,6 +700,7 @@ class ExecutorFX:
 
             # track order or order new one
             if if_holding_position:
+                self.__watch_levels(best_bid, best_ask)
                 if flag_track_order >= ORDER_TRACKING_FREQ:
                     flag_track_order = 0
                     # track active order
@@ -651,6 +728,153 @@ class ExecutorFX:
                     health_state
                 )
 
+    async def __run_event_driven(self, feed=None):
+        tasks = [self.run_async(feed)]
+        if feed is not None:
+            tasks.append(feed.run())
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            if feed is not None:
+                await feed.close()
+            await self.api_client_async.close()
+
+    async def run_async(self, feed=None):
+        """ Event driven engine: market sampling, order placement, order tracking, swap point and health check are
+        separate tasks on one event loop, and blocking API calls of the order logic run in worker threads. So a slow
+        order status call never delays the next market sample, and order tracking is woken up as soon as the market
+        crosses a price level of the active order instead of waiting for a fixed number of ticks.
+
+        Runs until cancelled. The feed and API clients are left open, as they may be shared with other executors.
+
+        :param feed: `stream.RealtimeClient` or `stream.SharedFeed` (running) to sample market from. If None, ticker
+                     API is polled every `latency`. Board state is taken from the feed if it has `board_state`.
+        """
+        if self.__model is None:
+            raise ValueError('Error: set model before run executor.')
+
+        commission_rate, current_asset_jpy = await asyncio.to_thread(self.__account_configuration)
+        acceptance_order_id, order_timestamp, initial_asset_jpy = await asyncio.to_thread(self.__resume,
+                                                                                         current_asset_jpy)
+        state = dict(holding=acceptance_order_id is not None, acceptance_order_id=acceptance_order_id,
+                     order_timestamp=order_timestamp, current_asset_jpy=current_asset_jpy, health=None)
+        order_lock = asyncio.Lock()  # order placement, tracking and swap point clean up don't run at once
+        order_active = asyncio.Event()
+        wake_tracker = asyncio.Event()
+        pause_order = asyncio.Event()
+        shared_health = hasattr(feed, 'board_state')
+        if state['holding']:
+            order_active.set()  # resumed from journal
+
+        async def polling_tickers():
+            start = time.time()
+            n = 0
+            while True:
+                ticker = await self.api_public_async.ticker(product_code=self.__asset_name)
+                if 'best_ask' in ticker.keys():
+                    yield ticker
+                else:
+                    self.__log('ticker API error: %s' % str(ticker))
+                n += 1
+                await asyncio.sleep(max(0.0, start + n * self.__latency_model - time.time()))
+
+        async def place_order(*args):
+            async with order_lock:
+                if pause_order.is_set():
+                    state['holding'] = False
+                    return
+                try:
+                    holding, acceptance_order_id, order_timestamp = await asyncio.to_thread(self.__new_order, *args)
+                except Exception:
+                    # nothing else awaits this task, so log here and let the next sample place an order again
+                    self.__log('- order placement failed', to_slack=True)
+                    self.__log(traceback.format_exc(), to_slack=True)
+                    state.update(holding=False, acceptance_order_id=None)
+                    return
+            state.update(holding=holding, acceptance_order_id=acceptance_order_id, order_timestamp=order_timestamp)
+            if holding:
+                order_active.set()
+
+        async def market_sampler():
+            tickers = feed.tickers(interval=self.__latency_model) if feed is not None else polling_tickers()
+            async for ticker in tickers:
+                self.__log("##### START PROCESS #####", to_slack=True)
+                health = feed.board_state if shared_health else state['health']
+                data = self.__current_market(ticker=ticker, health=health)
+                if data is None:
+                    continue
+                best_bid, best_ask, best_bid_size, best_ask_size, spread, health_health, health_state = data
+                pred_ask, trend = self.__model.predict(best_ask)
+                if pred_ask is not None:
+                    pred_ask = round(pred_ask)
+                    self.__log(" - predict ask (trend): %0.2f (%s)" % (pred_ask, str(trend)), to_slack=True)
+
+                if state['holding']:
+                    if order_active.is_set() and self.__watch_levels(best_bid, best_ask):
+                        wake_tracker.set()
+                elif not pause_order.is_set():
+                    state['holding'] = True
+                    asyncio.ensure_future(place_order(pred_ask, trend, best_ask, best_bid, best_ask_size,
+                                                      best_bid_size, spread, commission_rate, health_health,
+                                                      health_state))
+
+        async def order_tracker():
+            while True:
+                await order_active.wait()
+                # wake up by market event, order expiry or polling interval at latest
+                expire = state['order_timestamp'] + self.__minute_to_expire * 60 - time.time()
+                interval = self.__latency_model * ORDER_TRACKING_FREQ
+                # once expired, keep polling at the interval (at least `ORDER_POLLING_SEC`) until it's closed
+                timeout = min(interval, expire) if expire > 0 else max(interval, ORDER_POLLING_SEC)
+                try:
+                    await asyncio.wait_for(wake_tracker.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                wake_tracker.clear()
+                async with order_lock:
+                    if not order_active.is_set():
+                        continue
+                    holding, current_asset_jpy = await asyncio.to_thread(
+                        self.__tracking_active_order,
+                        state['acceptance_order_id'],
+                        order_timestamp=state['order_timestamp'],
+                        initial_asset_jpy=initial_asset_jpy,
+                        current_asset_jpy=state['current_asset_jpy'])
+                state['current_asset_jpy'] = current_asset_jpy
+                if not holding:
+                    order_active.clear()
+                    state.update(holding=False, acceptance_order_id=None)
+
+        async def swap_point():
+            while True:
+                await asyncio.sleep(max(0.0, sec_to_swap_point() - self.__minute_for_sp * 60))
+                pause_order.set()
+                self.__log('preparing to avoid swap point', to_slack=True)
+                async with order_lock:
+                    # with `own_orders_only`, there is nothing to clean up unless an order of this executor is open
+                    if not self.__own_orders_only or state['acceptance_order_id'] is not None:
+                        await asyncio.to_thread(self.cleanup_positions, state['acceptance_order_id'])
+                    order_active.clear()
+                    state.update(holding=False, acceptance_order_id=None)
+                value = await asyncio.to_thread(self.safe_api_request, self.api_order.get_collateral)
+                self.__log(' - pause new order until tomorrow. good night :)', to_slack=True)
+                self.__log("   - collateral         : %0.5f" % value["collateral"])
+                self.__log("   - require_collateral : %0.5f" % value["require_collateral"])
+                self.__log("   - open_position_pnl  : %0.5f" % value["open_position_pnl"])
+                await asyncio.sleep(sec_to_swap_point() % (24 * 60 * 60) + 1)
+                pause_order.clear()
+
+        async def health_checker():
+            while True:
+                value = await self.api_public_async.get_board_state(product_code=self.__asset_name)
+                state['health'] = value if 'health' in value.keys() else None
+                await asyncio.sleep(HEALTH_CHECK_SEC)
+
+        tasks = [market_sampler(), order_tracker(), swap_point()]
+        if not shared_health:
+            tasks.append(health_checker())
+        await asyncio.gather(*tasks)
+
     def set_model(self,
                   model_name: str,
                   model_parameter: dict=None):
@@ -0,0 +1,173 @@
+""" Cancel orders and flatten positions concurrently
+
+`Flattener` cleans up an account (or given parent orders) within one round trip plus fill time, instead of cancelling
+and offsetting one by one:
+
+    1. every active parent order is cancelled at once (one request each, in parallel threads paced by the rate
+       limiter of the `API` client), together with `cancel_all_child_orders`
+    2. positions are netted into one size, and offset by one MARKET order
+    3. the offset order is polled with backoff (`poll_sec` growing by `backoff` up to `max_poll_sec`)
+
+and the result is one aggregated status, eg)
+
+    flattener = Flattener(api.Order(api=client), log=log)
+    status = flattener.flatten()  # dict(cancelled=3, net_size=-0.02, offset_state='COMPLETED', elapsed=0.4, ...)
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = (
+    "Flattener"
+)
+
+MIN_ORDER_VOLUME = 0.01
+DONE_STATES = ['COMPLETED', 'CANCELED', 'EXPIRED', 'REJECTED']
+
+
+class Flattener:
+
+    def __init__(self,
+                 api_order,
+                 product_code: str = 'FX_BTC_JPY',
+                 request=None,
+                 log=None,
+                 max_workers: int = 4,
+                 poll_sec: float = 0.2,
+                 max_poll_sec: float = 5.0,
+                 backoff: float = 1.5,
+                 timeout_sec: float = 120.0,
+                 max_retry: int = 3,
+                 min_order_volume: float = MIN_ORDER_VOLUME):
+        """
+
+        :param api_order: `Order` instance
+        :param request: function(api_method, parameter) to send a request with retry (eg,
+                        `ExecutorFX.safe_api_request`). Called as it is if None.
+        :param log: function to log message (no log if None)
+        :param max_workers: max number of requests in flight (pool size of `HTTPTransport` by default)
+        :param poll_sec: first interval to poll the offset order
+        :param timeout_sec: give up waiting for the offset order after this seconds
+        :param max_retry: max retry of sending the offset order
+        """
+        self.api_order = api_order
+        self.product_code = product_code
+        self.__request = (lambda method, parameter: method(**parameter)) if request is None else request
+        self.__log = (lambda *args, **kwargs: None) if log is None else log
+        self.max_workers = max_workers
+        self.poll_sec = poll_sec
+        self.max_poll_sec = max_poll_sec
+        self.backoff = backoff
+        self.timeout_sec = timeout_sec
+        self.max_retry = max_retry
+        self.min_order_volume = min_order_volume
+
+    def __map(self, requests: list):
+        """ send (api method, parameter) requests in parallel, and return results (or exception) in the same order """
+        if len(requests) == 0:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(requests))) as executor:
+            futures = [executor.submit(self.__request, method, parameter) for method, parameter in requests]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as err:
+                    results.append(err)
+            return results
+
+    @staticmethod
+    def net_size(orders: list, size_key: str = 'size'):
+        """ net size of positions (or executed size of orders with `size_key='executed_size'`), BUY is positive """
+        size = sum(o[size_key] if o['side'] == 'BUY' else -o[size_key] for o in orders)
+        return round(size * 10 ** 8) * 10 ** -8
+
+    def cancel(self, parent_orders: list = None):
+        """ Cancel parent orders in parallel
+
+        :param parent_orders: list of dict with `parent_order_id` or `parent_order_acceptance_id`. If None, every
+                              active parent order and child order of the product is cancelled.
+        :return: (number of cancel requests succeeded, number of failed)
+        """
+        requests = []
+        if parent_orders is None:
+            active = self.__request(self.api_order.get_parent_orders,
+                                    dict(product_code=self.product_code, parent_order_state='ACTIVE'))
+            parent_orders = active if type(active) is list else []
+            requests.append((self.api_order.cancel_all_child_orders, dict(product_code=self.product_code)))
+        for order in parent_orders:
+            key = 'parent_order_id' if 'parent_order_id' in order else 'parent_order_acceptance_id'
+            requests.append((self.api_order.cancel_parent_order, {'product_code': self.product_code, key: order[key]}))
+        results = self.__map(requests)
+        # error return of API carries `status` (any negative code) and `error_message`
+        failed = sum(isinstance(r, Exception) or (type(r) is dict and ('status' in r or 'error_message' in r))
+                     for r in results)
+        return len(results) - failed, failed
+
+    def offset(self, side: str, size: float):
+        """ Offset `size` of position of `side` by one MARKET order, and wait until it's done
+
+        :return: final state of the offset order ('COMPLETED', 'CANCELED', 'EXPIRED', 'REJECTED' or 'TIMEOUT')
+        """
+        self.__log('offset order')
+        parameter = dict(product_code=self.product_code, child_order_type='MARKET',
+                         side='SELL' if side == 'BUY' else 'BUY', size=size, time_in_force='GTC')
+        value, interval = None, self.poll_sec
+        for _ in range(self.max_retry + 1):
+            try:
+                value = self.__request(self.api_order.send_child_order, parameter)
+                if type(value) is dict and 'child_order_acceptance_id' in value:
+                    return self.wait(value['child_order_acceptance_id'])
+            except Exception as err:
+                value = err
+            self.__log(' - offset order is not accepted: %s' % str(value))
+            time.sleep(interval)
+            interval = min(self.max_poll_sec, interval * self.backoff)
+        return 'REJECTED'
+
+    def wait(self, child_order_acceptance_id: str):
+        """ poll child order with backoff until it's done """
+        parameter = dict(product_code=self.product_code, child_order_acceptance_id=child_order_acceptance_id)
+        start = time.time()
+        interval = self.poll_sec
+        while time.time() - start < self.timeout_sec:
+            time.sleep(interval)
+            value = self.__request(self.api_order.get_child_orders, parameter)
+            if type(value) is list and len(value) > 0 and value[0]['child_order_state'] in DONE_STATES:
+                self.__log(' - offset order is %s' % value[0]['child_order_state'].lower())
+                return value[0]['child_order_state']
+            interval = min(self.max_poll_sec, interval * self.backoff)
+        self.__log(' - offset order is not done in %0.1f sec' % self.timeout_sec)
+        return 'TIMEOUT'
+
+    def flatten(self, parent_orders: list = None, child_orders=None):
+        """ Cancel orders and offset the net position
+
+        :param parent_orders: parent orders to cancel (every active order and position of the account if None)
+        :param child_orders: with `parent_orders`, function(parent orders) -> child orders of them, whose net
+                             executed size is offset instead of the positions of the account
+        :return: dict of aggregated status
+        """
+        start = time.time()
+        status = dict(cancelled=0, cancel_failed=0, positions=0, net_size=0.0, offset_side=None, offset_state=None)
+        if parent_orders is None:
+            status['cancelled'], status['cancel_failed'] = self.cancel()
+            # positions after cancellation, so that nothing is filled any more
+            positions = self.__request(self.api_order.get_positions, dict(product_code=self.product_code))
+            positions = positions if type(positions) is list else []
+            status['positions'] = len(positions)
+            size = self.net_size(positions)
+        else:
+            status['cancelled'], status['cancel_failed'] = self.cancel(parent_orders)
+            orders = child_orders(parent_orders) if child_orders is not None else []
+            status['positions'] = len(orders)
+            size = self.net_size(orders, 'executed_size')
+
+        status['net_size'] = size
+        if abs(size) >= self.min_order_volume:
+            status['offset_side'] = 'BUY' if size > 0 else 'SELL'
+            status['offset_state'] = self.offset(status['offset_side'], abs(size))
+        elif size != 0:
+            self.__log(' - ignore due to small volume: %0.8f' % size)
+        status['elapsed'] = round(time.time() - start, 3)
+        return status
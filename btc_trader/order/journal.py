@@ -0,0 +1,167 @@
+""" Append-only journal of orders for crash recovery
+
+Every order intent, acceptance, state transition and collateral snapshot of `ExecutorFX` is appended to a SQLite file
+in WAL mode. Events are committed in batches (every `batch_size` events or `flush_sec`), except the ones recorded with
+`sync=True` (eg, acceptance of an order), which are committed right away. With `synchronous=NORMAL` a commit only
+appends to the WAL file without fsync, so it survives a crash of the process at the cost of microseconds, and fsync
+happens at checkpoints.
+
+On restart `recover` returns the orders accepted but not closed, so the executor resumes tracking them instead of
+scanning the account. An 'intent' without the following 'accepted' or 'rejected' (crash while sending the order) is
+returned as unknown, to be reconciled with the account, eg)
+
+    journal = OrderJournal('./order_journal.db')
+    journal.record('accepted', acceptance_id, sync=True, order_timestamp=time.time(), levels=levels)
+    journal.record('closed', acceptance_id, case='D', collateral=collateral)
+    state = journal.recover()  # dict(open_orders=[...], unknown_intents=[...], session=..., collateral=...)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+__all__ = (
+    "OrderJournal"
+)
+
+
+class OrderJournal:
+
+    def __init__(self,
+                 path: str,
+                 batch_size: int = 64,
+                 flush_sec: float = 1.0):
+        """
+
+        :param path: path to SQLite file
+        :param batch_size: commit once this number of events are pending
+        :param flush_sec: commit pending events older than this seconds on the next `record`
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_sec = flush_sec
+        if os.path.dirname(path) != '':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # tracking runs in worker threads of the event driven engine
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute("""create table if not exists events (
+                                       seq integer primary key autoincrement,
+                                       unix_time real not null,
+                                       kind text not null,
+                                       acceptance_id text,
+                                       data text not null)""")
+        self.__connection.execute("create index if not exists ix_events_acceptance on events (acceptance_id, kind)")
+        self.__pending = []
+        self.__pending_since = None
+
+    def record(self, kind: str, acceptance_id: str = None, sync: bool = False, **data):
+        """ Append an event
+
+        :param kind: eg) 'session', 'intent', 'accepted', 'rejected', 'state', 'closed', 'cleanup', 'collateral'
+        :param acceptance_id: parent order acceptance id the event is about
+        :param sync: commit now (with pending events) instead of waiting for the batch
+        :param data: JSON serializable values of the event
+        """
+        now = time.time()
+        with self.__lock:
+            self.__pending.append((now, kind, acceptance_id, json.dumps(data)))
+            if self.__pending_since is None:
+                self.__pending_since = now
+            if sync or len(self.__pending) >= self.batch_size or now - self.__pending_since >= self.flush_sec:
+                self.__flush()
+
+    def flush(self):
+        with self.__lock:
+            self.__flush()
+
+    def __flush(self):
+        if len(self.__pending) == 0:
+            return
+        self.__connection.execute("begin")
+        self.__connection.executemany("insert into events (unix_time, kind, acceptance_id, data) values (?, ?, ?, ?)",
+                                      self.__pending)
+        self.__connection.execute("commit")
+        self.__pending = []
+        self.__pending_since = None
+
+    def close(self):
+        with self.__lock:
+            self.__flush()
+            self.__connection.close()
+
+    def events(self, acceptance_id: str = None, kind: str = None):
+        """ list of events as dict(seq, unix_time, kind, acceptance_id, **data) in recorded order """
+        self.flush()
+        query, parameters = "select seq, unix_time, kind, acceptance_id, data from events", []
+        condition = []
+        if acceptance_id is not None:
+            condition.append("acceptance_id = ?")
+            parameters.append(acceptance_id)
+        if kind is not None:
+            condition.append("kind = ?")
+            parameters.append(kind)
+        if len(condition) > 0:
+            query += " where " + " and ".join(condition)
+        with self.__lock:
+            rows = self.__connection.execute(query + " order by seq", parameters).fetchall()
+        return [dict(json.loads(data), seq=seq, unix_time=unix_time, kind=kind, acceptance_id=acceptance_id)
+                for seq, unix_time, kind, acceptance_id, data in rows]
+
+    def recover(self):
+        """ State to resume from
+
+        :return: dict of
+            - open_orders: list of 'accepted' event (with the latest 'state' event as `state`) of orders not closed,
+              oldest first
+            - unknown_intents: list of 'intent' event followed by neither 'accepted' nor 'rejected' (before the next
+              'intent'), oldest first. The order may or may not have reached the exchange. An 'accepted' or
+              'rejected' event with `intent_seq` (recorded on reconciliation) resolves only the intent of that `seq`.
+            - session: the latest 'session' event (None if no session)
+            - collateral: the latest collateral recorded (None if no record)
+        """
+        self.flush()
+        with self.__lock:
+            # account-wide clean up closes every order accepted before it
+            cleanup = self.__connection.execute(
+                "select max(seq) from events where acceptance_id is null and kind = 'cleanup'").fetchone()[0]
+            rows = self.__connection.execute(
+                """select seq, unix_time, kind, acceptance_id, data from events as a
+                   where kind = 'accepted' and seq > ? and not exists (
+                       select 1 from events as c where c.acceptance_id = a.acceptance_id and c.kind = 'closed')
+                   order by seq""", (-1 if cleanup is None else cleanup, )).fetchall()
+            intents = self.__connection.execute(
+                """select seq, unix_time, kind, acceptance_id, data from events as i
+                   where kind = 'intent' and seq > ? and not exists (
+                       select 1 from events as r where r.kind in ('accepted', 'rejected') and r.seq > i.seq
+                       and coalesce(json_extract(r.data, '$.intent_seq'), i.seq) = i.seq
+                       and (json_extract(r.data, '$.intent_seq') = i.seq
+                            or r.seq < coalesce((select min(n.seq) from events as n
+                                                 where n.kind = 'intent' and n.seq > i.seq), r.seq + 1)))
+                   order by seq""", (-1 if cleanup is None else cleanup, )).fetchall()
+        unknown_intents = [dict(json.loads(data), seq=seq, unix_time=unix_time, kind=kind, acceptance_id=acceptance_id)
+                           for seq, unix_time, kind, acceptance_id, data in intents]
+        open_orders = []
+        for seq, unix_time, kind, acceptance_id, data in rows:
+            order = dict(json.loads(data), seq=seq, unix_time=unix_time, kind=kind, acceptance_id=acceptance_id)
+            states = self.events(acceptance_id, 'state')
+            order['state'] = states[-1] if len(states) > 0 else None
+            open_orders.append(order)
+        session = self.__latest(['session'])
+        collateral = self.__latest(['session', 'closed', 'collateral', 'cleanup'])
+        return dict(open_orders=open_orders, unknown_intents=unknown_intents, session=session,
+                    collateral=None if collateral is None else collateral.get('collateral'))
+
+    def __latest(self, kinds):
+        with self.__lock:
+            row = self.__connection.execute(
+                "select seq, unix_time, kind, acceptance_id, data from events where kind in (%s) order by seq desc "
+                "limit 1" % ', '.join('?' * len(kinds)), kinds).fetchone()
+        if row is None:
+            return None
+        seq, unix_time, kind, acceptance_id, data = row
+        return dict(json.loads(data), seq=seq, unix_time=unix_time, kind=kind, acceptance_id=acceptance_id)
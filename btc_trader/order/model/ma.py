@@ -1,6 +1,22 @@
 
+import sys
+from collections import deque
+import numpy as np
+
+# builtin `sum` of floats is compensated from Python 3.12
+_COMPENSATED_SUM = sys.version_info >= (3, 12)
+
+
 class MovingAverage:
-    """ Moving Average Model """
+    """ Moving Average Model
+
+    The last `step_size` data are kept in a ring buffer, and the down moves used by `trend` are counted over a ring
+    buffer of the last `trend_trigger_window` flags, so a tick neither copies the buffer nor re-scans it for trend.
+    The prediction is the sum of data times weight, newest first, on every tick. It's not kept as a running sum, whose
+    rounding differs by ~1e-9 and flips `round` of the prediction at .5 ties.
+
+    `predict_batch` gives the same predictions over a whole price array, vectorized over ticks (eg, for backtest).
+    """
 
     def __init__(self,
                  weighted: bool=False,
@@ -19,6 +35,7 @@ class MovingAverage:
         """
 
         self.__step_size = step_size
+        self.__weighted = weighted
         if weighted:
             norm = sum(list(range(step_size+1)))
             self.__weight = [i/norm for i in reversed(range(1, step_size + 1))]
@@ -26,47 +43,100 @@ class MovingAverage:
             self.__weight = [1.0/step_size] * step_size
 
         self.__trend_trigger_count = trend_trigger_count
-        self.__trend_trigger_window = trend_trigger_window
+        # only the diffs inside the data buffer count for trend (window 0 means all of them)
+        if trend_trigger_window == 0:
+            trend_trigger_window = step_size - 1
+        self.__trend_trigger_window = max(0, min(trend_trigger_window, step_size - 1))
         self.__trend_trigger_value = trend_trigger_value
 
         # data buffer for prediction
-        self.__data_buffer = []
+        self.__data_buffer = deque(maxlen=step_size)
+        self.__trend_flags = deque(maxlen=self.__trend_trigger_window)
         self.__pred_buffer = []
+        self.__down_count = 0
 
     def predict(self, past_data: float):
         """ Prediction """
 
         # add data to buffer
-        self.__data_buffer.append(past_data)
+        self.__update(past_data)
 
         if len(self.__data_buffer) < self.__step_size:
             # wait until data_buffer store enough data to predict
             return None, None
-        elif len(self.__data_buffer) > self.__step_size:
-            # keep data buffer size to be not large
-            self.__data_buffer = self.__data_buffer[-self.__step_size:]
 
-        data = self.__data_buffer[:- self.__step_size - 1:-1]
         # prediction
-        pred = sum([i * w for i, w in zip(data, self.__weight)])
+        pred = sum([i * w for i, w in zip(reversed(self.__data_buffer), self.__weight)])
         trend = self.trend()
 
         return pred, trend
 
+    def __update(self, past_data):
+        buffer = self.__data_buffer
+        if len(buffer) > 0 and self.__trend_trigger_window > 0:
+            flag = past_data - buffer[-1] < self.__trend_trigger_value
+            if len(self.__trend_flags) == self.__trend_trigger_window:
+                self.__down_count -= self.__trend_flags[0]
+            self.__trend_flags.append(flag)
+            self.__down_count += flag
+        buffer.append(past_data)
+
+    def predict_batch(self, prices):
+        """ Prediction over a whole price array, same as calling `predict` of a fresh model on each price in order.
+        Buffer of the streaming `predict` is neither used nor changed.
+
+        Predictions are bit-identical to `predict`: the same products of price and weight are summed newest first
+        as the builtin `sum` does (plain addition, or Neumaier compensated addition from Python 3.12), one vectorized
+        pass per weight. So it costs O(len(prices) * step_size).
+
+        :param prices: 1d array of price
+        :return: (prediction, trend) as float and bool array of the same length. Prediction is NaN (and trend is
+                 False) where `predict` returns (None, None).
+        """
+        prices = np.asarray(prices)
+        size, n = len(prices), self.__step_size
+        pred = np.full(size, np.nan)
+        trend = np.zeros(size, dtype=bool)
+        if size < n:
+            return pred, trend
+
+        x = prices.astype(np.float64)
+        total = x[n - 1:] * self.__weight[0]
+        compensation = np.zeros(len(total))
+        for k in range(1, n):
+            term = x[n - 1 - k:size - k] * self.__weight[k]
+            t = total + term
+            if _COMPENSATED_SUM:
+                compensation += np.where(np.abs(total) >= np.abs(term), (total - t) + term, (term - t) + total)
+            total = t
+        if _COMPENSATED_SUM:
+            total = np.where((compensation != 0) & np.isfinite(compensation), total + compensation, total)
+        pred[n - 1:] = total
+
+        window = self.__trend_trigger_window
+        if window > 0:
+            flags = np.concatenate([[0], np.cumsum(np.diff(prices) < self.__trend_trigger_value)])
+            # down moves over the last `window` ticks at each tick t >= n - 1
+            t = np.arange(n - 1, size)
+            down_count = flags[t] - flags[t - window]
+        else:
+            down_count = np.zeros(size - n + 1, dtype=np.int64)
+        trend[n - 1:] = down_count >= self.__trend_trigger_count
+        return pred, trend
+
     def trend(self):
         """ if latest data keep decreasing -> regard it as negative trending """
-        flgs = [self.__data_buffer[i + 1] - self.__data_buffer[i] < self.__trend_trigger_value
-                for i in range(len(self.__data_buffer) - 1)]
-        flgs = flgs[-min(self.__trend_trigger_window, len(flgs)):]
-        return sum(flgs) >= self.__trend_trigger_count
+        return self.__down_count >= self.__trend_trigger_count
 
     def reset_buffer(self):
         self.__pred_buffer = []
-        self.__data_buffer = []
+        self.__data_buffer.clear()
+        self.__trend_flags.clear()
+        self.__down_count = 0
 
     @property
     def data_buffer(self):
-        return self.__data_buffer
+        return list(self.__data_buffer)
 
     @property
     def predict_buffer(self):
@@ -0,0 +1,137 @@
+""" Host many strategies in one process
+
+Each strategy is an `ExecutorFX` with its own model and risk parameters, running the event driven engine on one event
+loop. All of them share one market data feed per product and one rate-limited API client, so adding a strategy adds
+only its own order calls, eg)
+
+    runner = StrategyRunner(id_api=id_api, strategies=[
+        dict(name='ma_fast', model_name='ma', model_parameter=dict(step_size=3),
+             executor_parameter=dict(latency=10, max_volume=0.01)),
+        dict(name='ma_slow', model_name='ma', model_parameter=dict(step_size=10),
+             executor_parameter=dict(latency=60, max_volume=0.02)),
+    ])
+    runner.run()
+
+Each strategy only cleans up the orders it has placed, and every order and position of the account is cleaned up once
+when the runner exits.
+"""
+
+import sys
+import asyncio
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from .executor_fx import ExecutorFX, HEALTH_CHECK_SEC
+from .. import api
+from ..stream import RealtimeClient, SharedFeed
+from ..util import get_logger
+
+__all__ = (
+    "StrategyRunner"
+)
+
+
+class StrategyRunner:
+
+    def __init__(self,
+                 id_api: dict,
+                 strategies: list,
+                 logger_output: str = './run_trader.log',
+                 realtime: bool = False,
+                 set_jst: bool = True,
+                 slack_webhook_url: dict = None,
+                 max_workers: int = None):
+        """
+
+        :param id_api: password for bF API
+        :param strategies: list of dict with `name`, `model_name`, `model_parameter` and `executor_parameter` (keyword
+                           arguments of `ExecutorFX`). Each strategy logs to `<logger_output>.<name>`
+        :param realtime: take ticker from realtime API instead of polling ticker API
+        :param max_workers: threads for blocking order calls (two per strategy if None)
+        """
+        names = [s['name'] for s in strategies]
+        if len(set(names)) != len(names):
+            raise ValueError('duplicated strategy name: %s' % names)
+        self.__max_workers = 2 * len(strategies) + 4 if max_workers is None else max_workers
+
+        # one connection pool and one rate limiter for every strategy
+        self.api_client = api.API(**id_api)
+        self.api_client_async = api.AsyncAPI(rate_limiter=self.api_client.rate_limiter, **id_api)
+        self.api_order = api.Order(api=self.api_client)
+        api_public_async = api.AsyncPublic(api=self.api_client_async)
+
+        self.__log = get_logger(logger_output, set_jst=set_jst, slack_webhook_url=slack_webhook_url)
+        self.__log("Strategy runner configuration", to_slack=True)
+
+        self.executors = dict()
+        asset_latency = dict()
+        for strategy in strategies:
+            parameter = dict(strategy.get('executor_parameter', dict()))
+            output = None if logger_output is None else '%s.%s' % (logger_output, strategy['name'])
+            executor = ExecutorFX(id_api=id_api,
+                                  logger_output=output,
+                                  set_jst=set_jst,
+                                  slack_webhook_url=slack_webhook_url,
+                                  api_client=self.api_client,
+                                  api_client_async=self.api_client_async,
+                                  own_orders_only=True,
+                                  **parameter)
+            executor.set_model(model_name=strategy['model_name'], model_parameter=strategy.get('model_parameter'))
+            asset = parameter.get('asset_name', 'FX_BTC_JPY')
+            self.executors[strategy['name']] = (executor, asset)
+            latency = parameter.get('latency', 60.0)
+            asset_latency[asset] = min(latency, asset_latency.get(asset, latency))
+            self.__log(" - %s: %s" % (strategy['name'], asset), to_slack=True)
+
+        # one feed per product, polled as fast as the fastest strategy on it
+        self.feeds = dict()
+        for asset, latency in asset_latency.items():
+            client = RealtimeClient(product_code=asset, channels=('ticker', )) if realtime else None
+            self.feeds[asset] = SharedFeed(api_public_async, product_code=asset, interval=latency,
+                                           health_sec=HEALTH_CHECK_SEC, realtime=client)
+            self.__log(" - feed %s: interval %0.2f sec, realtime %s" % (asset, latency, realtime), to_slack=True)
+
+    def run(self):
+        """ Run every strategy till interrupted, and then clean up positions """
+        value = self.api_order.get_collateral()
+        if 'collateral' not in value.keys():
+            self.__log('get_collateral: %s' % str(value))
+            raise KeyError('collateral')
+        initial_asset_jpy = value['collateral']
+
+        msg = ''
+        try:
+            try:
+                asyncio.run(self.__run())
+            except KeyboardInterrupt:
+                msg = 'Finish trading: KeyboardInterrupt'
+        except Exception:
+            msg = traceback.format_exc()
+        self.__log(msg, push_all=True, to_slack=True)
+
+        # every strategy has stopped, so clean up the account at once
+        executor = list(self.executors.values())[0][0]
+        executor.cleanup_positions()
+
+        self.__log('Trading report', is_pl=True, to_slack=True)
+        value = self.api_order.get_collateral()
+        if 'collateral' in value.keys():
+            self.__log(' - PL total           : %0.3f' % (value["collateral"] - initial_asset_jpy),
+                       is_pl=True, to_slack=True)
+            self.__log(" - collateral         : %0.5f" % value["collateral"], is_pl=True, to_slack=True)
+        for asset, feed in self.feeds.items():
+            self.__log('Feed %s: %s' % (asset, str(feed.stats)))
+        self.__log('API connection: %s' % str(self.api_client.stats.as_dict()))
+        self.api_client.close()
+        self.__log("Exit", is_pl=True, to_slack=True, push_all=True)
+        sys.exit()
+
+    async def __run(self):
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=self.__max_workers))
+        tasks = [feed.run() for feed in self.feeds.values()]
+        tasks += [executor.run_async(self.feeds[asset]) for executor, asset in self.executors.values()]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for feed in self.feeds.values():
+                await feed.close()
+            await self.api_client_async.close()
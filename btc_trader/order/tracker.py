@@ -0,0 +1,167 @@
+""" State machine of one IFDOCO parent order
+
+`OrderTracker` keeps what has been learned about a parent order across tracking passes, instead of rebuilding it from
+every API return:
+
+    - `parent_order_id` is resolved once (`get_parent_order` is called only on the first pass)
+    - each child order is kept by `child_order_id`, and its `expire_date` is parsed only when it first shows up
+    - `update` takes the latest `get_child_orders` return and tells whether any child order changed, so the caller only
+      reacts (and logs) when something happened
+
+The cases (A)-(K) of `ExecutorFX.__tracking_active_order` are the states, and `transition` moves between them:
+
+    A) ANCHOR [active]                                   -> wait
+    B) ANCHOR [completed], OCO [not triggered]           -> wait
+    C) ANCHOR [completed], OCO [active]                  -> wait
+    D) ANCHOR [completed], OCO [completed]               -> finish
+    E) ANCHOR [expired]                                  -> finish
+    F) ANCHOR [completed], OCO [expired]                 -> offset
+    G) ANCHOR [completed], OCO [rejected] (past expire)  -> offset
+    J) the other cases                                   -> offset
+    K) OCO executed both of PT and LC (net position)     -> offset
+
+A waiting state goes to offset once the order is older than `minute_to_expire`.
+
+In (A) and (C) the child orders rest on the book, so they only change when the market reaches their price or they
+expire. While `quiet` is True, polling can't find a change unless the market has reached a price of the order, and
+the caller can skip it.
+"""
+
+import time
+from ..util import utc_to_unix
+
+__all__ = (
+    "OrderTracker",
+    "CASES"
+)
+
+CASES = dict(
+    A='ANCHOR [active]',
+    B='ANCHOR [completed], OCO [not triggered]',
+    C='ANCHOR [completed], OCO [active]',
+    D='ANCHOR [completed], OCO [completed]',
+    E='ANCHOR [expired]',
+    F='ANCHOR [completed], OCO [expired]',
+    G='ANCHOR [completed], OCO [rejected]',
+    J='unclear state',
+    K='OCO [both executed]'
+)
+WAIT, FINISH, OFFSET = 'wait', 'finish', 'offset'
+QUIET_CASES = ['A', 'C']  # resting orders, changed only by a fill or expiry
+ACTIONS = dict(A=WAIT, B=WAIT, C=WAIT, D=FINISH, E=FINISH, F=OFFSET, G=OFFSET, J=OFFSET, K=OFFSET)
+
+
+class OrderTracker:
+
+    def __init__(self,
+                 acceptance_order_id: str,
+                 order_timestamp: float,
+                 minute_to_expire: int):
+        self.acceptance_order_id = acceptance_order_id
+        self.order_timestamp = order_timestamp
+        self.minute_to_expire = minute_to_expire
+        self.parent_order_id = None
+        self.parent_order_state = None
+        self.case = None
+        self.expired = False  # older than `minute_to_expire`
+        self.total_commission = 0.0
+        self.last_transition = None  # unix time of the latest `transition`
+        # child_order_id -> dict(id, side, child_order_state, executed_size, expire_unix)
+        self.__children = dict()
+
+    @property
+    def children(self):
+        return list(self.__children.values())
+
+    @property
+    def net_executed_size(self):
+        """ BUY is positive """
+        size = sum(c['executed_size'] if c['side'] == 'BUY' else -c['executed_size'] for c in self.__children.values())
+        return round(size * 10 ** 8) * 10 ** -8
+
+    @property
+    def action(self):
+        """ 'wait', 'finish' or 'offset' """
+        if self.case is None:
+            return WAIT
+        action = ACTIONS[self.case]
+        return OFFSET if action == WAIT and self.expired else action
+
+    def update(self, child_orders: list):
+        """ apply `get_child_orders` return of this parent order
+
+        :return: True if any child order is new or changed its state/executed size
+        """
+        changed = False
+        for order in child_orders:
+            key = order['child_order_id']
+            child = self.__children.get(key)
+            if child is None:
+                child = dict(id=order.get('id', len(self.__children)), side=order['side'],
+                             child_order_state=None, executed_size=None,
+                             expire_unix=utc_to_unix(order['expire_date']))  # API's timestamp is UTC based
+                self.__children[key] = child
+            if child['child_order_state'] != order['child_order_state'] \
+                    or child['executed_size'] != order['executed_size']:
+                child['child_order_state'] = order['child_order_state']
+                child['executed_size'] = order['executed_size']
+                changed = True
+        if changed:
+            self.total_commission = sum(float(o.get('total_commission', 0)) for o in child_orders)
+        return changed
+
+    def update_parent(self, parent_order_state: str):
+        """ state of parent order from `get_parent_orders`, needed only while no child order shows up """
+        changed = parent_order_state != self.parent_order_state
+        self.parent_order_state = parent_order_state
+        return changed
+
+    def transition(self, now: float = None):
+        """ move to the case of the current child orders
+
+        :return: (case, True if the case changed)
+        """
+        now = time.time() if now is None else now
+        self.last_transition = now
+        self.expired = now - self.order_timestamp >= self.minute_to_expire * 60
+        previous = self.case
+        self.case = self.__classify(now)
+        return self.case, self.case != previous
+
+    def quiet(self, now: float = None, max_quiet_sec: float = 60.0):
+        """ True if the order rests in (A) or (C), neither the order nor an active child order has expired since,
+        and the latest `transition` is within `max_quiet_sec` (partial fills and manual cancels are caught at
+        least this often) """
+        now = time.time() if now is None else now
+        if self.case not in QUIET_CASES or self.last_transition is None:
+            return False
+        if now - self.last_transition >= max_quiet_sec or now - self.order_timestamp >= self.minute_to_expire * 60:
+            return False
+        expire = [c['expire_unix'] for c in self.__children.values() if c['child_order_state'] == 'ACTIVE']
+        return len(expire) == 0 or now < min(expire)
+
+    def __classify(self, now):
+        children = sorted(self.__children.values(), key=lambda c: c['id'])  # ANCHOR is the first
+        states = [c['child_order_state'] for c in children]
+        if len(children) == 0:
+            if self.parent_order_state == 'EXPIRED':
+                return 'E'
+            if self.parent_order_state == 'ACTIVE':
+                return 'A'
+            return 'J'
+        anchor, oco = children[0], children[1:]
+        if len(oco) == 0:
+            if anchor['child_order_state'] == 'ACTIVE':
+                return 'A'
+            if anchor['child_order_state'] == 'COMPLETED':
+                return 'B' if now < anchor['expire_unix'] else 'G'
+            return 'J'
+        if len(oco) > 1 and len([c for c in oco if c['executed_size'] > 0]) > 1:
+            return 'K'
+        if 'ACTIVE' in states:
+            return 'C'
+        if all(s == 'COMPLETED' for s in states):
+            return 'D' if self.net_executed_size == 0 else 'K'
+        if 'EXPIRED' in states:
+            return 'F'
+        return 'J'
@@ -0,0 +1,17 @@
+from .exchange import Exchange
+from .server import StandInServer
+from .backtest import Backtest, load_candles
+from .sweep import Sweep, grid, random_search
+from .paper import PaperOrder, VirtualClock
+
+__all__ = (
+    "Exchange",
+    "StandInServer",
+    "Backtest",
+    "load_candles",
+    "Sweep",
+    "grid",
+    "random_search",
+    "PaperOrder",
+    "VirtualClock"
+)
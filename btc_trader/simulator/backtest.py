@@ -0,0 +1,270 @@
+""" Offline backtest of `ExecutorFX` order logic over stored candles
+
+Every candle close is one market sample, with best ask at the close price and best bid `spread` below it. Orders follow
+the same decision rules as `ExecutorFX.__new_order` and the IFDOCO life cycle seen by `__tracking_active_order`:
+
+    - ANCHOR: limit BUY at best ask, filled by the first later candle with low <= anchor
+    - OCO: limit SELL at the predicted price (profit take) and stop SELL at best bid - spread - loss_cut_margin (loss
+      cut). In the candle of the anchor fill only the stop can trigger, and when a later candle touches both the stop
+      is taken (pessimistic). A stop in a candle opened below the trigger is filled at the open.
+    - anchor not filled by `minute_to_expire`: order expires without position
+    - OCO not triggered by `minute_to_expire`: position is offset at best bid of the candle of expiry
+    - no new order within `minute_for_sp` before 00:00 JST. At the first candle in there, the order is cancelled and
+      the position is offset at best bid (nothing is filled in that candle)
+    - one order at a time: next order is placed at the first candle after the previous one is done
+
+It runs over arrays instead of order objects. The decision of every candle and the outcome of every candidate order
+are vectorized (outcomes by searching the first hit forward over the shrinking set of unresolved orders), and only
+the chain of orders actually placed is walked in Python, eg)
+
+    candles = load_candles(ConnectPSQL(db_info), period=60)
+    backtest = Backtest(candles, spread=100, loss_cut_margin=50, min_profit_take_margin=20)
+    trades, summary = backtest.run(MovingAverage(step_size=10, trend_trigger_value=-5))
+"""
+
+import numpy as np
+import pandas as pd
+from ..order.minimum_price import minimum_price
+
+__all__ = (
+    "Backtest",
+    "load_candles"
+)
+
+JST_OFFSET_SEC = 9 * 60 * 60
+DAY_SEC = 24 * 60 * 60
+COLUMNS = ['close_unix_time', 'open_price', 'high_price', 'low_price', 'close_price']
+
+
+def load_candles(source, period: int = 60, begin: int = None, end: int = None):
+    """ candles in ascending order of `close_unix_time`
+
+    :param source: `ConnectPSQL` (read `price` table of `period`), `CandleStore`, path to csv file with the columns
+                   of `price` table, or data frame. (`Backtest` also takes `CandleStore.read` as it is, without copy)
+    :param begin: unix time to start (exclusive)
+    :param end: unix time to end (exclusive)
+    """
+    if hasattr(source, 'read_frame'):
+        candles = source.read_frame(period,
+                                    begin=None if begin is None else begin + 1,
+                                    end=end)
+    elif hasattr(source, 'get_historical_data'):
+        candles = source.get_historical_data(period,
+                                             begin=-1 if begin is None else begin,
+                                             end=2 ** 31 - 1 if end is None else end)
+    else:
+        candles = pd.read_csv(source) if type(source) is str else source
+        if 'sample_period' in candles.columns:
+            candles = candles[candles['sample_period'] == period]
+        if begin is not None:
+            candles = candles[candles['close_unix_time'] > begin]
+        if end is not None:
+            candles = candles[candles['close_unix_time'] < end]
+    candles = candles.drop_duplicates(subset='close_unix_time').sort_values(by='close_unix_time')
+    return candles[COLUMNS].reset_index(drop=True)
+
+
+def _first_hit(start, last, hit):
+    """ first index j in [start, last] for each order with hit(order, j) True, -1 if none
+
+    Scans forward one candle at a time over the orders not resolved yet, so the cost is the total number of candles
+    the orders stay unresolved rather than (orders x horizon).
+    """
+    result = np.full(len(start), -1, dtype=np.int64)
+    active = np.arange(len(start))
+    j = start.astype(np.int64)
+    while len(active) > 0:
+        active = active[j[active] <= last[active]]
+        if len(active) == 0:
+            break
+        flag = hit(active, j[active])
+        result[active[flag]] = j[active[flag]]
+        active = active[~flag]
+        j[active] += 1
+    return result
+
+
+class Backtest:
+
+    def __init__(self,
+                 candles: pd.DataFrame,
+                 spread: float = 100.0,
+                 book_size: float = 1.0,
+                 commission_rate: float = 0.0,
+                 max_spread: float = 1000.0,
+                 loss_cut_margin: float = 10,
+                 min_profit_take_margin: float = 100,
+                 max_profit_take_margin: float = 500,
+                 max_volume: float = 0.005,
+                 min_volume: float = 0.001,
+                 minute_to_expire: int = 1000,
+                 minute_for_sp: int = 5,
+                 **kwargs):
+        """ Parameters after `commission_rate` are the ones of `ExecutorFX` (others, eg `latency`, are ignored so that
+        `executor_parameter` of config can be passed as it is)
+
+        :param candles: data frame from `load_candles` (or dict of its column arrays)
+        :param spread: spread between best ask (close price) and best bid
+        :param book_size: size at best bid/ask
+        :param commission_rate: commission rate used for minimum profit price
+        """
+        self.candles = candles
+        self.spread = spread
+        self.book_size = book_size
+        self.commission_rate = commission_rate
+        self.max_spread = max_spread
+        self.loss_cut_margin = loss_cut_margin
+        self.min_profit_take_margin = min_profit_take_margin
+        self.max_profit_take_margin = max_profit_take_margin
+        self.max_volume = max_volume
+        self.min_volume = min_volume
+        self.minute_to_expire = minute_to_expire
+        self.minute_for_sp = minute_for_sp
+        assert self.min_profit_take_margin < self.max_profit_take_margin
+
+        # no copy if arrays already have the dtype (eg, shared memory of `Sweep`)
+        self.__time = np.asarray(candles['close_unix_time'], dtype=np.int64)
+        self.__open = np.asarray(candles['open_price'], dtype=np.float64)
+        self.__high = np.asarray(candles['high_price'], dtype=np.float64)
+        self.__low = np.asarray(candles['low_price'], dtype=np.float64)
+        self.__close = np.asarray(candles['close_price']).astype(np.int64, copy=False)  # `ExecutorFX` takes int
+
+    @staticmethod
+    def predict(model, prices):
+        """ (prediction, trend) arrays from `predict_batch` of model, or by streaming `predict` if it has none """
+        if hasattr(model, 'predict_batch'):
+            return model.predict_batch(prices)
+        pred = np.full(len(prices), np.nan)
+        trend = np.zeros(len(prices), dtype=bool)
+        for i, price in enumerate(prices.tolist()):
+            _pred, _trend = model.predict(price)
+            if _pred is not None:
+                pred[i], trend[i] = _pred, _trend
+        return pred, trend
+
+    def __swap_window(self):
+        """ flag of candles within `minute_for_sp` before 00:00 JST, and index of the next such candle """
+        sec_of_day = (self.__time + JST_OFFSET_SEC) % DAY_SEC
+        in_swap = sec_of_day >= DAY_SEC - self.minute_for_sp * 60
+        size = len(in_swap)
+        index = np.where(in_swap, np.arange(size), size)
+        next_swap = np.minimum.accumulate(index[::-1])[::-1]
+        return in_swap, next_swap
+
+    def run(self, model):
+        """ Run backtest
+
+        :param model: model with `predict_batch` or `predict` (eg, `MovingAverage`), fresh buffer
+        :return: (data frame of orders, dict of summary)
+        """
+        ask = self.__close
+        ask_float = ask.astype(np.float64)
+        bid = ask_float - self.spread
+
+        ##################
+        # Skip Condition #
+        ##################
+        pred, trend = self.predict(model, ask)
+        pred = np.round(pred)  # `ExecutorFX` rounds prediction
+        in_swap, next_swap = self.__swap_window()
+
+        volume = self.book_size
+        candidate = ~np.isnan(pred) & ~trend & ~in_swap
+        if self.spread > self.max_spread or volume < self.min_volume:
+            candidate[:] = False
+        volume = min(self.max_volume, volume)
+        volume = round(volume*10**3)*10**-3
+        # `minimum_price` over price array (volume of the other side doesn't depend on price)
+        _, volume_other_side = minimum_price(commission=self.commission_rate, volume=volume, price=0)
+        min_price_for_profit = np.round(np.round(ask_float * volume + 0.5) / volume_other_side + 0.5)
+        min_profit_take_margin = min_price_for_profit - ask_float + self.min_profit_take_margin
+        with np.errstate(invalid='ignore'):
+            predicted_margin = np.minimum(self.max_profit_take_margin, pred - ask_float)
+            candidate &= predicted_margin >= min_profit_take_margin
+
+        order = np.flatnonzero(candidate)
+        anchor = ask_float[order]
+        profit_take = predicted_margin[order] + anchor
+        loss_cut = bid[order] - self.spread - self.loss_cut_margin
+
+        # last candle of each order: expiry or swap point, whichever comes first. Nothing is filled in the candle of
+        # swap point, as orders are cancelled and position is offset there.
+        expire = np.searchsorted(self.__time, self.__time[order] + self.minute_to_expire * 60, side='right') - 1
+        by_swap = next_swap[order] <= expire
+        end = np.where(by_swap, next_swap[order], expire)
+        last = np.where(by_swap, end - 1, end)
+
+        ##############
+        # Simulation #
+        ##############
+        low, high, open_price = self.__low, self.__high, self.__open
+        fill = _first_hit(order + 1, last, lambda i, j: low[j] <= anchor[i])
+        filled = fill >= 0
+
+        exit_ = np.full(len(order), -1, dtype=np.int64)
+        _fill, _loss_cut, _profit_take = fill[filled], loss_cut[filled], profit_take[filled]
+        exit_[filled] = _first_hit(
+            _fill, last[filled],
+            lambda i, j: (low[j] <= _loss_cut[i]) | ((j > _fill[i]) & (high[j] >= _profit_take[i])))
+
+        status = np.full(len(order), 'expired', dtype=object)
+        status[~filled & by_swap] = 'swap_point'
+        exit_price = np.full(len(order), np.nan)
+        hit = exit_ >= 0
+        is_loss_cut = np.zeros(len(order), dtype=bool)
+        is_loss_cut[hit] = low[exit_[hit]] <= loss_cut[hit]
+        is_profit_take = hit & ~is_loss_cut
+        status[is_loss_cut] = 'loss_cut'
+        status[is_profit_take] = 'profit_take'
+        gap = is_loss_cut & (exit_ > fill)
+        exit_price[is_loss_cut] = loss_cut[is_loss_cut]
+        exit_price[gap] = np.minimum(loss_cut[gap], open_price[exit_[gap]])
+        exit_price[is_profit_take] = profit_take[is_profit_take]
+        # OCO not triggered: offset at best bid of the candle of expiry or swap point
+        offset = filled & ~hit
+        status[offset] = np.where(by_swap[offset], 'swap_point', 'expired_position')
+        exit_[offset] = end[offset]
+        exit_price[offset] = bid[end[offset]]
+
+        # order is done at exit, or at expiry/swap point if anchor is not filled
+        done = np.where(exit_ >= 0, exit_, end)
+
+        ##################
+        # Order Sequence #
+        ##################
+        placed = []
+        n = 0
+        while n < len(order):
+            placed.append(n)
+            n = np.searchsorted(order, done[n], side='right')
+        placed = np.array(placed, dtype=np.int64)
+
+        trades = pd.DataFrame(dict(
+            order_unix_time=self.__time[order[placed]],
+            anchor=anchor[placed],
+            profit_take=profit_take[placed],
+            loss_cut=loss_cut[placed],
+            volume=volume,
+            status=status[placed],
+            fill_unix_time=np.where(filled[placed], self.__time[np.maximum(fill[placed], 0)], -1),
+            exit_unix_time=np.where(exit_[placed] >= 0, self.__time[np.maximum(exit_[placed], 0)], -1),
+            exit_price=exit_price[placed]
+        ))
+        trades['pl'] = ((trades['exit_price'] - trades['anchor']) * volume).fillna(0.0)
+        return trades, self.summary(trades)
+
+    @staticmethod
+    def summary(trades: pd.DataFrame):
+        pl = trades['pl'].values
+        filled = trades['fill_unix_time'].values >= 0
+        cumulative = np.cumsum(pl)
+        drawdown = np.maximum.accumulate(np.concatenate([[0.0], cumulative]))[1:] - cumulative
+        return dict(
+            orders=len(trades),
+            filled=int(filled.sum()),
+            pl_total=float(pl.sum()),
+            pl_mean=float(pl[filled].mean()) if filled.any() else 0.0,
+            win_rate=float((pl[filled] > 0).mean()) if filled.any() else 0.0,
+            max_drawdown=float(drawdown.max()) if len(drawdown) > 0 else 0.0,
+            status={k: int(v) for k, v in trades['status'].value_counts().items()}
+        )
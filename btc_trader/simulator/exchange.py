@@ -0,0 +1,570 @@
+""" In-memory stand-in of bitFlyer Lightning FX exchange
+
+Market (best bid/ask) is either driven from outside by `set_market` (eg, replayed or live ticker) or moves as a
+random walk by `step`. Orders are matched against the current best bid/ask only (no depth):
+    - MARKET order (and triggered STOP leg) is filled at best bid/ask, `slippage` worse
+    - LIMIT order crossed by best bid/ask is filled at its price, and the one just touched (price equal to best) is
+      filled with `touch_fill_probability` per market update, as a stand-in of queue position
+
+Order life cycle follows what `ExecutorFX` observes on the real exchange:
+    - child order: ACTIVE -> COMPLETED / CANCELED / EXPIRED
+    - IFDOCO parent order: the first leg is placed as a child order. Once it's completed, the OCO legs wait at the
+      parent level and only the leg whose condition is met first becomes a child order, so `get_child_orders`
+      returns only the anchor until OCO is triggered.
+    - positions are netted FIFO, and collateral changes by realized profit-loss (commission is zero).
+
+Matching is event driven: resting LIMIT orders are kept in price heaps, OCO legs in heaps of their trigger price and
+every order in a heap of its expiry, so a market update only visits the orders it fills, triggers or expires, and the
+lookup by id doesn't scan the history. It sustains thousands of orders per second (eg, stress test by `PaperOrder`).
+"""
+
+import math
+import time
+import heapq
+import random
+import threading
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import count
+from collections import deque
+
+__all__ = (
+    "Exchange"
+)
+
+
+@lru_cache(maxsize=1024)
+def _second_to_utc(second):
+    return datetime.fromtimestamp(second, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def unix_to_utc(unix_time):
+    """ unix time -> UTC string in the format of API return, eg) "2000-01-01T00:00:00.111" """
+    second = math.floor(unix_time)
+    microsecond = round((unix_time - second) * 10 ** 6)
+    if microsecond >= 10 ** 6:
+        second, microsecond = second + 1, 0
+    return '%s.%03i' % (_second_to_utc(second), microsecond // 1000)
+
+
+class Exchange:
+
+    def __init__(self,
+                 product_code: str = 'FX_BTC_JPY',
+                 price: float = 1000000,
+                 spread: float = 100,
+                 size: float = 1.0,
+                 volatility: float = 100,
+                 collateral: float = 1000000,
+                 clock=None,
+                 seed: int = None,
+                 slippage: float = 0.0,
+                 touch_fill_probability: float = 1.0):
+        """
+
+        :param price: initial mid price
+        :param spread: initial spread
+        :param size: best bid/ask size
+        :param volatility: standard deviation of mid price change per `step`
+        :param collateral: initial collateral (JPY)
+        :param clock: function returning current unix time (`time.time` if None), eg) virtual clock for simulation
+        :param seed: random seed of random walk and fill model
+        :param slippage: price difference of MARKET order fill from best bid/ask
+        :param touch_fill_probability: probability to fill LIMIT order at best bid/ask per market update
+        """
+        self.product_code = product_code
+        self.volatility = volatility
+        self.slippage = slippage
+        self.touch_fill_probability = touch_fill_probability
+        self.clock = time.time if clock is None else clock
+        self.collateral = collateral
+        self.lock = threading.RLock()
+        self.__random = random.Random(seed)
+        self.__id = count(1)
+        self.__tick_id = count(1)
+        self.child_orders = []  # oldest first
+        self.parent_orders = []  # oldest first
+        self.positions = deque()  # oldest first
+        self.executions = []  # oldest first
+        self.volume = 0.0
+        # orders still active (id -> order, oldest first), and child/parent orders by order id and acceptance id
+        self.__active_children = dict()
+        self.__active_parents = dict()
+        self.__child_index = dict()
+        self.__parent_index = dict()
+        # resting LIMIT orders as heaps of (-price, id, order) for BUY and (price, id, order) for SELL, OCO legs
+        # waiting for their trigger, and (expire, id, order) of child and parent orders. Closed orders are dropped
+        # lazily when they come on top.
+        self.__bids = []
+        self.__asks = []
+        self.__triggers = dict(bid_above=[], ask_below=[], bid_below=[], ask_above=[])
+        self.__expiry = []
+        self.__sequence = count()
+        self.__changed = deque()  # parent orders to move on
+        self.__matched_tick = None
+        self.set_market(round(price - spread / 2), round(price + spread / 2), size, size)
+
+    ##########
+    # Market #
+    ##########
+
+    def set_market(self, best_bid, best_ask, best_bid_size=1.0, best_ask_size=1.0):
+        """ update best bid/ask and match active orders against it """
+        with self.lock:
+            self.best_bid = best_bid
+            self.best_ask = best_ask
+            self.best_bid_size = best_bid_size
+            self.best_ask_size = best_ask_size
+            self.tick_id = next(self.__tick_id)
+            self.timestamp = self.clock()
+            self.match()
+
+    def step(self):
+        """ move market by a random walk """
+        with self.lock:
+            spread = self.best_ask - self.best_bid
+            mid = (self.best_ask + self.best_bid) / 2 + self.__random.gauss(0, self.volatility)
+            self.set_market(round(mid - spread / 2), round(mid + spread / 2), self.best_bid_size, self.best_ask_size)
+
+    def ticker(self):
+        with self.lock:
+            return dict(product_code=self.product_code,
+                        timestamp=unix_to_utc(self.timestamp),
+                        tick_id=self.tick_id,
+                        best_bid=self.best_bid,
+                        best_ask=self.best_ask,
+                        best_bid_size=self.best_bid_size,
+                        best_ask_size=self.best_ask_size,
+                        total_bid_depth=self.best_bid_size,
+                        total_ask_depth=self.best_ask_size,
+                        ltp=self.executions[-1]['price'] if len(self.executions) > 0 else self.best_ask,
+                        volume=self.volume,
+                        volume_by_product=self.volume)
+
+    def board(self):
+        with self.lock:
+            return dict(mid_price=(self.best_bid + self.best_ask) / 2,
+                        bids=[dict(price=self.best_bid, size=self.best_bid_size)],
+                        asks=[dict(price=self.best_ask, size=self.best_ask_size)])
+
+    ##########
+    # Orders #
+    ##########
+
+    def __new_child(self, side, child_order_type, size, price=None, minute_to_expire=525600,
+                    parent_order_id=None, acceptance_id=None):
+        now = self.clock()
+        n = next(self.__id)
+        order = dict(id=n,
+                     child_order_id='JOR%08i' % n,
+                     child_order_acceptance_id='JRF%08i' % n if acceptance_id is None else acceptance_id,
+                     product_code=self.product_code,
+                     side=side,
+                     child_order_type=child_order_type,
+                     price=0 if price is None else price,
+                     average_price=0,
+                     size=size,
+                     child_order_state='ACTIVE',
+                     expire_date=unix_to_utc(now + minute_to_expire * 60),
+                     child_order_date=unix_to_utc(now),
+                     outstanding_size=size,
+                     cancel_size=0,
+                     executed_size=0,
+                     total_commission=0)
+        if parent_order_id is not None:
+            order['parent_order_id'] = parent_order_id
+        order['_expire'] = now + minute_to_expire * 60
+        order['_touch'] = None  # tick id of the last roll of `touch_fill_probability`
+        order['_parent'] = None
+        self.child_orders.append(order)
+        self.__active_children[n] = order
+        self.__child_index[order['child_order_id']] = order
+        self.__child_index[order['child_order_acceptance_id']] = order
+        heapq.heappush(self.__expiry, (order['_expire'], n, order))
+        return order
+
+    def __close_child(self, order, state):
+        """ move active child order to `state` other than COMPLETED """
+        order['child_order_state'] = state
+        order['cancel_size'] = order['outstanding_size']
+        order['outstanding_size'] = 0
+        self.__active_children.pop(order['id'], None)
+        if order['_parent'] is not None:
+            self.__changed.append(order['_parent'])
+
+    def __close_parent(self, parent, state):
+        parent['parent_order_state'] = state
+        self.__active_parents.pop(parent['id'], None)
+
+    def send_child_order(self, side, child_order_type, size, price=None, minute_to_expire=525600,
+                         acceptance_id=None, **kwargs):
+        """
+
+        :param acceptance_id: acceptance id given by the caller (eg, `PaperOrder` accepts an order before it arrives)
+        """
+        with self.lock:
+            order = self.__new_child(side, child_order_type, size, price, minute_to_expire, acceptance_id=acceptance_id)
+            self.__match_new(order)
+            self.match()
+            return dict(child_order_acceptance_id=order['child_order_acceptance_id'])
+
+    def send_parent_order(self, parameters, order_method='SIMPLE', minute_to_expire=525600, acceptance_id=None,
+                          **kwargs):
+        with self.lock:
+            now = self.clock()
+            n = next(self.__id)
+            parent = dict(id=n,
+                          parent_order_id='JCO%08i' % n,
+                          parent_order_acceptance_id='JRF%08i' % n if acceptance_id is None else acceptance_id,
+                          product_code=self.product_code,
+                          side=parameters[0]['side'],
+                          parent_order_type=order_method,
+                          price=parameters[0].get('price', 0),
+                          average_price=0,
+                          size=parameters[0]['size'],
+                          parent_order_state='ACTIVE',
+                          expire_date=unix_to_utc(now + minute_to_expire * 60),
+                          parent_order_date=unix_to_utc(now),
+                          outstanding_size=parameters[0]['size'],
+                          cancel_size=0,
+                          executed_size=0,
+                          total_commission=0)
+            parent['_expire'] = now + minute_to_expire * 60
+            parent['_parameters'] = parameters
+            parent['_children'] = []
+            parent['_oco'] = order_method in ['OCO', 'IFDOCO']
+            # legs waiting at parent level: OCO places both at once, the other methods start from the first leg
+            parent['_waiting'] = []
+            self.parent_orders.append(parent)
+            self.__active_parents[n] = parent
+            self.__parent_index[parent['parent_order_id']] = parent
+            self.__parent_index[parent['parent_order_acceptance_id']] = parent
+            heapq.heappush(self.__expiry, (parent['_expire'], n, parent))
+            if order_method != 'OCO':
+                self.__place_leg(parent, parameters[0])
+            else:
+                self.__wait_legs(parent, list(parameters))
+                self.__changed.append(parent)
+            self.match()
+            return dict(parent_order_acceptance_id=parent['parent_order_acceptance_id'])
+
+    def __place_leg(self, parent, leg):
+        condition_type = leg['condition_type']
+        child_order_type = 'LIMIT' if condition_type in ['LIMIT', 'STOP_LIMIT'] else 'MARKET'
+        order = self.__new_child(leg['side'], child_order_type, leg['size'], leg.get('price'),
+                                 (parent['_expire'] - self.clock()) / 60, parent['parent_order_id'])
+        order['_parent'] = parent
+        parent['_children'].append(order)
+        self.__match_new(order)
+        return order
+
+    @staticmethod
+    def __triggered(leg, best_bid, best_ask):
+        """ if the OCO leg waiting at parent level should be placed """
+        condition_type = leg['condition_type']
+        if condition_type == 'LIMIT':
+            return best_bid >= leg['price'] if leg['side'] == 'SELL' else best_ask <= leg['price']
+        if condition_type in ['STOP', 'STOP_LIMIT']:
+            return best_bid <= leg['trigger_price'] if leg['side'] == 'SELL' else best_ask >= leg['trigger_price']
+        return True
+
+    def __wait_legs(self, parent, legs):
+        """ legs wait at parent level, and OCO legs wait for their trigger in `__triggers` """
+        parent['_waiting'] = legs
+        if not parent['_oco']:
+            return
+        for leg in legs:
+            if leg['condition_type'] == 'LIMIT':
+                # SELL is triggered by best bid rising to the price, BUY by best ask falling to it
+                heap = 'bid_above' if leg['side'] == 'SELL' else 'ask_below'
+                self.__push_trigger(heap, leg['price'], parent, leg)
+            elif leg['condition_type'] in ['STOP', 'STOP_LIMIT']:
+                heap = 'bid_below' if leg['side'] == 'SELL' else 'ask_above'
+                self.__push_trigger(heap, leg['trigger_price'], parent, leg)
+
+    def __push_trigger(self, heap, price, parent, leg):
+        # every heap is a min heap of the price to reach first
+        key = -price if heap in ['ask_below', 'bid_below'] else price
+        heapq.heappush(self.__triggers[heap], (key, next(self.__sequence), parent, leg))
+
+    def __fill(self, order, price):
+        now = self.clock()
+        order['child_order_state'] = 'COMPLETED'
+        order['average_price'] = price
+        order['executed_size'] = order['size']
+        order['outstanding_size'] = 0
+        self.__active_children.pop(order['id'], None)
+        if order['_parent'] is not None:
+            self.__changed.append(order['_parent'])
+        self.volume += order['size']
+        self.executions.append(dict(id=next(self.__id), side=order['side'], price=price, size=order['size'],
+                                    exec_date=unix_to_utc(now),
+                                    child_order_acceptance_id=order['child_order_acceptance_id']))
+        # net position FIFO
+        size = order['size']
+        sign = 1 if order['side'] == 'BUY' else -1
+        while size > 1e-12 and len(self.positions) > 0 and self.positions[0]['side'] != order['side']:
+            position = self.positions[0]
+            closed = min(size, position['size'])
+            self.collateral += -sign * (price - position['price']) * closed
+            position['size'] = round(position['size'] - closed, 8)
+            size = round(size - closed, 8)
+            if position['size'] <= 1e-12:
+                self.positions.popleft()
+        if size > 1e-12:
+            self.positions.append(dict(product_code=self.product_code, side=order['side'], price=price, size=size,
+                                       commission=0, swap_point_accumulate=0, require_collateral=price * size / 4,
+                                       open_date=unix_to_utc(now), leverage=4, pnl=0, sfd=0))
+
+    def __touched(self, order):
+        """ if LIMIT order at best bid/ask is filled, rolled once per market update """
+        if self.touch_fill_probability >= 1:
+            return True
+        if order['_touch'] == self.tick_id:
+            return False
+        order['_touch'] = self.tick_id
+        return self.__random.random() < self.touch_fill_probability
+
+    def __match_new(self, order):
+        """ fill new child order against current best bid/ask, or let it rest in the book """
+        if order['child_order_type'] == 'MARKET':
+            if order['side'] == 'BUY':
+                self.__fill(order, self.best_ask + self.slippage)
+            else:
+                self.__fill(order, self.best_bid - self.slippage)
+        elif order['side'] == 'BUY':
+            if self.best_ask < order['price'] or (self.best_ask == order['price'] and self.__touched(order)):
+                self.__fill(order, order['price'])
+            else:
+                heapq.heappush(self.__bids, (-order['price'], order['id'], order))
+        else:
+            if self.best_bid > order['price'] or (self.best_bid == order['price'] and self.__touched(order)):
+                self.__fill(order, order['price'])
+            else:
+                heapq.heappush(self.__asks, (order['price'], order['id'], order))
+
+    def match(self):
+        """ expire orders, fill the book and trigger OCO legs against the market, and move parent orders on """
+        with self.lock:
+            self.__expire()
+            if self.__matched_tick != self.tick_id:
+                self.__matched_tick = self.tick_id
+                self.__match_book()
+                self.__match_triggers()
+            self.__match_parent_orders()
+            self.__compact()
+
+    def __expire(self):
+        now = self.clock()
+        while len(self.__expiry) > 0 and self.__expiry[0][0] < now:
+            _, _, order = heapq.heappop(self.__expiry)
+            if '_children' in order:
+                if order['parent_order_state'] == 'ACTIVE':
+                    self.__close_parent(order, 'EXPIRED')
+                    for child in order['_children']:
+                        if child['child_order_state'] == 'ACTIVE':
+                            self.__close_child(child, 'EXPIRED')
+            elif order['child_order_state'] == 'ACTIVE':
+                self.__close_child(order, 'EXPIRED')
+
+    def __match_book(self):
+        """ fill LIMIT orders crossed (or touched) by best bid/ask, oldest first """
+        filled = []
+        for book, crossed in [(self.__bids, lambda price: self.best_ask <= price),
+                              (self.__asks, lambda price: self.best_bid >= price)]:
+            touched = []
+            while len(book) > 0 and crossed(book[0][2]['price']):
+                entry = heapq.heappop(book)
+                order = entry[2]
+                if order['child_order_state'] != 'ACTIVE':
+                    continue
+                best = self.best_ask if order['side'] == 'BUY' else self.best_bid
+                if best != order['price'] or self.__touched(order):
+                    filled.append(order)
+                else:
+                    touched.append(entry)
+            for entry in touched:
+                heapq.heappush(book, entry)
+        for order in sorted(filled, key=lambda o: o['id']):
+            self.__fill(order, order['price'])
+
+    def __match_triggers(self):
+        """ OCO legs whose condition is met by best bid/ask """
+        limits = dict(bid_above=self.best_bid, ask_below=-self.best_ask, bid_below=-self.best_bid,
+                      ask_above=self.best_ask)
+        triggered = dict()
+        for name, heap in self.__triggers.items():
+            while len(heap) > 0 and heap[0][0] <= limits[name]:
+                _, _, parent, leg = heapq.heappop(heap)
+                if parent['parent_order_state'] == 'ACTIVE' and any(_l is leg for _l in parent['_waiting']):
+                    triggered[parent['id']] = parent
+        self.__changed.extend(triggered[n] for n in sorted(triggered))
+
+    def __match_parent_orders(self):
+        """ move parent orders whose child order changed (or OCO leg is triggered) to the next legs """
+        while len(self.__changed) > 0:
+            # oldest first, and the ones changed on the way in the next round
+            batch = sorted({parent['id']: parent for parent in self.__changed}.items())
+            self.__changed.clear()
+            for _, parent in batch:
+                if parent['parent_order_state'] == 'ACTIVE':
+                    self.__move_on(parent)
+
+    def __move_on(self, parent):
+        """ next state of active parent order from its child orders and waiting legs """
+        children = parent['_children']
+        if any(order['child_order_state'] in ['CANCELED', 'EXPIRED', 'REJECTED'] for order in children):
+            self.__close_parent(parent, children[-1]['child_order_state'])
+            return
+        if any(order['child_order_state'] == 'ACTIVE' for order in children):
+            return
+        # every placed leg is completed: move on to the next legs
+        if parent['parent_order_type'] in ['IFD', 'IFDOCO'] and len(children) == 1 \
+                and len(parent['_waiting']) == 0:
+            parent['executed_size'] = children[0]['executed_size']
+            parent['average_price'] = children[0]['average_price']
+            self.__wait_legs(parent, list(parent['_parameters'][1:]))
+        if len(parent['_waiting']) == 0:
+            self.__close_parent(parent, 'COMPLETED')
+            parent['outstanding_size'] = 0
+            return
+        for leg in parent['_waiting']:
+            if not parent['_oco'] or self.__triggered(leg, self.best_bid, self.best_ask):
+                # the other OCO leg is cancelled
+                parent['_waiting'] = [] if parent['_oco'] else [_l for _l in parent['_waiting'] if _l is not leg]
+                self.__place_leg(parent, leg)
+                break
+
+    def __compact(self):
+        """ drop entries of closed orders from the heaps once they outnumber the active ones """
+        limit = 2 * (len(self.__active_children) + len(self.__active_parents)) + 1024
+        for book in [self.__bids, self.__asks]:
+            if len(book) > limit:
+                book[:] = [e for e in book if e[2]['child_order_state'] == 'ACTIVE']
+                heapq.heapify(book)
+        for heap in self.__triggers.values():
+            if len(heap) > limit:
+                heap[:] = [e for e in heap if e[2]['parent_order_state'] == 'ACTIVE' and
+                           any(_l is e[3] for _l in e[2]['_waiting'])]
+                heapq.heapify(heap)
+        if len(self.__expiry) > limit:
+            self.__expiry[:] = [e for e in self.__expiry if
+                                e[2].get('child_order_state', e[2].get('parent_order_state')) == 'ACTIVE']
+            heapq.heapify(self.__expiry)
+
+    def cancel_child_order(self, child_order_id=None, child_order_acceptance_id=None, **kwargs):
+        with self.lock:
+            for key in [child_order_id, child_order_acceptance_id]:
+                order = self.__child_index.get(key)
+                if order is not None and order['child_order_state'] == 'ACTIVE':
+                    self.__close_child(order, 'CANCELED')
+            self.match()
+            return dict()
+
+    def cancel_parent_order(self, parent_order_id=None, parent_order_acceptance_id=None, **kwargs):
+        with self.lock:
+            for key in [parent_order_id, parent_order_acceptance_id]:
+                parent = self.__parent_index.get(key)
+                if parent is not None and parent['parent_order_state'] == 'ACTIVE':
+                    self.__close_parent(parent, 'CANCELED')
+                    parent['_waiting'] = []
+                    for order in parent['_children']:
+                        if order['child_order_state'] == 'ACTIVE':
+                            self.__close_child(order, 'CANCELED')
+            return dict()
+
+    def cancel_all_child_orders(self, **kwargs):
+        with self.lock:
+            for order in list(self.__active_children.values()):
+                self.__close_child(order, 'CANCELED')
+            self.match()
+            return dict()
+
+    #########
+    # Query #
+    #########
+
+    @staticmethod
+    def __public(order):
+        return {k: v for k, v in order.items() if not k.startswith('_')}
+
+    def get_child_orders(self, count=100, child_order_state=None, parent_order_id=None, child_order_id=None,
+                         child_order_acceptance_id=None, **kwargs):
+        with self.lock:
+            self.match()
+            # narrow down candidates by index, newest first
+            if child_order_id is not None or child_order_acceptance_id is not None:
+                candidates = [self.__child_index[k] for k in [child_order_id, child_order_acceptance_id]
+                              if k in self.__child_index][:1]
+            elif parent_order_id is not None:
+                parent = self.__parent_index.get(parent_order_id)
+                candidates = [] if parent is None else reversed(parent['_children'])
+            elif child_order_state == 'ACTIVE':
+                candidates = reversed(list(self.__active_children.values()))
+            else:
+                candidates = reversed(self.child_orders)
+            result = []
+            for order in candidates:
+                if child_order_state is not None and order['child_order_state'] != child_order_state:
+                    continue
+                if parent_order_id is not None and order.get('parent_order_id') != parent_order_id:
+                    continue
+                if child_order_id is not None and order['child_order_id'] != child_order_id:
+                    continue
+                if child_order_acceptance_id is not None and \
+                        order['child_order_acceptance_id'] != child_order_acceptance_id:
+                    continue
+                result.append(self.__public(order))
+                if len(result) >= int(count):
+                    break
+            return result
+
+    def get_parent_orders(self, count=100, parent_order_state=None, **kwargs):
+        with self.lock:
+            self.match()
+            result = []
+            candidates = reversed(list(self.__active_parents.values())) if parent_order_state == 'ACTIVE' \
+                else reversed(self.parent_orders)
+            for parent in candidates:
+                if parent_order_state is not None and parent['parent_order_state'] != parent_order_state:
+                    continue
+                result.append(self.__public(parent))
+                if len(result) >= int(count):
+                    break
+            return result
+
+    def get_parent_order(self, parent_order_id=None, parent_order_acceptance_id=None, **kwargs):
+        with self.lock:
+            self.match()
+            for key in [parent_order_id, parent_order_acceptance_id]:
+                parent = self.__parent_index.get(key)
+                if parent is not None:
+                    value = self.__public(parent)
+                    value['parameters'] = parent['_parameters']
+                    return value
+            return dict(status=-111, error_message='Order not found')
+
+    def get_positions(self, **kwargs):
+        with self.lock:
+            self.match()
+            return [dict(p, pnl=self.__pnl(p)) for p in self.positions]
+
+    def __pnl(self, position):
+        sign = 1 if position['side'] == 'BUY' else -1
+        mid = (self.best_bid + self.best_ask) / 2
+        return sign * (mid - position['price']) * position['size']
+
+    def get_collateral(self, **kwargs):
+        with self.lock:
+            self.match()
+            return dict(collateral=self.collateral,
+                        open_position_pnl=sum(self.__pnl(p) for p in self.positions),
+                        require_collateral=sum(p['require_collateral'] for p in self.positions),
+                        keep_rate=0.0)
+
+    def get_trading_commission(self, **kwargs):
+        return dict(commission_rate=0.0)
+
+    def get_executions(self, count=100, **kwargs):
+        with self.lock:
+            return [dict(e) for e in reversed(self.executions[-int(count):])]
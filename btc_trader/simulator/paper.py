@@ -0,0 +1,253 @@
+""" Paper trading backend with the interface of `api.Order`
+
+`PaperOrder` takes the same requests as `api.Order` (`send_parent_order` of IFDOCO, `get_child_orders`,
+`get_positions`, `get_collateral`, `cancel_all_child_orders`, ...) and fills them by `Exchange` in memory, against
+the market fed from outside:
+
+    - live: ticker of `public` (`api.Public`) is polled when orders are requested, at most every `refresh_sec`
+    - replay: `on_ticker` / `on_board` with recorded ticker or board, which moves `VirtualClock` to its timestamp
+
+Fill/latency model:
+
+    - a request is accepted right away (with acceptance id) and reaches the exchange `latency` + uniform(0,
+      `latency_jitter`) seconds later by the clock. Until then the order is not found and is not filled.
+    - `slippage` and `touch_fill_probability` of `Exchange`
+    - `reject_rate` of requests are rejected with an error return like API
+
+Nothing is written to disk, eg)
+
+    # paper trading on live market
+    executor = ExecutorFX(id_api=id_api, api_order=PaperOrder(public=api.Public(), latency=0.2, slippage=100))
+
+    # replay as fast as possible
+    paper = PaperOrder(clock=VirtualClock(), latency=0.2, touch_fill_probability=0.3)
+    for ticker in paper.replay(tickers):
+        paper.send_parent_order(order_method='IFDOCO', minute_to_expire=1, parameters=[...])
+"""
+
+import time
+import heapq
+import random
+import calendar
+from functools import lru_cache
+from itertools import count
+from .exchange import Exchange
+
+__all__ = (
+    "PaperOrder",
+    "VirtualClock"
+)
+
+
+@lru_cache(maxsize=4096)
+def _second_to_unix(second):
+    return calendar.timegm(time.strptime(second, '%Y-%m-%dT%H:%M:%S'))
+
+
+def utc_to_unix_precise(t):
+    """ UTC string of API return -> unix time with fraction of second, eg) "2000-01-01T00:00:00.1234567Z" """
+    second, _, fraction = t.rstrip('Z').partition('.')
+    return _second_to_unix(second) + (float('0.' + fraction) if fraction != '' else 0.0)
+
+
+class VirtualClock:
+    """ clock of simulation, moved by `set` or `advance` (never backward) """
+
+    def __init__(self, unix_time: float = 0.0):
+        self.unix_time = unix_time
+
+    def __call__(self):
+        return self.unix_time
+
+    def set(self, unix_time: float):
+        self.unix_time = max(self.unix_time, unix_time)
+
+    def advance(self, sec: float):
+        self.unix_time += max(sec, 0.0)
+
+
+class PaperOrder:
+
+    def __init__(self,
+                 exchange: Exchange = None,
+                 public=None,
+                 product_code: str = 'FX_BTC_JPY',
+                 clock=None,
+                 latency: float = 0.0,
+                 latency_jitter: float = 0.0,
+                 slippage: float = 0.0,
+                 touch_fill_probability: float = 1.0,
+                 reject_rate: float = 0.0,
+                 collateral: float = 1000000,
+                 refresh_sec: float = 1.0,
+                 seed: int = None):
+        """
+
+        :param exchange: `Exchange` to fill orders (new one from the parameters below if None)
+        :param public: `api.Public` to poll live ticker from (market is only fed by `on_ticker`/`on_board` if None)
+        :param clock: function returning current unix time (`time.time` if None). `VirtualClock` follows the
+                      timestamp of replayed ticker.
+        :param latency: seconds from request to arrival at the exchange
+        :param latency_jitter: uniform random seconds added to latency
+        :param slippage: price difference of MARKET order fill from best bid/ask
+        :param touch_fill_probability: probability to fill LIMIT order at best bid/ask per market update
+        :param reject_rate: probability to reject a request
+        :param collateral: initial collateral (JPY)
+        :param refresh_sec: min interval to poll ticker of `public`
+        :param seed: random seed of the fill/latency model
+        """
+        if exchange is None:
+            exchange = Exchange(product_code, collateral=collateral, clock=time.time if clock is None else clock,
+                                seed=seed, slippage=slippage, touch_fill_probability=touch_fill_probability)
+        self.exchange = exchange
+        self.clock = exchange.clock
+        self.public = public
+        self.product_code = product_code
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.reject_rate = reject_rate
+        self.refresh_sec = refresh_sec
+        self.request_count = 0
+        self.reject_count = 0
+        self.error_count = 0  # requests failed on arrival at the exchange
+        self.__random = random.Random(seed)
+        self.__id = count(1)
+        self.__seq = count()
+        self.__pending = []  # heap of (arrival time, sequence, exchange method, parameters)
+        self.__last_refresh = None
+
+    @property
+    def pending(self):
+        """ number of requests not arrived at the exchange yet """
+        return len(self.__pending)
+
+    ##########
+    # Market #
+    ##########
+
+    def on_ticker(self, ticker: dict):
+        """ update market by ticker (`Public.ticker` return or the recorded one) """
+        if isinstance(self.clock, VirtualClock) and 'timestamp' in ticker:
+            timestamp = ticker['timestamp']
+            self.clock.set(utc_to_unix_precise(timestamp) if type(timestamp) is str else timestamp)
+        with self.exchange.lock:
+            self.__deliver()
+            self.exchange.set_market(ticker['best_bid'], ticker['best_ask'],
+                                     ticker.get('best_bid_size', 1.0), ticker.get('best_ask_size', 1.0))
+
+    def on_board(self, board: dict, timestamp: float = None):
+        """ update market by board (`Public.board` return, bids descending and asks ascending in price)
+
+        :param timestamp: unix time of the board, to move `VirtualClock`
+        """
+        if isinstance(self.clock, VirtualClock) and timestamp is not None:
+            self.clock.set(timestamp)
+        bid, ask = board['bids'][0], board['asks'][0]
+        with self.exchange.lock:
+            self.__deliver()
+            self.exchange.set_market(bid['price'], ask['price'], bid['size'], ask['size'])
+
+    def replay(self, feed):
+        """ update market by each of recorded tickers (or boards), and yield it """
+        for value in feed:
+            if 'bids' in value:
+                self.on_board(value, value.get('unix_time'))
+            else:
+                self.on_ticker(value)
+            yield value
+
+    def __refresh(self):
+        """ poll live ticker """
+        if self.public is None:
+            return
+        now = time.time()
+        if self.__last_refresh is not None and now - self.__last_refresh < self.refresh_sec:
+            return
+        self.__last_refresh = now
+        ticker = self.public.ticker(product_code=self.product_code)
+        if type(ticker) is dict and 'best_bid' in ticker:
+            self.on_ticker(ticker)
+
+    def __deliver(self):
+        """ pass the requests arrived by now to the exchange """
+        now = self.clock()
+        while len(self.__pending) > 0 and self.__pending[0][0] <= now:
+            _, _, method, parameter = heapq.heappop(self.__pending)
+            try:
+                method(**parameter)
+            except Exception:
+                self.error_count += 1
+
+    ###########
+    # Request #
+    ###########
+
+    def __send(self, method, parameter: dict, key: str = None):
+        self.__refresh()
+        with self.exchange.lock:
+            self.__deliver()
+            self.request_count += 1
+            if self.reject_rate > 0 and self.__random.random() < self.reject_rate:
+                self.reject_count += 1
+                return dict(status=-208, error_message='Order is not accepted')
+            value = dict()
+            if key is not None:
+                value[key] = 'JRFP%08i' % next(self.__id)
+                parameter = dict(parameter, acceptance_id=value[key])
+            delay = self.latency + (self.__random.uniform(0, self.latency_jitter) if self.latency_jitter > 0 else 0)
+            if delay <= 0:
+                try:
+                    method(**parameter)
+                except Exception as err:
+                    return dict(status=-1, error_message='%s: %s' % (type(err).__name__, str(err)))
+            else:
+                heapq.heappush(self.__pending, (self.clock() + delay, next(self.__seq), method, parameter))
+            return value
+
+    def __query(self, method, parameter: dict):
+        self.__refresh()
+        with self.exchange.lock:
+            self.__deliver()
+            self.request_count += 1
+            return method(**parameter)
+
+    def send_parent_order(self, **params):
+        """ eg) order_method='IFDOCO', minute_to_expire=10, parameters=[anchor, profit take, loss cut] """
+        return self.__send(self.exchange.send_parent_order, params, 'parent_order_acceptance_id')
+
+    def send_child_order(self, **params):
+        return self.__send(self.exchange.send_child_order, params, 'child_order_acceptance_id')
+
+    def cancel_parent_order(self, **params):
+        return self.__send(self.exchange.cancel_parent_order, params)
+
+    def cancel_child_order(self, **params):
+        return self.__send(self.exchange.cancel_child_order, params)
+
+    def cancel_all_child_orders(self, **params):
+        return self.__send(self.exchange.cancel_all_child_orders, params)
+
+    def get_parent_orders(self, **params):
+        return self.__query(self.exchange.get_parent_orders, params)
+
+    def get_parent_order(self, **params):
+        return self.__query(self.exchange.get_parent_order, params)
+
+    def get_child_orders(self, **params):
+        return self.__query(self.exchange.get_child_orders, params)
+
+    def get_positions(self, **params):
+        return self.__query(self.exchange.get_positions, params)
+
+    def get_collateral(self, **params):
+        return self.__query(self.exchange.get_collateral, params)
+
+    def get_executions(self, **params):
+        return self.__query(self.exchange.get_executions, params)
+
+    def get_trading_commission(self, **params):
+        return self.__query(self.exchange.get_trading_commission, params)
+
+    def get_balance(self, **params):
+        collateral = self.__query(self.exchange.get_collateral, params)['collateral']
+        return [dict(currency_code='JPY', amount=collateral, available=collateral)]
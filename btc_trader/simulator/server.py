@@ -0,0 +1,152 @@
+""" Local HTTP stand-in of bitFlyer API backed by `Exchange`
+
+Point `API` at it by `api_url`, eg)
+
+    server = StandInServer(latency=0.05, error_rate=0.01)
+    server.start()
+    executor = ExecutorFX(id_api=dict(api_key='key', api_secret='secret', api_url=server.url), ...)
+"""
+
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+from .exchange import Exchange
+
+__all__ = (
+    "StandInServer"
+)
+
+PUBLIC_GET = {
+    "/v1/ticker": lambda ex, p: ex.ticker(),
+    "/v1/board": lambda ex, p: ex.board(),
+    "/v1/executions": lambda ex, p: ex.get_executions(**p),
+    "/v1/markets": lambda ex, p: [dict(product_code=ex.product_code)],
+    "/v1/getboardstate": lambda ex, p: dict(health='NORMAL', state='RUNNING'),
+    "/v1/gethealth": lambda ex, p: dict(status='NORMAL'),
+}
+PRIVATE_GET = {
+    "/v1/me/getcollateral": lambda ex, p: ex.get_collateral(**p),
+    "/v1/me/getpositions": lambda ex, p: ex.get_positions(**p),
+    "/v1/me/gettradingcommission": lambda ex, p: ex.get_trading_commission(**p),
+    "/v1/me/getchildorders": lambda ex, p: ex.get_child_orders(**p),
+    "/v1/me/getparentorders": lambda ex, p: ex.get_parent_orders(**p),
+    "/v1/me/getparentorder": lambda ex, p: ex.get_parent_order(**p),
+    "/v1/me/getexecutions": lambda ex, p: ex.get_executions(**p),
+    "/v1/me/getbalance": lambda ex, p: [dict(currency_code='JPY', amount=ex.collateral, available=ex.collateral)],
+}
+PRIVATE_POST = {
+    "/v1/me/sendchildorder": lambda ex, p: ex.send_child_order(**p),
+    "/v1/me/sendparentorder": lambda ex, p: ex.send_parent_order(**p),
+    "/v1/me/cancelchildorder": lambda ex, p: ex.cancel_child_order(**p),
+    "/v1/me/cancelparentorder": lambda ex, p: ex.cancel_parent_order(**p),
+    "/v1/me/cancelallchildorders": lambda ex, p: ex.cancel_all_child_orders(**p),
+}
+
+
+class StandInServer:
+
+    def __init__(self,
+                 exchange: Exchange = None,
+                 host: str = '127.0.0.1',
+                 port: int = 0,
+                 latency: float = 0.0,
+                 latency_jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 tick_sec: float = None,
+                 seed: int = None):
+        """
+
+        :param exchange: `Exchange` to serve (new one if None)
+        :param port: port to listen (0 to pick a free one)
+        :param latency: seconds to wait before each response
+        :param latency_jitter: uniform random seconds added to latency
+        :param error_rate: probability to answer with an injected error (HTTP 500, status -500)
+        :param tick_sec: if given, market moves by random walk every `tick_sec` seconds of wall clock
+        """
+        self.exchange = Exchange(seed=seed) if exchange is None else exchange
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.tick_sec = tick_sec
+        self.request_count = 0
+        self.__random = random.Random(seed)
+        self.__last_tick = time.time()
+        self.__lock = threading.Lock()
+        self.__httpd = ThreadingHTTPServer((host, port), self.__handler())
+        self.__httpd.daemon_threads = True
+        self.__thread = None
+
+    @property
+    def url(self):
+        host, port = self.__httpd.server_address[:2]
+        return 'http://%s:%i' % (host, port)
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__httpd.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__httpd.shutdown()
+        self.__httpd.server_close()
+
+    def __advance_market(self):
+        if self.tick_sec is None:
+            return
+        with self.__lock:
+            n = int((time.time() - self.__last_tick) / self.tick_sec)
+            self.__last_tick += n * self.tick_sec
+        for _ in range(n):
+            self.exchange.step()
+
+    def respond(self, method, path, params):
+        """ (status code, body) for the request """
+        with self.__lock:
+            self.request_count += 1
+            delay = self.latency + self.__random.uniform(0, self.latency_jitter)
+            error = self.__random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if error:
+            return 500, dict(status=-500, error_message='Injected error by stand-in server')
+        self.__advance_market()
+
+        routes = PRIVATE_POST if method == 'POST' else dict(PUBLIC_GET, **PRIVATE_GET)
+        if path not in routes:
+            return 404, dict(status=-1, error_message='Unknown endpoint: %s' % path)
+        try:
+            return 200, routes[path](self.exchange, params)
+        except Exception as err:
+            return 400, dict(status=-1, error_message='%s: %s' % (type(err).__name__, str(err)))
+
+    def __handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def __reply(self, status, body):
+                body = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                self.__reply(*server.respond('GET', url.path, dict(parse_qsl(url.query))))
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length).decode('utf-8') if length > 0 else ''
+                params = json.loads(body) if body not in ['', 'null'] else dict()
+                self.__reply(*server.respond('POST', urlsplit(self.path).path, params))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,261 @@
+""" Parallel parameter sweep and walk-forward optimization of `Backtest`
+
+Candle arrays are put in one shared memory block, and every worker of the process pool maps it instead of receiving
+a copy. Each finished run is appended to a checkpoint file (JSON lines) right away, so an interrupted sweep resumes
+from where it stopped, and the ranked table is logged as runs finish, eg)
+
+    sweep = Sweep(load_candles(ConnectPSQL(db_info)), checkpoint='./sweep.jsonl', spread=100)
+    table = sweep.run(grid(dict(step_size=[5, 10, 20], trend_trigger_value=[-5, 0], loss_cut_margin=[30, 50])))
+    windows = sweep.walk_forward(random_search(space, 200), train_sec=30 * 86400, test_sec=7 * 86400)
+
+A parameter set is a flat dict. Keys of `MovingAverage` go to the model and the others to `Backtest`.
+"""
+
+import os
+import json
+import inspect
+import random
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from .backtest import Backtest, COLUMNS
+from ..order.model import MovingAverage
+from ..util import get_logger
+
+__all__ = (
+    "Sweep",
+    "grid",
+    "random_search"
+)
+
+MODEL_PARAMETER = [k for k in inspect.signature(MovingAverage.__init__).parameters.keys() if k != 'self']
+DTYPES = dict(close_unix_time=np.int64, open_price=np.float64, high_price=np.float64, low_price=np.float64,
+              close_price=np.int64)
+
+# candle arrays of a worker process, mapped from shared memory by `_init_worker`
+_worker_candles = dict()
+_worker_shm = []
+
+
+def grid(space: dict):
+    """ every combination of `space` (dict of parameter name -> list of values) """
+    keys = sorted(space.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*[space[k] for k in keys])]
+
+
+def random_search(space: dict, n: int, seed: int = None):
+    """ `n` random parameter sets from `space`. Value of `space` is a list to choose from, or (low, high) tuple to
+    draw uniformly (int if both are int) """
+    rng = random.Random(seed)
+    keys = sorted(space.keys())
+    parameters = []
+    for _ in range(n):
+        parameter = dict()
+        for k in keys:
+            value = space[k]
+            if type(value) is tuple:
+                low, high = value
+                parameter[k] = rng.randint(low, high) if type(low) is int and type(high) is int \
+                    else rng.uniform(low, high)
+            else:
+                parameter[k] = rng.choice(value)
+        parameters.append(parameter)
+    return parameters
+
+
+def _init_worker(name, size):
+    shm = shared_memory.SharedMemory(name=name)
+    _worker_shm.append(shm)  # keep mapping alive while the worker lives
+    offset = 0
+    for k in COLUMNS:
+        _worker_candles[k] = np.ndarray((size,), dtype=DTYPES[k], buffer=shm.buf, offset=offset)
+        offset += size * 8
+
+
+def _run_backtest(parameter, begin, end, backtest_parameter):
+    """ backtest over candles[begin:end] in a worker """
+    candles = {k: v[begin:end] for k, v in _worker_candles.items()}
+    model_parameter = {k: v for k, v in parameter.items() if k in MODEL_PARAMETER}
+    executor_parameter = {k: v for k, v in parameter.items() if k not in MODEL_PARAMETER}
+    backtest = Backtest(candles, **dict(backtest_parameter, **executor_parameter))
+    _, summary = backtest.run(MovingAverage(**model_parameter))
+    return summary
+
+
+class Sweep:
+
+    def __init__(self,
+                 candles: pd.DataFrame,
+                 checkpoint: str = None,
+                 metric: str = 'pl_total',
+                 max_workers: int = None,
+                 report_every: int = 10,
+                 top: int = 10,
+                 logger_output: str = None,
+                 **backtest_parameter):
+        """
+
+        :param candles: data frame from `load_candles`
+        :param checkpoint: path of JSON lines file to save results to and resume from
+        :param metric: key of `Backtest.summary` to rank by (larger is better)
+        :param report_every: log ranked table every this number of finished runs
+        :param top: number of rows of the logged table
+        :param backtest_parameter: parameters of `Backtest` shared by all runs (eg, spread), overridden by the
+                                   parameter set
+        """
+        self.checkpoint = checkpoint
+        self.metric = metric
+        self.max_workers = max_workers
+        self.report_every = report_every
+        self.top = top
+        self.backtest_parameter = backtest_parameter
+        self.__log = get_logger(logger_output)
+        self.__time = candles['close_unix_time'].values.astype(np.int64)
+        self.__candles = candles
+        self.__results = self.__load_checkpoint()
+
+    ##############
+    # Checkpoint #
+    ##############
+
+    def __bounds(self, begin, end):
+        """ close time of the first and the last candle of candles[begin:end] (None if empty) """
+        time = self.__time[begin:end]
+        if len(time) == 0:
+            return None, None
+        return int(time[0]), int(time[-1])
+
+    def __key(self, parameter, begin, end):
+        return self.__result_key(parameter, self.backtest_parameter, *self.__bounds(begin, end))
+
+    @staticmethod
+    def __result_key(parameter, backtest_parameter, begin_unix_time, end_unix_time):
+        # time bounds rather than row index, so the checkpoint is reused only on the same candles
+        return json.dumps([parameter, backtest_parameter, begin_unix_time, end_unix_time], sort_keys=True,
+                          default=str)
+
+    def __load_checkpoint(self):
+        results = dict()
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return results
+        with open(self.checkpoint) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue  # line cut by interruption
+                if 'backtest_parameter' not in result:
+                    continue  # no time bounds to check the candles with
+                key = self.__result_key(result['parameter'], result['backtest_parameter'],
+                                        result['begin_unix_time'], result['end_unix_time'])
+                results[key] = result
+        return results
+
+    def __save(self, result):
+        self.__results[self.__key(result['parameter'], result['begin'], result['end'])] = result
+        if self.checkpoint is not None:
+            with open(self.checkpoint, 'a') as f:
+                f.write(json.dumps(result, default=str) + '\n')
+
+    ##########
+    # Runner #
+    ##########
+
+    def __share_candles(self):
+        size = len(self.__candles)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, size * 8 * len(COLUMNS)))
+        offset = 0
+        for k in COLUMNS:
+            array = np.ndarray((size,), dtype=DTYPES[k], buffer=shm.buf, offset=offset)
+            array[:] = self.__candles[k].values
+            offset += size * 8
+        return shm, size
+
+    def __execute(self, tasks):
+        """ run (parameter, begin, end) tasks not in checkpoint, and return results of all tasks """
+        results = [self.__results.get(self.__key(*task)) for task in tasks]
+        pending = [n for n, result in enumerate(results) if result is None]
+        self.__log('runs: %i (%i from checkpoint)' % (len(tasks), len(tasks) - len(pending)))
+        if len(pending) == 0:
+            return results
+
+        shm, size = self.__share_candles()
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                     initargs=(shm.name, size)) as executor:
+                futures = {executor.submit(_run_backtest, *tasks[n], self.backtest_parameter): n for n in pending}
+                for finished, future in enumerate(as_completed(futures), 1):
+                    n = futures[future]
+                    parameter, begin, end = tasks[n]
+                    begin_unix_time, end_unix_time = self.__bounds(begin, end)
+                    result = dict(parameter=parameter, begin=begin, end=end, begin_unix_time=begin_unix_time,
+                                  end_unix_time=end_unix_time, backtest_parameter=self.backtest_parameter,
+                                  summary=future.result())
+                    self.__save(result)
+                    results[n] = result
+                    if finished % self.report_every == 0 or finished == len(pending):
+                        self.__log('finished %i/%i' % (finished, len(pending)))
+                        self.__log('\n' + self.ranking([r for r in results if r is not None]).head(self.top)
+                                   .to_string())
+        finally:
+            shm.close()
+            shm.unlink()
+        return results
+
+    def ranking(self, results: list = None):
+        """ data frame of parameters and summary sorted by `metric` """
+        results = list(self.__results.values()) if results is None else results
+        rows = [dict(r['parameter'], begin=r['begin'], end=r['end'],
+                     **{k: v for k, v in r['summary'].items() if k != 'status'}) for r in results]
+        if len(rows) == 0:
+            return pd.DataFrame()
+        return pd.DataFrame(rows).sort_values(by=self.metric, ascending=False).reset_index(drop=True)
+
+    def run(self, parameters: list, begin: int = 0, end: int = None):
+        """ Backtest every parameter set over candles[begin:end]
+
+        :param parameters: list of parameter set (eg, from `grid` or `random_search`)
+        :return: ranked data frame
+        """
+        end = len(self.__time) if end is None else end
+        results = self.__execute([(p, begin, end) for p in parameters])
+        return self.ranking(results)
+
+    def walk_forward(self, parameters: list, train_sec: int, test_sec: int, step_sec: int = None):
+        """ Walk-forward optimization: pick the best parameter set on each train window and backtest it on the test
+        window right after. Windows move by `step_sec` (`test_sec` if None). Every train window runs at once.
+
+        :return: data frame of the windows with the chosen parameter set and its train/test summary
+        """
+        if len(self.__time) == 0:
+            self.__log('walk-forward windows: 0 (no candles)')
+            return pd.DataFrame()
+        step_sec = test_sec if step_sec is None else step_sec
+        windows = []
+        start = self.__time[0]
+        while start + train_sec + test_sec <= self.__time[-1] + 1:
+            index = np.searchsorted(self.__time, [start, start + train_sec, start + train_sec + test_sec])
+            windows.append([int(i) for i in index])
+            start += step_sec
+        self.__log('walk-forward windows: %i' % len(windows))
+
+        train = self.__execute([(p, b, m) for b, m, _ in windows for p in parameters])
+        best = []
+        for n, (b, m, e) in enumerate(windows):
+            results = train[n * len(parameters):(n + 1) * len(parameters)]
+            best.append(max(results, key=lambda r: r['summary'][self.metric]))
+        test = self.__execute([(r['parameter'], m, e) for r, (b, m, e) in zip(best, windows)])
+
+        rows = []
+        for (b, m, e), r_train, r_test in zip(windows, best, test):
+            rows.append(dict(r_train['parameter'],
+                             train_begin=int(self.__time[b]), test_begin=int(self.__time[m]),
+                             test_end=int(self.__time[e - 1]),
+                             train_metric=r_train['summary'][self.metric], test_metric=r_test['summary'][self.metric],
+                             test_orders=r_test['summary']['orders']))
+        table = pd.DataFrame(rows)
+        if len(table) > 0:
+            self.__log('walk-forward test %s: %0.3f' % (self.metric, table['test_metric'].sum()))
+        return table
@@ -0,0 +1,15 @@
+from .book import OrderBook
+from .latest import LatestValue
+from .realtime import RealtimeClient, Event, REALTIME_URL
+from .standin import StandInFeed
+from .shared import SharedFeed
+
+__all__ = (
+    "OrderBook",
+    "LatestValue",
+    "RealtimeClient",
+    "Event",
+    "REALTIME_URL",
+    "StandInFeed",
+    "SharedFeed"
+)
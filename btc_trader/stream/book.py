@@ -0,0 +1,77 @@
+__all__ = (
+    "OrderBook"
+)
+
+
+class OrderBook:
+    """ Order book kept from `lightning_board_snapshot` and `lightning_board` (diff) messages
+
+    Diffs received before the first snapshot are ignored, and a crossed book (best bid >= best ask) means a diff has
+    been missed, so the book is flagged to be re-synchronized by the next snapshot.
+    """
+
+    def __init__(self):
+        self.bids = dict()  # price -> size
+        self.asks = dict()
+        self.mid_price = None
+        self.synced = False
+        self.__best_bid = None
+        self.__best_ask = None
+
+    def reset(self):
+        self.bids.clear()
+        self.asks.clear()
+        self.mid_price = None
+        self.synced = False
+        self.__best_bid = None
+        self.__best_ask = None
+
+    def apply_snapshot(self, message: dict):
+        self.reset()
+        self.__apply(message)
+        self.synced = True
+
+    def apply_diff(self, message: dict):
+        """ return False if the book turns out to be out of sync """
+        if not self.synced:
+            return False
+        self.__apply(message)
+        best_bid, best_ask = self.best_bid, self.best_ask
+        if best_bid is not None and best_ask is not None and best_bid >= best_ask:
+            self.synced = False
+        return self.synced
+
+    def __apply(self, message: dict):
+        if 'mid_price' in message.keys():
+            self.mid_price = message['mid_price']
+        for side, levels in [('bids', self.bids), ('asks', self.asks)]:
+            for level in message.get(side, []):
+                price, size = level['price'], level['size']
+                if size == 0:
+                    levels.pop(price, None)
+                    if price in [self.__best_bid, self.__best_ask]:
+                        self.__best_bid, self.__best_ask = None, None
+                else:
+                    levels[price] = size
+                    if side == 'bids' and self.__best_bid is not None and price > self.__best_bid:
+                        self.__best_bid = price
+                    elif side == 'asks' and self.__best_ask is not None and price < self.__best_ask:
+                        self.__best_ask = price
+
+    @property
+    def best_bid(self):
+        if self.__best_bid is None and len(self.bids) > 0:
+            self.__best_bid = max(self.bids.keys())
+        return self.__best_bid
+
+    @property
+    def best_ask(self):
+        if self.__best_ask is None and len(self.asks) > 0:
+            self.__best_ask = min(self.asks.keys())
+        return self.__best_ask
+
+    def top(self, depth: int = 5):
+        """ top `depth` levels as ([(price, size)] of bids in descending order, same for asks in ascending order) """
+        bids = sorted(self.bids.items(), reverse=True)[:depth]
+        asks = sorted(self.asks.items())[:depth]
+        return bids, asks
@@ -0,0 +1,57 @@
+""" Latest value of a stream sampled by many consumers
+
+`LatestValue` holds the latest update (eg, ticker) of a feed, and each consumer samples it on its own schedule by
+`sample`. A consumer waiting for an update sleeps on an event set by the update instead of polling, so dozens of
+strategies on one feed cost nothing while the market is quiet, eg)
+
+    latest = LatestValue()
+    latest.set(ticker)  # from the message handler (not a coroutine)
+    async for ticker in latest.sample(interval=5.0):
+        pred, trend = model.predict(ticker['best_ask'])
+"""
+
+import time
+import asyncio
+
+__all__ = (
+    "LatestValue"
+)
+
+
+class LatestValue:
+
+    def __init__(self):
+        self.value = None
+        self.closed = False
+        self.__version = 0
+        # set and replaced by every update, so all the consumers waiting on it wake up at once
+        self.__updated = asyncio.Event()
+
+    def set(self, value):
+        self.value = value
+        self.__version += 1
+        updated, self.__updated = self.__updated, asyncio.Event()
+        updated.set()
+
+    def close(self):
+        """ end every `sample` iterator """
+        self.closed = True
+        self.__updated.set()
+
+    async def sample(self, interval: float):
+        """ async iterator yielding the latest value at most once every `interval` sec. A value already yielded is
+        not yielded again: after `interval` it waits for the next update.
+
+        The schedule is anchored at the first value, and re-anchored to now after falling behind (eg, slow consumer)
+        rather than catching up with a burst of stale values.
+        """
+        last, next_time = 0, None
+        while not self.closed:
+            if self.__version == last:
+                await self.__updated.wait()
+                continue
+            last = self.__version
+            yield self.value
+            now = time.time()
+            next_time = now + interval if next_time is None else max(next_time + interval, now)
+            await asyncio.sleep(next_time - now)
@@ -0,0 +1,294 @@
+""" Streaming market data from bitFlyer Realtime API (JSON-RPC 2.0 over WebSocket)
+
+`RealtimeClient` keeps the latest ticker, a bounded executions tape and the order book of one product up to date,
+and fans every update out to subscribers as `Event`, eg)
+
+    client = RealtimeClient('FX_BTC_JPY')
+    asyncio.ensure_future(client.run())
+    async for ticker in client.tickers(interval=5.0):
+        pred, trend = model.predict(ticker['best_ask'])
+
+Gaps
+    - the connection is re-opened with exponential backoff when it's closed or nothing arrives for `heartbeat_sec`
+    - executions missed while disconnected are fetched with `Public.executions(after=last id)` paged backward with
+      `before` if `public` is given. A gap longer than `max_backfill_pages` pages is reported (status event with
+      `gap`) and left open.
+    - executions with an id not larger than the last one (duplicated/out-of-order) are dropped
+    - the order book is re-synchronized from the next snapshot when it gets crossed or after reconnection
+    - a message failing to decode or with unexpected shape is counted and logged, and the feed keeps running
+"""
+
+import time
+import asyncio
+import json
+import inspect
+from collections import deque, namedtuple
+import aiohttp
+from .book import OrderBook
+from .latest import LatestValue
+
+__all__ = (
+    "RealtimeClient",
+    "Event",
+    "REALTIME_URL"
+)
+
+REALTIME_URL = 'wss://ws.lightstream.bitflyer.com/json-rpc'
+BACKFILL_COUNT = 500  # max count of `Public.executions`
+CHANNELS = {
+    'ticker': 'lightning_ticker_%s',
+    'executions': 'lightning_executions_%s',
+    'board_snapshot': 'lightning_board_snapshot_%s',
+    'board': 'lightning_board_%s'
+}
+
+# kind: 'ticker', 'executions', 'board' or 'status', data: message, received: unix time of receipt
+Event = namedtuple('Event', ['kind', 'data', 'received'])
+
+
+class RealtimeClient:
+
+    def __init__(self,
+                 product_code: str = 'FX_BTC_JPY',
+                 channels: tuple = ('ticker', 'executions', 'board'),
+                 url: str = REALTIME_URL,
+                 public=None,
+                 max_executions: int = 10000,
+                 heartbeat_sec: float = 30.0,
+                 backoff_sec: float = 1.0,
+                 max_backoff_sec: float = 60.0,
+                 max_backfill_pages: int = 20,
+                 log=None):
+        """
+
+        :param channels: any of 'ticker', 'executions' and 'board'
+        :param url: url of realtime API (or local stand-in feed)
+        :param public: `Public` or `AsyncPublic` to backfill executions missed during reconnection (optional)
+        :param max_executions: max length of executions tape
+        :param heartbeat_sec: reconnect if no message arrives for this seconds
+        :param backoff_sec: first wait before reconnection, doubled up to `max_backoff_sec` while failing
+        :param max_backfill_pages: max number of `Public.executions` requests to backfill one disconnection
+        :param log: function to log message (no log if None)
+        """
+        self.product_code = product_code
+        self.channels = channels
+        self.url = url
+        self.public = public
+        self.heartbeat_sec = heartbeat_sec
+        self.backoff_sec = backoff_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.max_backfill_pages = max_backfill_pages
+        self.__log = (lambda *args, **kwargs: None) if log is None else log
+        self.__ticker = LatestValue()
+        self.executions = deque(maxlen=max_executions)
+        self.book = OrderBook()
+        self.connected = asyncio.Event()
+        self.stats = dict(messages=0, reconnects=0, dropped_executions=0, backfilled_executions=0, book_resyncs=0,
+                          slow_subscriber_drops=0, bad_messages=0, unfilled_gaps=0)
+        self.__last_execution_id = None
+        self.__last_tick_id = None
+        self.__subscribers = []
+        self.__closed = False
+        self.__ws = None
+
+    ###############
+    # Subscribers #
+    ###############
+
+    def subscribe(self, kinds: tuple = ('ticker', 'executions', 'board', 'status'), maxsize: int = 1000):
+        """ queue receiving `Event` of `kinds`. When the queue is full, the oldest event is dropped. """
+        queue = asyncio.Queue(maxsize=maxsize)
+        self.__subscribers.append((set(kinds), queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        self.__subscribers = [(k, q) for k, q in self.__subscribers if q is not queue]
+
+    def __publish(self, kind, data):
+        event = Event(kind, data, time.time())
+        for kinds, queue in self.__subscribers:
+            if kind not in kinds:
+                continue
+            if queue.full():
+                queue.get_nowait()
+                self.stats['slow_subscriber_drops'] += 1
+            queue.put_nowait(event)
+
+    async def events(self, kinds: tuple = ('ticker', 'executions', 'board', 'status')):
+        """ async iterator of `Event` """
+        queue = self.subscribe(kinds)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.unsubscribe(queue)
+
+    async def tickers(self, interval: float = None):
+        """ async iterator of ticker. If `interval` is given, the latest one is yielded once every `interval` sec
+        (updates in between are conflated), which is the sampling a `MovingAverage` with fixed step expects. """
+        if interval is None:
+            async for event in self.events(('ticker', )):
+                yield event.data
+            return
+        async for ticker in self.__ticker.sample(interval):
+            yield ticker
+
+    @property
+    def ticker(self):
+        """ the latest ticker (None until the first one arrives) """
+        return self.__ticker.value
+
+    @property
+    def latest_ticker(self):
+        """ `LatestValue` of ticker, to sample without polling """
+        return self.__ticker
+
+    ##############
+    # Connection #
+    ##############
+
+    async def run(self):
+        """ keep connection (and reconnect) until `close` is called """
+        backoff = self.backoff_sec
+        async with aiohttp.ClientSession() as session:
+            while not self.__closed:
+                error = None
+                try:
+                    async with session.ws_connect(self.url, heartbeat=self.heartbeat_sec / 2) as ws:
+                        self.__ws = ws
+                        await self.__subscribe(ws)
+                        self.connected.set()
+                        self.__publish('status', dict(connected=True))
+                        await self.__backfill()
+                        backoff = self.backoff_sec
+                        await self.__receive(ws)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as err:
+                    error = str(err)
+                except Exception as err:
+                    # eg, error of backfill request: reconnect rather than ending the feed
+                    error = '%s: %s' % (type(err).__name__, str(err))
+                    self.__log('realtime feed error: %s' % error)
+                finally:
+                    self.__ws = None
+                    self.connected.clear()
+                    self.book.reset()
+                self.__publish('status', dict(connected=False, error=error))
+                if self.__closed:
+                    break
+                self.stats['reconnects'] += 1
+                await asyncio.sleep(backoff)
+                backoff = min(self.max_backoff_sec, backoff * 2)
+
+    async def close(self):
+        self.__closed = True
+        self.__ticker.close()
+        if self.__ws is not None:
+            await self.__ws.close()
+
+    async def __subscribe(self, ws):
+        names = []
+        for channel in self.channels:
+            if channel == 'board':
+                names += [CHANNELS['board_snapshot'], CHANNELS['board']]
+            else:
+                names.append(CHANNELS[channel])
+        for n, name in enumerate(names):
+            await ws.send_str(json.dumps(dict(jsonrpc='2.0', method='subscribe', id=n,
+                                              params=dict(channel=name % self.product_code))))
+
+    async def __receive(self, ws):
+        while True:
+            message = await ws.receive(timeout=self.heartbeat_sec)
+            if message.type == aiohttp.WSMsgType.TEXT:
+                self.handle(message.data)
+            elif message.type in [aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.CLOSING,
+                                  aiohttp.WSMsgType.ERROR]:
+                return
+
+    async def __executions(self, **params):
+        """ `Public.executions` without blocking the event loop (in a worker thread unless `public` is async) """
+        api = getattr(self.public, 'api', None)
+        if inspect.iscoroutinefunction(self.public.executions) or \
+                inspect.iscoroutinefunction(getattr(api, 'request', None)):
+            return await self.public.executions(**params)
+        return await asyncio.to_thread(self.public.executions, **params)
+
+    async def __backfill(self):
+        """ fetch executions missed while disconnected, paged backward with `before` down to the last id seen """
+        if self.public is None or self.__last_execution_id is None or 'executions' not in self.channels:
+            return
+        after = self.__last_execution_id
+        missed, cursor, filled = [], None, False
+        for _ in range(self.max_backfill_pages):
+            params = dict(product_code=self.product_code, after=after, count=BACKFILL_COUNT)
+            if cursor is not None:
+                params['before'] = cursor
+            page = await self.__executions(**params)
+            if type(page) is not list:
+                self.__log('backfill of executions failed: %s' % str(page))
+                break
+            page = [e for e in page if e['id'] > after]
+            missed += page
+            if len(page) < BACKFILL_COUNT:
+                filled = True
+                break
+            cursor = min(e['id'] for e in page)
+        if not filled:
+            # executions between `after` and the oldest one fetched are left missing
+            gap = (after, cursor if len(missed) == 0 else min(e['id'] for e in missed))
+            self.stats['unfilled_gaps'] += 1
+            self.__log('executions between id %i and %s are not backfilled' % (after, str(gap[1])))
+            self.__publish('status', dict(connected=True, gap=gap))
+        missed = sorted(missed, key=lambda e: e['id'])
+        self.stats['backfilled_executions'] += len(missed)
+        self.__on_executions(missed)
+
+    ############
+    # Messages #
+    ############
+
+    def handle(self, message):
+        """ apply one JSON-RPC message (dict or JSON text). A broken message is counted and logged, not raised. """
+        try:
+            if isinstance(message, (str, bytes)):
+                message = json.loads(message)
+            self.__handle(message)
+        except (ValueError, KeyError, TypeError, AttributeError, IndexError) as err:
+            self.stats['bad_messages'] += 1
+            self.__log('bad realtime message (%s: %s): %s' % (type(err).__name__, str(err), str(message)[:200]))
+
+    def __handle(self, message: dict):
+        if message.get('method') != 'channelMessage':
+            return
+        self.stats['messages'] += 1
+        channel = message['params']['channel']
+        data = message['params']['message']
+        if channel == CHANNELS['ticker'] % self.product_code:
+            if self.__last_tick_id is not None and data.get('tick_id', 0) <= self.__last_tick_id:
+                return
+            self.__last_tick_id = data.get('tick_id')
+            self.__ticker.set(data)
+            self.__publish('ticker', data)
+        elif channel == CHANNELS['executions'] % self.product_code:
+            self.__on_executions(data)
+        elif channel == CHANNELS['board_snapshot'] % self.product_code:
+            if not self.book.synced:
+                if self.book.mid_price is not None:
+                    self.stats['book_resyncs'] += 1
+                self.book.apply_snapshot(data)
+                self.__publish('board', self.book)
+        elif channel == CHANNELS['board'] % self.product_code:
+            if self.book.apply_diff(data):
+                self.__publish('board', self.book)
+
+    def __on_executions(self, executions: list):
+        new = []
+        for execution in executions:
+            if self.__last_execution_id is not None and execution['id'] <= self.__last_execution_id:
+                self.stats['dropped_executions'] += 1
+                continue
+            self.__last_execution_id = execution['id']
+            new.append(execution)
+        if len(new) > 0:
+            self.executions.extend(new)
+            self.__publish('executions', new)
@@ -0,0 +1,97 @@
+""" One market data source per product shared by many strategies
+
+`SharedFeed` keeps the latest ticker (from `RealtimeClient` if given, else by polling ticker API) and board state of
+one product, and every strategy samples it on its own schedule, so the number of API calls does not grow with the
+number of strategies, eg)
+
+    feed = SharedFeed(AsyncPublic(api=api_client), 'FX_BTC_JPY', interval=1.0)
+    asyncio.ensure_future(feed.run())
+    async for ticker in feed.tickers(interval=5.0):
+        state = feed.board_state
+"""
+
+import time
+import asyncio
+from .latest import LatestValue
+
+__all__ = (
+    "SharedFeed"
+)
+
+
+class SharedFeed:
+
+    def __init__(self,
+                 public,
+                 product_code: str = 'FX_BTC_JPY',
+                 interval: float = 1.0,
+                 health_sec: float = 60.0,
+                 realtime=None):
+        """
+
+        :param public: `AsyncPublic` to poll ticker and board state
+        :param interval: polling interval of ticker API (not used with `realtime`)
+        :param health_sec: polling interval of board state API
+        :param realtime: `RealtimeClient` of the product to take ticker from instead of polling
+        """
+        self.public = public
+        self.product_code = product_code
+        self.interval = interval
+        self.health_sec = health_sec
+        self.realtime = realtime
+        self.board_state = None
+        self.connected = asyncio.Event() if realtime is None else realtime.connected
+        self.stats = dict(ticker_requests=0, board_state_requests=0, errors=0, samples=0)
+        self.__ticker = LatestValue() if realtime is None else realtime.latest_ticker
+        self.__closed = False
+
+    @property
+    def ticker(self):
+        return self.__ticker.value
+
+    async def tickers(self, interval: float = None):
+        """ async iterator yielding the latest ticker once every `interval` sec (every polling if None) """
+        interval = self.interval if interval is None else interval
+        async for ticker in self.__ticker.sample(interval):
+            self.stats['samples'] += 1
+            yield ticker
+
+    async def run(self):
+        """ keep ticker and board state up to date until `close` is called """
+        tasks = [self.__poll_board_state()]
+        if self.realtime is not None:
+            tasks.append(self.realtime.run())
+        else:
+            tasks.append(self.__poll_ticker())
+        await asyncio.gather(*tasks)
+
+    async def close(self):
+        self.__closed = True
+        if self.realtime is not None:
+            await self.realtime.close()
+        else:
+            self.__ticker.close()
+
+    async def __poll_ticker(self):
+        start = time.time()
+        n = 0
+        while not self.__closed:
+            value = await self.public.ticker(product_code=self.product_code)
+            self.stats['ticker_requests'] += 1
+            if type(value) is dict and 'best_ask' in value.keys():
+                self.__ticker.set(value)
+                self.connected.set()
+            else:
+                self.stats['errors'] += 1
+            n += 1
+            await asyncio.sleep(max(0.0, start + n * self.interval - time.time()))
+
+    async def __poll_board_state(self):
+        while not self.__closed:
+            value = await self.public.get_board_state(product_code=self.product_code)
+            self.stats['board_state_requests'] += 1
+            if type(value) is dict and 'health' in value.keys():
+                self.board_state = value
+            else:
+                self.stats['errors'] += 1
+            await asyncio.sleep(self.health_sec)
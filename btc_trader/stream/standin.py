@@ -0,0 +1,86 @@
+""" Local stand-in of bitFlyer Realtime API for offline tests
+
+    feed = StandInFeed()
+    await feed.start()
+    client = RealtimeClient('FX_BTC_JPY', url=feed.url)
+    await feed.publish_exchange(exchange)  # ticker/board of `simulator.Exchange`
+    await feed.disconnect_all()  # force reconnection
+"""
+
+import json
+from aiohttp import web, WSMsgType
+
+__all__ = (
+    "StandInFeed"
+)
+
+
+class StandInFeed:
+
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 port: int = 0):
+        self.host = host
+        self.port = port
+        self.__subscriptions = dict()  # websocket -> set of channel
+        self.__runner = None
+        self.__site = None
+
+    @property
+    def url(self):
+        return 'ws://%s:%i/json-rpc' % (self.host, self.port)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/json-rpc', self.__handle)
+        self.__runner = web.AppRunner(app)
+        await self.__runner.setup()
+        self.__site = web.TCPSite(self.__runner, self.host, self.port)
+        await self.__site.start()
+        if self.port == 0:
+            self.port = self.__site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        await self.disconnect_all()
+        await self.__runner.cleanup()
+
+    async def __handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.__subscriptions[ws] = set()
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                rpc = json.loads(message.data)
+                if rpc.get('method') == 'subscribe':
+                    self.__subscriptions[ws].add(rpc['params']['channel'])
+                    await ws.send_str(json.dumps(dict(jsonrpc='2.0', id=rpc.get('id'), result=True)))
+        finally:
+            self.__subscriptions.pop(ws, None)
+        return ws
+
+    @property
+    def subscribers(self):
+        return sum(len(c) > 0 for c in self.__subscriptions.values())
+
+    async def publish(self, channel: str, message):
+        """ send `message` to every connection subscribing `channel` """
+        payload = json.dumps(dict(jsonrpc='2.0', method='channelMessage',
+                                  params=dict(channel=channel, message=message)))
+        for ws, channels in list(self.__subscriptions.items()):
+            if channel in channels and not ws.closed:
+                await ws.send_str(payload)
+
+    async def publish_exchange(self, exchange):
+        """ publish ticker, board snapshot and executions of `simulator.Exchange` """
+        product_code = exchange.product_code
+        await self.publish('lightning_ticker_%s' % product_code, exchange.ticker())
+        await self.publish('lightning_board_snapshot_%s' % product_code, exchange.board())
+        if len(exchange.executions) > 0:
+            await self.publish('lightning_executions_%s' % product_code, exchange.executions[-10:])
+
+    async def disconnect_all(self):
+        for ws in list(self.__subscriptions.keys()):
+            await ws.close()
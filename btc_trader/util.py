@@ -1,7 +1,11 @@
 import logging
 import os
+import queue
+import atexit
+import threading
 from datetime import datetime, date, timedelta
-from time import time
+from time import time, sleep
+from urllib.error import HTTPError
 import pytz
 import slackweb
 import traceback
@@ -11,58 +15,184 @@ import traceback
 # slack notification #
 ######################
 
+MAX_SLACK_CHARS = 3500  # per post, to keep a batch in one readable message
+
+
 class SlackAlert:
 
     def __init__(self,
                  log: str,
                  profit_loss: str,
-                 post_interval_sec: float=30.0
+                 post_interval_sec: float=30.0,
+                 max_queue: int=1000,
+                 max_backoff_sec: float=300.0,
+                 error=None
                  ):
         """ Slack message post instance
         To avoid error by too frequent request, buffering message for
         `post_interval_sec` seconds and send batch.
 
+        Messages are only put in a bounded queue by the caller, and a background thread posts them, so a slow webhook
+        never stalls trading:
+            - messages of `post_interval_sec` are posted as one message (split by `MAX_SLACK_CHARS`), and a message
+              repeated in a row is coalesced into one line with the count
+            - on HTTP 429 the worker waits for `Retry-After` (or exponential backoff on other errors) and keeps the batch
+            - once `max_queue` messages are waiting, new messages are dropped and the number of them is posted with the
+              next batch
+
         :param log: slack webhook url for log channel
         :param profit_loss: slack webhook url for pl channel
+        :param max_queue: max number of messages waiting to be posted (per channel for the batch)
+        :param max_backoff_sec: max wait after failed post
+        :param error: function to report an error of the worker (eg, logger)
         """
 
         self.__post_interval_sec = post_interval_sec
-        self.__slack_log = slackweb.Slack(url=log)
-        self.__slack_pl = slackweb.Slack(url=profit_loss)
-        self.__check_log = 0.0
-        self.__check_pl = 0.0
-        self.__msg_log = []
-        self.__msg_pl = []
+        self.__max_backoff_sec = max_backoff_sec
+        self.__max_queue = max_queue
+        self.__error = (lambda msg: None) if error is None else error
+        self.__slack = dict(log=slackweb.Slack(url=log), pl=slackweb.Slack(url=profit_loss))
+        self.__check = dict(log=0.0, pl=0.0)
+        self.__msg = dict(log=[], pl=[])  # list of [message, count]
+        self.__dropped = dict(log=0, pl=0)
+        self.__push = dict(log=False, pl=False)  # post regardless of the interval (`push_all`)
+        self.__deadline = None  # give up posting after this time on close
+        self.__retry_at = 0.0
+        self.__backoff_sec = 1.0
+        self.__lock = threading.Lock()
+        self.stats = dict(posted=0, dropped=0, rate_limited=0, failed=0)
+        self.__queue = queue.Queue(maxsize=max_queue)
+        self.__closed = threading.Event()
+        self.__thread = threading.Thread(target=self.__worker, name='slack-alert', daemon=True)
+        self.__thread.start()
+        # deliver the last messages (eg, 'Exit' with `push_all`) at interpreter exit
+        atexit.register(self.close)
 
     def __call__(self,
                  msg: str,
                  is_pl: bool = False,
                  push_all: bool = False):
-        if is_pl or push_all:
-            if len(msg) > 0:
-                self.__msg_pl.append(msg)
-            if push_all:
-                if len(self.__msg_pl) > 0 :
-                    self.__slack_pl.notify(text='\n'.join(self.__msg_pl))
-                    self.__check_pl = time()
-                    self.__msg_pl = []
-            elif self.__post_interval_sec < time() - self.__check_pl:
-                if len(self.__msg_pl) > 0:
-                    self.__slack_pl.notify(text='\n'.join(self.__msg_pl))
-                    self.__check_pl = time()
-                    self.__msg_pl = []
-        if not is_pl or push_all:
-            self.__msg_log.append(msg)
-            if push_all:
-                if len(self.__msg_log) > 0:
-                    self.__slack_log.notify(text='\n'.join(self.__msg_log))
-                    self.__check_log = time()
-                    self.__msg_log = []
-            elif self.__post_interval_sec < time() - self.__check_log:
-                if len(self.__msg_log) > 0:
-                    self.__slack_log.notify(text='\n'.join(self.__msg_log))
-                    self.__check_log = time()
-                    self.__msg_log = []
+        """ enqueue message without blocking (dropped if the queue is full) """
+        try:
+            self.__queue.put_nowait((msg, is_pl, push_all))
+        except queue.Full:
+            with self.__lock:
+                for channel in self.__channels(is_pl, push_all):
+                    self.__dropped[channel] += 1
+                self.stats['dropped'] += 1
+
+    @staticmethod
+    def __channels(is_pl, push_all):
+        return (['pl'] if is_pl or push_all else []) + (['log'] if not is_pl or push_all else [])
+
+    def close(self, timeout: float = 10.0):
+        """ post every message left (within `timeout` seconds) and stop the worker """
+        if self.__closed.is_set():
+            return
+        self.__deadline = time() + timeout
+        self.__closed.set()
+        try:
+            self.__queue.put_nowait(None)  # wake up the worker
+        except queue.Full:
+            pass
+        self.__thread.join(timeout)
+
+    def __worker(self):
+        while True:
+            try:
+                item = self.__queue.get(timeout=self.__wait_sec())
+            except queue.Empty:
+                item = None
+            # take every message waiting, so that a burst is posted as one batch
+            while item is not None or not self.__queue.empty():
+                if item is not None:
+                    self.__add(*item)
+                try:
+                    item = self.__queue.get_nowait()
+                except queue.Empty:
+                    break
+            closing = self.__closed.is_set()
+            for channel in ['pl', 'log']:
+                if self.__push[channel] or closing or self.__post_interval_sec < time() - self.__check[channel]:
+                    try:
+                        self.__post(channel)
+                    except Exception:
+                        self.__error(traceback.format_exc())
+            if closing:
+                return
+
+    def __wait_sec(self):
+        """ seconds until the next batch is due (None to wait for a message) """
+        if self.__closed.is_set():
+            return 0.0
+        due = [self.__check[c] + (0.0 if self.__push[c] else self.__post_interval_sec) for c in ['pl', 'log']
+               if len(self.__msg[c]) > 0 or self.__dropped[c] > 0]
+        if len(due) == 0:
+            return None
+        return max(max(min(due), self.__retry_at) - time() + 1e-3, 0.0)
+
+    def __add(self, msg, is_pl, push_all):
+        """ add message to the batch of the channel """
+        for channel in self.__channels(is_pl, push_all):
+            self.__push[channel] = self.__push[channel] or push_all
+            if len(msg) == 0 and channel == 'pl':
+                continue
+            batch = self.__msg[channel]
+            if len(batch) > 0 and batch[-1][0] == msg:
+                batch[-1][1] += 1
+            elif len(batch) < self.__max_queue:
+                batch.append([msg, 1])
+            else:
+                with self.__lock:
+                    self.__dropped[channel] += 1
+                    self.stats['dropped'] += 1
+
+    def __post(self, channel):
+        now = time()
+        if now < self.__retry_at:
+            # wait for rate limit only on close, and only until the deadline of `close`
+            if not self.__closed.is_set() or self.__retry_at > self.__deadline:
+                return
+            sleep(self.__retry_at - now)
+        with self.__lock:
+            dropped, self.__dropped[channel] = self.__dropped[channel], 0
+        lines = [msg if n == 1 else '%s (x%i)' % (msg, n) for msg, n in self.__msg[channel]]
+        if dropped > 0:
+            lines.append('... %i messages dropped (queue full)' % dropped)
+        if len(lines) == 0:
+            return
+        # split into posts of `MAX_SLACK_CHARS`, and keep what is not posted for the next try
+        posts, text = [], ''
+        for line in lines:
+            if len(text) > 0 and len(text) + len(line) + 1 > MAX_SLACK_CHARS:
+                posts.append(text)
+                text = ''
+            text = line if len(text) == 0 else text + '\n' + line
+        posts.append(text)
+        for i, text in enumerate(posts):
+            try:
+                self.__slack[channel].notify(text=text)
+            except Exception as err:
+                retry_after = None
+                if isinstance(err, HTTPError) and err.code == 429:
+                    self.stats['rate_limited'] += 1
+                    retry_after = err.headers.get('Retry-After') if err.headers is not None else None
+                else:
+                    self.stats['failed'] += 1
+                    self.__error('slack post failed: %s' % str(err))
+                try:
+                    wait = float(retry_after)
+                except (TypeError, ValueError):  # missing or HTTP date
+                    wait = self.__backoff_sec
+                self.__retry_at = time() + min(wait, self.__max_backoff_sec)
+                self.__backoff_sec = min(self.__backoff_sec * 2, self.__max_backoff_sec)
+                self.__msg[channel] = [[t, 1] for t in posts[i:]]
+                return
+            self.stats['posted'] += 1
+        self.__backoff_sec = 1.0
+        self.__check[channel] = time()
+        self.__msg[channel] = []
+        self.__push[channel] = False
 
 
 #######################
@@ -70,6 +200,13 @@ class SlackAlert:
 #######################
 
 
+def sec_to_swap_point():
+    """ Seconds from now to the next swap point calculation (00:00:00 JST) """
+    jst_datetime_now = datetime.now(pytz.timezone('Asia/Tokyo'))
+    jst_datetime_tomorrow = jst_datetime_now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return (jst_datetime_tomorrow - jst_datetime_now).total_seconds()
+
+
 def if_swap_point(minute_buffer: int):
     """ Calculate minutes from now to tomorrow in JST and return diff_min < minute_buffer
 
@@ -143,13 +280,19 @@ def __create_log(out_file_path=None,
     return logger
 
 
+def create_log(out_file_path=None,
+               set_jst: bool=True):
+    """ logger without slack notification (eg, for data collection) """
+    return __create_log(out_file_path, set_jst)
+
+
 def get_logger(out_file_path=None,
                set_jst: bool=True,
                slack_webhook_url: dict=None):
     """ return instance that is easy to get log with slack notification """
     logger = __create_log(out_file_path, set_jst)
     if slack_webhook_url is not None:
-        slack = SlackAlert(**slack_webhook_url)
+        slack = SlackAlert(error=logger.info, **slack_webhook_url)
     else:
         slack = None
 
@@ -169,6 +312,13 @@ def get_logger(out_file_path=None,
     return __log
 
 
+def unix_to_jst(unix_time):
+    """ UTC unix time -> JST Y-M-D (ignore float second point)
+    t = "2000-01-01T09:00:00" """
+    dt = datetime.fromtimestamp(int(unix_time), pytz.timezone('Asia/Tokyo'))
+    return dt.strftime('%Y-%m-%dT%H:%M:%S')
+
+
 def utc_to_unix(t):
     """ UTC Y-M-D -> UTC unix time (ignore float second point)
     t = "2000-01-01T00:00:00.111" """
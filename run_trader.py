@@ -1,4 +1,5 @@
 import btc_trader
+from btc_trader.stream import RealtimeClient
 import toml
 import os
 
@@ -11,11 +12,27 @@ if __name__ == '__main__':
         raise ValueError('`API_KEYS` or `CONFIG` is not provided.')
     id_api = toml.load(open(API_KEYS))
     config = toml.load(open(CONFIG))
-    executor = btc_trader.ExecutorFX(
-        id_api=id_api,
-        logger_output=LOG,
-        **config['executor_parameter']
-    )
-    executor.set_model(model_name=config['model_name'], model_parameter=config['model_parameter'])
-    executor.run()
+    if 'strategies' in config.keys():
+        # several strategies sharing market data and API client, eg) [[strategies]] tables of
+        # name, model_name, model_parameter and executor_parameter
+        runner = btc_trader.StrategyRunner(
+            id_api=id_api,
+            strategies=config['strategies'],
+            logger_output=LOG,
+            realtime=config.get('realtime', False)
+        )
+        runner.run()
+    else:
+        executor = btc_trader.ExecutorFX(
+            id_api=id_api,
+            logger_output=LOG,
+            **config['executor_parameter']
+        )
+        executor.set_model(model_name=config['model_name'], model_parameter=config['model_parameter'])
+        # optional: `event_driven = true` runs asyncio engine, and `realtime = true` samples market from realtime API
+        feed = None
+        if config.get('realtime', False):
+            feed = RealtimeClient(
+                product_code=config['executor_parameter'].get('asset_name', 'FX_BTC_JPY'), channels=('ticker', ))
+        executor.run(event_driven=config.get('event_driven', False) or feed is not None, feed=feed)
 
@@ -0,0 +1,59 @@
+import json
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from btc_trader.api import AsyncAPI, AsyncPublic
+from btc_trader.api.transport import HTTPTransport, RecordingTransport, ReplayTransport
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = json.dumps(dict(path=self.path)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:%i' % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def test_async_with(url):
+    async def main():
+        async with AsyncAPI(api_url=url, rate_limiter=False) as api:
+            public = AsyncPublic(api=api)
+            values = await asyncio.gather(*[public.ticker(product_code='FX_BTC_JPY') for _ in range(5)])
+        return api, values
+
+    api, values = asyncio.run(main())
+    assert all(v['path'] == '/v1/ticker?product_code=FX_BTC_JPY' and v['status_code'] == 200 for v in values)
+    assert api.stats.requests == 5
+
+
+def test_sync_with_rejected():
+    api = AsyncAPI()
+    with pytest.raises(TypeError, match='async with'):
+        with api:
+            pass
+
+
+def test_blocking_transport_rejected(tmp_path):
+    path = str(tmp_path / 'record.jsonl.gz')
+    recording = RecordingTransport(path)
+    recording.close()
+    for transport in [HTTPTransport(), recording, ReplayTransport(path)]:
+        with pytest.raises(TypeError, match='blocking'):
+            AsyncAPI(transport=transport)
@@ -0,0 +1,81 @@
+import time
+import asyncio
+import threading
+from btc_trader.api.cache import ResponseCache
+
+
+def test_cached_until_ttl():
+    cache = ResponseCache(ttl={'/v1/ticker': 0.2})
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return dict(best_ask=len(calls), status_code=200)
+
+    assert cache.get('/v1/ticker', dict(product_code='FX_BTC_JPY'), fetch)['best_ask'] == 1
+    assert cache.get('/v1/ticker', dict(product_code='FX_BTC_JPY'), fetch)['best_ask'] == 1
+    assert cache.get('/v1/ticker', dict(product_code='BTC_JPY'), fetch)['best_ask'] == 2
+    time.sleep(0.25)
+    assert cache.get('/v1/ticker', dict(product_code='FX_BTC_JPY'), fetch)['best_ask'] == 3
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 3
+
+
+def test_coalesce_threads():
+    cache = ResponseCache()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait()
+        return dict(best_ask=1, status_code=200)
+
+    values = []
+    threads = [threading.Thread(target=lambda: values.append(cache.get('/v1/ticker', {}, fetch)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cache.coalesced < 7:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(values) == 8 and all(v is values[0] for v in values)
+
+
+def test_coalesce_async_and_error_not_cached():
+    cache = ResponseCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return dict(status=-500, error_message='busy')
+
+    async def main():
+        return await asyncio.gather(*[cache.get_async('/v1/ticker', {}, fetch) for _ in range(5)])
+
+    values = asyncio.run(main())
+    # error is shared with the waiting callers
+    assert len(calls) == 1 and cache.coalesced == 4
+    assert all(v['status'] == -500 for v in values)
+    # but never cached
+    asyncio.run(main())
+    assert len(calls) == 2 and cache.stats['size'] == 0
+
+
+def test_not_cached_endpoint():
+    cache = ResponseCache()
+    assert '/v1/ticker' in cache and '/v1/executions' not in cache
+
+
+def test_only_success_cached():
+    cache = ResponseCache()
+    for value, cached in [(dict(status=-500, error_message='busy'), False), (dict(status=-208), False),
+                          (dict(best_ask=1, status_code=200), True), ([dict(product_code='FX_BTC_JPY')], True)]:
+        cache.clear()
+        calls = []
+        for _ in range(2):
+            cache.get('/v1/markets', {}, lambda: calls.append(1) or value)
+        assert len(calls) == (1 if cached else 2)
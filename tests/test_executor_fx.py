@@ -0,0 +1,96 @@
+import time
+import pytest
+from btc_trader.order.executor_fx import ExecutorFX
+from btc_trader.order.journal import OrderJournal
+from btc_trader.simulator import PaperOrder
+
+
+def ifdoco(price):
+    return dict(order_method='IFDOCO', minute_to_expire=100, time_in_force='GTC', parameters=[
+        dict(product_code='FX_BTC_JPY', condition_type='LIMIT', side='BUY', price=price, size=0.01),
+        dict(product_code='FX_BTC_JPY', condition_type='LIMIT', side='SELL', price=price + 100000, size=0.01),
+        dict(product_code='FX_BTC_JPY', condition_type='STOP', side='SELL', trigger_price=price - 10000, size=0.01)])
+
+
+def crashed_run(tmp_path, sent):
+    """ journal of a run crashed after the intent of IFDOCO at 995000, which reached the exchange if `sent` """
+    paper = PaperOrder(collateral=100000)
+    paper.on_ticker(dict(best_bid=999900, best_ask=1000000))
+    # order of another strategy on the same account
+    other = paper.send_parent_order(**ifdoco(990000))['parent_order_acceptance_id']
+    path = str(tmp_path / 'journal.db')
+    journal = OrderJournal(path)
+    journal.record('session', sync=True, collateral=100000)
+    journal.record('intent', sync=True, parameter=ifdoco(995000), levels=dict(anchor=995000))
+    journal.close()
+    mine = paper.send_parent_order(**ifdoco(995000))['parent_order_acceptance_id'] if sent else None
+    executor = ExecutorFX(id_api=dict(), api_order=paper, journal=path, own_orders_only=True,
+                          logger_output=str(tmp_path / 'executor.log'))
+    return executor, paper, path, other, mine
+
+
+def active(paper):
+    return sorted(o['parent_order_acceptance_id'] for o in paper.get_parent_orders(parent_order_state='ACTIVE'))
+
+
+def test_resume_intent_reached_exchange(tmp_path):
+    executor, paper, path, other, mine = crashed_run(tmp_path, sent=True)
+    acceptance_id, _, _ = executor._ExecutorFX__resume(100000)
+    assert acceptance_id == mine
+    # the other strategy's order is left as it is
+    assert active(paper) == sorted([other, mine])
+    state = OrderJournal(path).recover()
+    assert state['unknown_intents'] == [] and [o['acceptance_id'] for o in state['open_orders']] == [mine]
+
+
+def test_resume_intent_not_sent(tmp_path):
+    executor, paper, path, other, _ = crashed_run(tmp_path, sent=False)
+    acceptance_id, _, _ = executor._ExecutorFX__resume(100000)
+    assert acceptance_id is None
+    assert active(paper) == [other]
+    state = OrderJournal(path).recover()
+    assert state['unknown_intents'] == [] and state['open_orders'] == []
+
+
+def test_safe_api_request_backoff(tmp_path):
+    executor = ExecutorFX(id_api=dict(), api_order=PaperOrder(), logger_output=str(tmp_path / 'executor.log'))
+    results = [dict(status='-1', error_message='busy'), dict(collateral=1)]
+    start = time.time()
+    assert executor.safe_api_request(lambda: results.pop(0)) == dict(collateral=1)
+    assert time.time() - start < 1.0
+    # gives up without waiting after the last failure
+    start = time.time()
+    with pytest.raises(ValueError):
+        executor.safe_api_request(lambda: dict(status='-1'), sec_to_wait=0.1)
+    assert time.time() - start < 0.5
+
+
+def test_tracking_skips_poll_until_market_reaches_order(tmp_path):
+    paper = PaperOrder(collateral=100000)
+    paper.on_ticker(dict(best_bid=999900, best_ask=1000000))
+    mine = paper.send_parent_order(**ifdoco(990000))['parent_order_acceptance_id']
+    path = str(tmp_path / 'journal.db')
+    journal = OrderJournal(path)
+    journal.record('accepted', mine, sync=True, order_timestamp=time.time(),
+                   levels=dict(anchor=990000, profit_take=1090000, loss_cut=980000))
+    journal.close()
+    executor = ExecutorFX(id_api=dict(), api_order=paper, journal=path, own_orders_only=True,
+                          logger_output=str(tmp_path / 'executor.log'))
+    _, order_timestamp, _ = executor._ExecutorFX__resume(100000)
+
+    def track():
+        count = paper.request_count
+        holding, _ = executor._ExecutorFX__tracking_active_order(mine, order_timestamp=order_timestamp,
+                                                                  initial_asset_jpy=100000,
+                                                                  current_asset_jpy=100000)
+        assert holding
+        return paper.request_count - count
+
+    assert track() > 0
+    # the market doesn't reach any price of the order
+    executor._ExecutorFX__watch_levels(999800, 999900)
+    assert track() == 0
+    # anchor is filled
+    paper.on_ticker(dict(best_bid=989000, best_ask=989500))
+    executor._ExecutorFX__watch_levels(989000, 989500)
+    assert track() > 0
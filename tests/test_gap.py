@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+from btc_trader.historical_data_collection import db, gap
+from btc_trader.historical_data_collection.store import CandleStore
+from btc_trader.historical_data_collection.update_price import insert_prices
+
+TIME = 60 * 10 ** 7 + 60 * np.arange(1000)
+MISSING = list(range(100, 110)) + [500] + list(range(700, 760))
+
+
+def frame(time, period=60):
+    return pd.DataFrame(dict(ticker_index=1, close_unix_time=time, sample_period=period, open_price=1.0,
+                             high_price=2.0, low_price=0.5, close_price=1.0, volume=1.0))
+
+
+def assert_gaps(gaps, period=60):
+    assert list(gaps.columns) == gap.GAP_COLUMNS
+    assert gaps['begin'].tolist() == [int(TIME[99]), int(TIME[499]), int(TIME[699])]
+    assert gaps['end'].tolist() == [int(TIME[110]), int(TIME[501]), int(TIME[760])]
+    assert gaps['missing'].tolist() == [10, 1, 60]
+    assert (gaps['sample_period'] == period).all()
+
+
+@pytest.fixture
+def connection(tmp_path):
+    con = db.ConnectPSQL(dict(backend='sqlite', db=str(tmp_path / 'price.sqlite')))
+    con.create_tables()
+    return con
+
+
+def test_find_gaps_sql(connection):
+    insert_prices(connection, frame(np.delete(TIME, MISSING)), [])
+    insert_prices(connection, frame(TIME[::5] // 300 * 300 + 300, period=300), [])
+    assert_gaps(gap.find_gaps(connection, period=60))
+    gaps = gap.find_gaps(connection)
+    # no gap of 300 sec
+    assert set(gaps['sample_period']) == {60}
+    assert len(gap.find_gaps(connection, ticker_index=2)) == 0
+
+
+def test_find_gaps_store(tmp_path):
+    store = CandleStore(str(tmp_path / 'store'))
+    store.append(60, frame(np.delete(TIME, MISSING)))
+    assert_gaps(gap.find_gaps(store))
+    store.append(300, frame(TIME[::5] // 300 * 300 + 300, period=300))
+    assert len(gap.find_gaps(store, period=300)) == 0
+
+
+def test_no_gap(connection):
+    insert_prices(connection, frame(TIME), [])
+    gaps = gap.find_gaps(connection)
+    assert len(gaps) == 0 and list(gaps.columns) == gap.GAP_COLUMNS
@@ -0,0 +1,72 @@
+from btc_trader.order.journal import OrderJournal
+
+
+def test_recover_open_orders(tmp_path):
+    path = str(tmp_path / 'journal.db')
+    journal = OrderJournal(path)
+    journal.record('session', sync=True, collateral=100000)
+    journal.record('intent', sync=True, parameter=dict(n=1))
+    journal.record('accepted', 'A', sync=True, order_timestamp=1.0, levels=dict(anchor=1))
+    journal.record('state', 'A', case='C', action='wait')
+    journal.record('closed', 'A', sync=True, case='D', collateral=100100)
+    journal.record('intent', sync=True, parameter=dict(n=2))
+    journal.record('accepted', 'B', sync=True, order_timestamp=2.0, levels=dict(anchor=2))
+    journal.record('state', 'B', case='A', action='wait')
+    journal.record('state', 'B', case='C', action='wait')
+    journal.close()
+
+    # batched events are committed by close, and read back after restart
+    state = OrderJournal(path).recover()
+    assert [o['acceptance_id'] for o in state['open_orders']] == ['B']
+    assert state['open_orders'][0]['levels'] == dict(anchor=2)
+    assert state['open_orders'][0]['state']['case'] == 'C'
+    assert state['unknown_intents'] == []
+    assert state['session']['collateral'] == 100000
+    assert state['collateral'] == 100100
+
+
+def test_cleanup_closes_older_orders(tmp_path):
+    journal = OrderJournal(str(tmp_path / 'journal.db'))
+    journal.record('accepted', 'A', sync=True, order_timestamp=1.0, levels=None)
+    journal.record('cleanup', sync=True, collateral=90000)
+    journal.record('accepted', 'B', sync=True, order_timestamp=2.0, levels=None)
+    state = journal.recover()
+    assert [o['acceptance_id'] for o in state['open_orders']] == ['B']
+    assert state['open_orders'][0]['state'] is None
+    assert state['session'] is None and state['collateral'] == 90000
+
+
+def test_unknown_intents(tmp_path):
+    journal = OrderJournal(str(tmp_path / 'journal.db'))
+    journal.record('intent', sync=True, parameter=dict(n=1))
+    journal.record('rejected', sync=True, order_info='error')
+    journal.record('intent', sync=True, parameter=dict(n=2))
+    journal.record('intent', sync=True, parameter=dict(n=3))
+    journal.record('accepted', 'C', sync=True, order_timestamp=3.0, levels=None)
+    journal.record('intent', sync=True, parameter=dict(n=4))
+    state = journal.recover()
+    # crashed after sending 2 and 4
+    assert [i['parameter']['n'] for i in state['unknown_intents']] == [2, 4]
+    assert [o['acceptance_id'] for o in state['open_orders']] == ['C']
+    # reconciled by clean up of the account
+    journal.record('cleanup', sync=True, collateral=1)
+    state = journal.recover()
+    assert state['unknown_intents'] == [] and state['open_orders'] == []
+
+
+def test_empty(tmp_path):
+    state = OrderJournal(str(tmp_path / 'journal.db')).recover()
+    assert state == dict(open_orders=[], unknown_intents=[], session=None, collateral=None)
+
+
+def test_intent_resolved_later(tmp_path):
+    journal = OrderJournal(str(tmp_path / 'journal.db'))
+    journal.record('intent', sync=True, parameter=dict(n=1))
+    journal.record('intent', sync=True, parameter=dict(n=2))
+    first, second = journal.recover()['unknown_intents']
+    # reconciled after the next intent was recorded
+    journal.record('rejected', sync=True, intent_seq=first['seq'], order_info='not found on exchange')
+    assert [i['parameter']['n'] for i in journal.recover()['unknown_intents']] == [2]
+    journal.record('accepted', 'B', sync=True, intent_seq=second['seq'], order_timestamp=2.0, levels=None)
+    state = journal.recover()
+    assert state['unknown_intents'] == [] and [o['acceptance_id'] for o in state['open_orders']] == ['B']
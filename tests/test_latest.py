@@ -0,0 +1,87 @@
+import time
+import asyncio
+from btc_trader.stream import LatestValue, SharedFeed
+
+
+def test_sample_without_duplicates_or_burst():
+    async def main():
+        latest = LatestValue()
+        received = []
+
+        async def producer():
+            await asyncio.sleep(0.05)
+            for n in range(20):
+                latest.set(n)
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(0.3)
+            latest.close()
+
+        task = asyncio.ensure_future(producer())
+        start = time.time()
+        async for value in latest.sample(interval=0.1):
+            received.append((time.time() - start, value))
+            if len(received) == 2:
+                await asyncio.sleep(0.5)  # slow consumer
+        await task
+        return received
+
+    received = asyncio.run(main())
+    values = [v for _, v in received]
+    # each value at most once, in order
+    assert values == sorted(set(values))
+    assert values[0] == 0 and values[-1] == 19
+    # no burst of stale values after the slow consumer catches up
+    times = [t for t, _ in received]
+    assert min(b - a for a, b in zip(times[2:], times[3:])) > 0.08
+
+
+def test_consumers_sleep_until_update():
+    async def main():
+        latest = LatestValue()
+        counts = [0] * 30
+
+        async def consumer(n):
+            async for _ in latest.sample(interval=0.0):
+                counts[n] += 1
+
+        tasks = [asyncio.ensure_future(consumer(n)) for n in range(len(counts))]
+        await asyncio.sleep(0.1)
+        latest.set('a')
+        await asyncio.sleep(0.1)
+        latest.set('b')
+        await asyncio.sleep(0.1)
+        latest.close()
+        await asyncio.wait_for(asyncio.gather(*tasks), 1.0)
+        return counts
+
+    assert asyncio.run(main()) == [2] * 30
+
+
+class FakePublic:
+
+    def __init__(self):
+        self.n = 0
+
+    async def ticker(self, product_code=None):
+        self.n += 1
+        return dict(best_ask=self.n, best_bid=self.n - 1)
+
+    async def get_board_state(self, product_code=None):
+        return dict(health='NORMAL', state='RUNNING')
+
+
+def test_shared_feed_tickers():
+    async def main():
+        feed = SharedFeed(FakePublic(), interval=0.02, health_sec=0.02)
+        task = asyncio.ensure_future(feed.run())
+        asks = []
+        async for ticker in feed.tickers(interval=0.05):
+            asks.append(ticker['best_ask'])
+            if len(asks) == 5:
+                await feed.close()
+        await asyncio.wait_for(task, 1.0)
+        return asks, feed
+
+    asks, feed = asyncio.run(main())
+    assert asks == sorted(set(asks)) and feed.stats['samples'] == 5
+    assert feed.board_state['health'] == 'NORMAL'
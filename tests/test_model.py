@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from btc_trader.order.model import MovingAverage
+
+
+def reference(prices, weighted, step_size, trend_trigger_window, trend_trigger_count, trend_trigger_value):
+    """ predictions of the model re-summing the whole buffer on every tick """
+    norm = sum(range(step_size + 1)) if weighted else step_size
+    weight = [i / norm for i in reversed(range(1, step_size + 1))] if weighted else [1.0 / step_size] * step_size
+    pred, trend, buffer = [], [], []
+    for price in prices:
+        buffer = (buffer + [price])[-step_size:]
+        if len(buffer) < step_size:
+            pred.append(np.nan)
+            trend.append(False)
+            continue
+        pred.append(sum([x * w for x, w in zip(buffer[::-1], weight)]))
+        flags = [buffer[i + 1] - buffer[i] < trend_trigger_value for i in range(len(buffer) - 1)]
+        flags = flags[-min(trend_trigger_window, len(flags)):]
+        trend.append(sum(flags) >= trend_trigger_count)
+    return np.array(pred), np.array(trend)
+
+
+def stream(model, prices):
+    pred, trend = [], []
+    for price in prices:
+        p, t = model.predict(price)
+        pred.append(np.nan if p is None else p)
+        trend.append(bool(t))
+    return np.array(pred), np.array(trend)
+
+
+PARAMETERS = [(5, 2, 1, 0), (10, 0, 3, -100), (20, 5, 2, 50), (1, 2, 1, 0)]
+
+
+@pytest.mark.parametrize('weighted', [False, True])
+@pytest.mark.parametrize('step_size, trend_trigger_window, trend_trigger_count, trend_trigger_value', PARAMETERS)
+def test_stream_matches_reference(weighted, step_size, trend_trigger_window, trend_trigger_count,
+                                  trend_trigger_value):
+    parameter = dict(weighted=weighted, step_size=step_size, trend_trigger_window=trend_trigger_window,
+                     trend_trigger_count=trend_trigger_count, trend_trigger_value=trend_trigger_value)
+    random = np.random.RandomState(0)
+    prices = 5000000 + np.cumsum(random.randint(-500, 500, 2000))
+    for data in [prices.tolist(), (prices + random.uniform(0, 1, len(prices))).tolist()]:
+        pred, trend = stream(MovingAverage(**parameter), data)
+        pred_reference, trend_reference = reference(data, **parameter)
+        # same sum of the same products in the same order: tick for tick identical
+        np.testing.assert_array_equal(pred, pred_reference)
+        np.testing.assert_array_equal(trend, trend_reference)
+
+
+def test_wait_until_buffer_is_full():
+    model = MovingAverage(step_size=3)
+    assert model.predict(1) == (None, None)
+    assert model.predict(2) == (None, None)
+    assert model.predict(3)[0] == pytest.approx(2)
+    assert model.predict(7)[0] == pytest.approx(4)
+    assert model.data_buffer == [2, 3, 7]
+    model.reset_buffer()
+    assert model.predict(1) == (None, None)
+
+
+@pytest.mark.parametrize('weighted', [False, True])
+@pytest.mark.parametrize('step_size, trend_trigger_window, trend_trigger_count, trend_trigger_value', PARAMETERS)
+def test_stream_matches_batch(weighted, step_size, trend_trigger_window, trend_trigger_count, trend_trigger_value):
+    parameter = dict(weighted=weighted, step_size=step_size, trend_trigger_window=trend_trigger_window,
+                     trend_trigger_count=trend_trigger_count, trend_trigger_value=trend_trigger_value)
+    random = np.random.RandomState(0)
+    prices = 5000000 + np.cumsum(random.randint(-500, 500, 2000))
+
+    pred, trend = stream(MovingAverage(**parameter), prices.tolist())
+    pred_batch, trend_batch = MovingAverage(**parameter).predict_batch(prices)
+    # tick for tick identical, so a backtest reproduces live predictions
+    np.testing.assert_array_equal(pred, pred_batch)
+    np.testing.assert_array_equal(trend, trend_batch)
+
+    prices = prices + random.uniform(0, 1, len(prices))
+    pred, trend = stream(MovingAverage(**parameter), prices.tolist())
+    pred_batch, trend_batch = MovingAverage(**parameter).predict_batch(prices)
+    np.testing.assert_array_equal(pred, pred_batch)
+    np.testing.assert_array_equal(trend, trend_batch)
+
+
+def test_batch_shorter_than_step_size():
+    pred, trend = MovingAverage(step_size=3).predict_batch([1, 2])
+    assert np.isnan(pred).all() and not trend.any()
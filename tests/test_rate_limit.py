@@ -0,0 +1,51 @@
+import time
+import pytest
+from btc_trader.api.rate_limit import RateLimiter, TokenBucket, PRIORITY_POLLING
+
+
+def test_token_bucket_refill_and_wait():
+    bucket = TokenBucket(rate_per_min=60, burst=10)
+    now = time.monotonic()
+    bucket.refill(now)
+    for _ in range(10):
+        bucket.take()
+    assert bucket.tokens == pytest.approx(0, abs=1e-3)
+    assert bucket.wait_time(0) == pytest.approx(1.0, abs=1e-2)
+    bucket.refill(now + 0.5)
+    assert bucket.tokens == pytest.approx(0.5, abs=1e-3)
+    assert bucket.wait_time(5) == pytest.approx(5.5, abs=1e-2)
+    # never above burst
+    bucket.refill(now + 1000)
+    assert bucket.tokens == 10
+
+
+def test_polling_lane_keeps_floor_for_orders():
+    limiter = RateLimiter(private_per_min=6, private_burst=10, ip_per_min=6000, ip_burst=1000)
+    granted = [limiter.try_acquire('/v1/me/getchildorders')[0] for _ in range(10)]
+    # polling can't drain the private bucket below half of the burst
+    assert granted == [True] * 5 + [False] * 5
+    granted, wait = limiter.try_acquire('/v1/me/getchildorders')
+    assert not granted and wait > 0
+    # order lane takes the rest at once
+    for _ in range(5):
+        assert limiter.try_acquire('/v1/me/cancelparentorder') == (True, 0.0)
+    # and borrows future tokens (granted with wait) instead of being refused
+    granted, wait = limiter.try_acquire('/v1/me/sendparentorder')
+    assert granted and wait == pytest.approx(10.0, rel=1e-2)
+
+
+def test_priority_overrides_endpoint_lane():
+    limiter = RateLimiter(private_per_min=6, private_burst=10)
+    for _ in range(5):
+        assert limiter.try_acquire('/v1/me/getcollateral', priority=PRIORITY_POLLING)[0]
+    assert not limiter.try_acquire('/v1/me/getcollateral', priority=PRIORITY_POLLING)[0]
+    # default lane still has the tokens above its floor
+    assert limiter.try_acquire('/v1/me/getcollateral')[0]
+
+
+def test_bucket_names():
+    assert RateLimiter.bucket_names('/v1/ticker') == ['ip']
+    assert RateLimiter.bucket_names('/v1/me/getpositions') == ['ip', 'private']
+    small = dict(parameters=[dict(size=0.01), dict(size=0.01), dict(size=0.01)])
+    assert RateLimiter.bucket_names('/v1/me/sendparentorder', small) == ['ip', 'private', 'small_order']
+    assert RateLimiter.bucket_names('/v1/me/sendchildorder', dict(size=0.5)) == ['ip', 'private']
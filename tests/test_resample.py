@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+from btc_trader.historical_data_collection.resample import Resampler, resample, infer_offset, COLUMNS
+
+
+def minute_candles(n, start=1500000060, missing=(), seed=0):
+    random = np.random.RandomState(seed)
+    time = np.delete(start + 60 * np.arange(n), list(missing))
+    close = 1000000 + np.cumsum(random.randint(-100, 100, len(time))).astype(float)
+    return pd.DataFrame(dict(close_unix_time=time, open_price=close - random.randint(-50, 50, len(time)),
+                             high_price=close + 100, low_price=close - 100, close_price=close,
+                             volume=random.uniform(0, 10, len(time))))
+
+
+def reference(prices, period, offset=0):
+    """ candles of `period` by pandas group by """
+    bucket = -((offset - prices['close_unix_time']) // period) * period + offset
+    grouped = prices.groupby(bucket)
+    return pd.DataFrame(dict(close_unix_time=grouped['close_unix_time'].max().index.values,
+                             open_price=grouped['open_price'].first().values,
+                             high_price=grouped['high_price'].max().values,
+                             low_price=grouped['low_price'].min().values,
+                             close_price=grouped['close_price'].last().values,
+                             volume=grouped['volume'].sum().values))
+
+
+def test_resample_matches_group_by():
+    prices = minute_candles(5000, missing=range(1000, 1100))
+    for period, offset in [(180, 0), (900, 0), (3600, 0), (86400, 0), (604800, 345600)]:
+        candles, count = resample(prices, period, offset)
+        expected = reference(prices, period, offset)
+        np.testing.assert_array_equal(candles['close_unix_time'], expected['close_unix_time'].values)
+        for k in COLUMNS[1:]:
+            np.testing.assert_allclose(candles[k], expected[k].values)
+        assert count.sum() == len(prices)
+        assert np.all(candles['close_unix_time'] % period == offset)
+
+
+def test_infer_offset():
+    assert infer_offset(345600 + 604800 * np.arange(10), 604800) == 345600
+    assert infer_offset([], 604800) == 0
+
+
+def test_resampler_append_in_chunks():
+    prices = minute_candles(3000, missing=[500, 501, 1700])
+    resampler = Resampler(periods=[300, 3600])
+    finished = {300: [], 3600: []}
+    for begin in range(0, len(prices), 97):
+        for period, candles in resampler.append(prices.iloc[begin:begin + 97]).items():
+            finished[period].append(candles)
+    # already appended ones are ignored
+    assert resampler.append(prices.iloc[:10]) == dict()
+    for period in [300, 3600]:
+        candles = pd.concat(finished[period], ignore_index=True)
+        expected, _ = resample(prices, period)
+        unfinished = expected['close_unix_time'][-1] != prices['close_unix_time'].values[-1]
+        n = len(expected['close_unix_time']) - int(unfinished)
+        for k in COLUMNS:
+            np.testing.assert_allclose(candles[k].values, expected[k][:n])
+        assert (candles['sample_period'] == period).all()
+        if unfinished:
+            assert resampler.partial(period)['close_unix_time'] == expected['close_unix_time'][-1]
@@ -0,0 +1,77 @@
+import numpy as np
+from btc_trader.historical_data_collection.ticks import TickAggregator, aggregate, exec_unix_time_ms
+
+
+class FakePublic:
+    """ `Public.executions` over a list of executions, newest first and paged by `before` """
+
+    def __init__(self, executions):
+        self.executions_ = sorted(executions, key=lambda e: -e['id'])
+        self.requests = 0
+
+    def executions(self, product_code=None, count=100, before=None, after=None):
+        self.requests += 1
+        page = [e for e in self.executions_
+                if (before is None or e['id'] < before) and (after is None or e['id'] > after)]
+        return page[:count]
+
+
+def make_executions(n, start_ms, step_ms, seed=0):
+    random = np.random.RandomState(seed)
+    executions = []
+    for i in range(n):
+        t = start_ms + i * step_ms
+        executions.append(dict(id=i + 1,
+                               price=float(1000000 + random.randint(-1000, 1000)),
+                               size=float(random.randint(1, 100)) / 100,
+                               exec_date=str(np.datetime64(int(t), 'ms'))))
+    return executions
+
+
+def expected(executions, period):
+    time_ms = exec_unix_time_ms([e['exec_date'] for e in executions])
+    return aggregate(time_ms, [e['price'] for e in executions], [e['size'] for e in executions], period)
+
+
+def candles_of(aggregator, period):
+    """ finished and unfinished candles of `period` """
+    aggregator.close_until(float('inf'))
+    return aggregator.pending[period]
+
+
+def assert_candles(frame, reference):
+    np.testing.assert_array_equal(frame['close_unix_time'].values, reference['close_unix_time'])
+    for column in ['open_price', 'high_price', 'low_price', 'close_price', 'volume']:
+        np.testing.assert_allclose(frame[column].values, reference[column])
+
+
+def test_backfill_pages_inside_one_candle():
+    # 1500 executions within one minute, paged by 500
+    executions = make_executions(1500, start_ms=1500000000000, step_ms=30)
+    public = FakePublic(executions)
+    aggregator = TickAggregator(periods=[60])
+    assert aggregator.backfill(public, after=0, count=500) == 1500
+    assert aggregator.last_id == 1500
+    frame = candles_of(aggregator, 60)
+    assert len(frame) == 1
+    assert_candles(frame, expected(executions, 60))
+
+
+def test_backfill_matches_aggregate_across_pages():
+    executions = make_executions(3000, start_ms=1500000000123, step_ms=250)
+    aggregator = TickAggregator(periods=[1, 10, 60, 300])
+    assert aggregator.backfill(FakePublic(executions), after=0, count=500) == 3000
+    for period in [1, 10, 60, 300]:
+        assert_candles(candles_of(aggregator, period), expected(executions, period))
+
+
+def test_backfill_then_add_drops_duplicates():
+    executions = make_executions(2000, start_ms=1500000000000, step_ms=100)
+    aggregator = TickAggregator(periods=[10, 60])
+    aggregator.backfill(FakePublic(executions[:1200]), after=0, count=500)
+    # live executions overlapping with the backfill
+    aggregator.add(executions[1100:1600])
+    aggregator.add(executions[1500:])
+    assert aggregator.stats['dropped'] == 200
+    for period in [10, 60]:
+        assert_candles(candles_of(aggregator, period), expected(executions, period))
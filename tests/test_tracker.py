@@ -0,0 +1,95 @@
+from btc_trader.order.tracker import OrderTracker
+
+NOW = 1500000000.0
+EXPIRE_DATE = '2017-07-15T02:40:00'  # a day after NOW
+
+
+def child(child_order_id, side, state, executed_size, order_id=None):
+    return dict(child_order_id=child_order_id, id=order_id, side=side, child_order_state=state,
+                executed_size=executed_size, expire_date=EXPIRE_DATE, total_commission=0)
+
+
+def test_ifdoco_to_finish():
+    tracker = OrderTracker('JRF1', NOW, minute_to_expire=10)
+    tracker.update_parent('ACTIVE')
+    assert tracker.transition(NOW) == ('A', True)
+    assert tracker.action == 'wait'
+
+    assert tracker.update([child('c1', 'BUY', 'COMPLETED', 0.01, 1)])
+    assert tracker.transition(NOW + 1) == ('B', True)
+    assert not tracker.update([child('c1', 'BUY', 'COMPLETED', 0.01, 1)])
+    assert tracker.transition(NOW + 2) == ('B', False)
+
+    tracker.update([child('c1', 'BUY', 'COMPLETED', 0.01, 1), child('c2', 'SELL', 'ACTIVE', 0, 2),
+                    child('c3', 'SELL', 'ACTIVE', 0, 3)])
+    assert tracker.transition(NOW + 3) == ('C', True)
+    tracker.update([child('c1', 'BUY', 'COMPLETED', 0.01, 1), child('c2', 'SELL', 'COMPLETED', 0.01, 2),
+                    child('c3', 'SELL', 'CANCELED', 0, 3)])
+    # the canceled leg of OCO is neither completed nor expired
+    assert tracker.transition(NOW + 4) == ('J', True)
+    tracker.update([child('c1', 'BUY', 'COMPLETED', 0.01, 1), child('c2', 'SELL', 'COMPLETED', 0.01, 2)])
+    assert tracker.net_executed_size == 0
+
+
+def test_completed_pair_finishes():
+    tracker = OrderTracker('JRF1', NOW, minute_to_expire=10)
+    tracker.update([child('c1', 'BUY', 'COMPLETED', 0.01, 1), child('c2', 'SELL', 'COMPLETED', 0.01, 2)])
+    assert tracker.transition(NOW) == ('D', True)
+    assert tracker.action == 'finish'
+
+
+def test_both_legs_executed_offset():
+    tracker = OrderTracker('JRF1', NOW, minute_to_expire=10)
+    tracker.update([child('c1', 'BUY', 'COMPLETED', 0.01, 1), child('c2', 'SELL', 'COMPLETED', 0.01, 2),
+                    child('c3', 'SELL', 'COMPLETED', 0.01, 3)])
+    assert tracker.transition(NOW) == ('K', True)
+    assert tracker.net_executed_size == -0.01
+    assert tracker.action == 'offset'
+
+
+def test_expired():
+    tracker = OrderTracker('JRF1', NOW, minute_to_expire=10)
+    tracker.update_parent('EXPIRED')
+    assert tracker.transition(NOW) == ('E', True)
+    assert tracker.action == 'finish'
+
+    # waiting state older than `minute_to_expire` is offset
+    tracker = OrderTracker('JRF1', NOW, minute_to_expire=10)
+    tracker.update([child('c1', 'BUY', 'ACTIVE', 0, 1)])
+    assert tracker.transition(NOW + 599) == ('A', True)
+    assert tracker.action == 'wait'
+    assert tracker.transition(NOW + 600) == ('A', False)
+    assert tracker.expired and tracker.action == 'offset'
+
+    # anchor completed but OCO never shows up until anchor's expire date
+    tracker = OrderTracker('JRF1', NOW, minute_to_expire=10000)
+    tracker.update([child('c1', 'BUY', 'COMPLETED', 0.01, 1)])
+    assert tracker.transition(NOW + 86400) == ('G', True)
+    tracker.update([child('c1', 'BUY', 'COMPLETED', 0.01, 1), child('c2', 'SELL', 'EXPIRED', 0, 2),
+                    child('c3', 'SELL', 'EXPIRED', 0, 3)])
+    assert tracker.transition(NOW + 86400) == ('F', True)
+    assert tracker.action == 'offset'
+
+
+def test_quiet_while_resting():
+    tracker = OrderTracker('JRF1', NOW, minute_to_expire=10)
+    assert not tracker.quiet(NOW)  # not polled yet
+    tracker.update([child('c1', 'BUY', 'ACTIVE', 0, 1)])
+    tracker.transition(NOW)
+    assert tracker.quiet(NOW + 30, max_quiet_sec=60)
+    # polled at least every `max_quiet_sec`
+    assert not tracker.quiet(NOW + 60, max_quiet_sec=60)
+    # the order is expired
+    tracker.transition(NOW + 590)
+    assert not tracker.quiet(NOW + 600, max_quiet_sec=60)
+
+    tracker = OrderTracker('JRF1', NOW, minute_to_expire=100000)
+    tracker.update([child('c1', 'BUY', 'COMPLETED', 0.01, 1)])
+    tracker.transition(NOW)
+    assert tracker.case == 'B' and not tracker.quiet(NOW)  # OCO is about to show up
+    tracker.update([child('c1', 'BUY', 'COMPLETED', 0.01, 1), child('c2', 'SELL', 'ACTIVE', 0, 2),
+                    child('c3', 'SELL', 'ACTIVE', 0, 3)])
+    tracker.transition(NOW + 86390)
+    assert tracker.case == 'C' and tracker.quiet(NOW + 86399)
+    # a child order reaches its expire date
+    assert not tracker.quiet(NOW + 86400)
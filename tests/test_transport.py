@@ -0,0 +1,77 @@
+import time
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from btc_trader.api import API, Public
+from btc_trader.api.transport import HTTPTransport, ConnectionStats
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_GET(self):
+        body = json.dumps(dict(path=self.path)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:%i' % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def test_connection_reused(url):
+    transport = HTTPTransport()
+    for n in range(10):
+        status_code, content = transport.send('GET', url + '/v1/ticker', params=dict(n=n))
+        assert status_code == 200 and json.loads(content)['path'] == '/v1/ticker?n=%i' % n
+    stats = transport.stats.as_dict()
+    assert stats['requests'] == 10 and stats['connections'] == 1 and stats['reused'] == 9
+    assert stats['reuse_rate'] == 0.9 and stats['mean_handshake_sec'] == stats['handshake_sec'] > 0
+    # the pool is re-opened after close
+    transport.close()
+    transport.send('GET', url + '/v1/ticker')
+    assert transport.stats.connections == 2
+
+
+def test_idle_pool_evicted(url):
+    transport = HTTPTransport(max_idle_sec=0.05)
+    transport.send('GET', url + '/v1/ticker')
+    transport.send('GET', url + '/v1/ticker')
+    time.sleep(0.1)
+    transport.send('GET', url + '/v1/ticker')
+    assert transport.stats.evictions == 1
+    assert transport.stats.connections == 2 and transport.stats.reused == 1
+
+
+def test_clients_share_one_pool(url):
+    api = API()
+    api.api_url = url
+    first, second = Public(api=api), Public(api=api)
+    assert first.ticker(product_code='FX_BTC_JPY')['path'] == '/v1/ticker?product_code=FX_BTC_JPY'
+    assert second.markets()['path'] == '/v1/markets'
+    assert api.stats.requests == 2 and api.stats.connections == 1
+    api.close()
+
+
+def test_stats_reset():
+    stats = ConnectionStats()
+    stats.add_request()
+    stats.add_connection(0.5)
+    stats.add_eviction()
+    assert stats.as_dict() == dict(requests=1, connections=1, reused=0, reuse_rate=0.0, handshake_sec=0.5,
+                                   mean_handshake_sec=0.5, evictions=1)
+    stats.reset()
+    assert stats.requests == 0 and stats.reuse_rate == 0.0 and stats.mean_handshake_sec == 0.0